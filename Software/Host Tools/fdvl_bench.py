@@ -0,0 +1,179 @@
+# fdvl_bench.py
+# Benchmarks the firmware on the host through fdvl_sim.
+# Reports task loop iterations per real second, time per call of the hot functions and
+# the memory they allocate, as JSON that can be saved as a baseline and compared later.
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from fdvl_sim import Simulator
+
+LOOP_SECONDS = 60.0  # Virtual seconds of firmware run for the loop benchmark
+CALLS = 2000  # Calls per timing round
+ROUNDS = 5  # Best round is reported
+ALLOC_CALLS = 200  # Calls measured under tracemalloc
+TOLERANCE = 0.5  # Allowed slowdown against a baseline, 0.5 = 50%
+ALLOC_SLACK = 64  # Bytes of allocation growth ignored against a baseline
+
+
+def bench_loop(seconds):
+    """Run the whole firmware and count task iterations per real second."""
+    sim = Simulator()
+    sim.boot()
+    start = time.perf_counter()
+    sim.advance(seconds)
+    elapsed = time.perf_counter() - start
+    steps = dict(sim.loop.steps)
+    display = sim.firmware["display"]
+    return {
+        "virtual_seconds": seconds,
+        "real_seconds": round(elapsed, 4),
+        "loop_iterations_per_sec": round(sum(steps.values()) / elapsed, 1),
+        "display_frames_per_sec": round(steps.get("display_task", 0) / elapsed, 1),
+        "task_steps": steps,
+        "frames_pushed": display.frames_pushed,
+        "frames_skipped": display.frames_skipped,
+        "i2c_transactions": sim.i2c_transactions,
+    }
+
+
+def make_cases(sim):
+    """(name, function) pairs, each call does one unit of the work measured."""
+    firmware = sim.firmware
+    display = firmware["display"]
+    buttons = firmware["buttons"]
+    rtc = firmware["rtc"]
+    rtc_time = dict(firmware["clock"].time)
+    minute = [0]
+    effect_time = [0.0]
+    hue = [0]
+
+    def show_time():
+        # A different minute every call, the frame is always pushed
+        minute[0] = (minute[0] + 1) % 60
+        rtc_time["tm_min"] = minute[0]
+        display.show_time(rtc_time, True, "NORMAL")
+
+    def show_time_unchanged():
+        display.show_time(rtc_time, True, "NORMAL")
+
+    def show_time_with_effect():
+        effect_time[0] += 1 / 60
+        display.show_time_with_effect(rtc_time, True, effect_time[0])
+
+    def hsv_to_rgb():
+        hue[0] = (hue[0] + 1) % 256
+        display.hsv_to_rgb(hue[0] / 256)
+
+    return (
+        ("show_time", show_time),
+        ("show_time_unchanged", show_time_unchanged),
+        ("show_time_with_effect", show_time_with_effect),
+        ("get_event", buttons.get_event),
+        ("hsv_to_rgb", hsv_to_rgb),
+        ("get_time", rtc.get_time),
+    )
+
+
+def time_call(function, calls, rounds):
+    """Best microseconds per call over a number of rounds."""
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / calls * 1e6
+
+
+def measure_allocations(function, calls):
+    """Peak bytes allocated by one call and blocks left allocated per call."""
+    function()  # Warm caches so one-time setup is not counted
+    tracemalloc.start()
+    try:
+        peak = 0
+        blocks = sys.getallocatedblocks()
+        for _ in range(calls):
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            function()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+        # Everything the measurement itself keeps alive is counted once, not per call
+        leaked = (sys.getallocatedblocks() - blocks) / calls
+    finally:
+        tracemalloc.stop()
+    return peak, leaked
+
+
+def bench_functions(calls, rounds, alloc_calls):
+    sim = Simulator()
+    sim.boot(5.0)  # Past the button settle time, so get_event takes its normal path
+    results = {}
+    overhead, _ = measure_allocations(lambda: None, alloc_calls)  # tracemalloc's own bookkeeping
+    for name, function in make_cases(sim):
+        peak, leaked = measure_allocations(function, alloc_calls)
+        peak = max(0, peak - overhead)
+        results[name] = {
+            "us_per_call": round(time_call(function, calls, rounds), 3),
+            "alloc_peak_bytes": peak,
+            "alloc_blocks_per_call": round(leaked, 3),
+        }
+    return results
+
+
+def compare(report, baseline, tolerance):
+    """Return one message per benchmark that got slower or allocates more than the baseline."""
+    problems = []
+    for name, result in report["functions"].items():
+        base = baseline.get("functions", {}).get(name)
+        if not base:
+            continue
+        if result["us_per_call"] > base["us_per_call"] * (1 + tolerance):
+            problems.append("{}: {:.3f} us per call, baseline {:.3f}".format(
+                name, result["us_per_call"], base["us_per_call"]))
+        if result["alloc_peak_bytes"] > base["alloc_peak_bytes"] + ALLOC_SLACK:
+            problems.append("{}: allocates {} bytes, baseline {}".format(
+                name, result["alloc_peak_bytes"], base["alloc_peak_bytes"]))
+    base_loop = baseline.get("loop", {}).get("loop_iterations_per_sec")
+    loop = report["loop"]["loop_iterations_per_sec"]
+    if base_loop and loop < base_loop / (1 + tolerance):
+        problems.append("loop: {:.1f} iterations per second, baseline {:.1f}".format(loop, base_loop))
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the clock firmware on the host.")
+    parser.add_argument("--seconds", type=float, default=LOOP_SECONDS, help="virtual seconds for the loop benchmark")
+    parser.add_argument("--calls", type=int, default=CALLS, help="calls per timing round")
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help="timing rounds, the best one counts")
+    parser.add_argument("--save", metavar="FILE", help="write the report as a baseline")
+    parser.add_argument("--compare", metavar="FILE", help="fail if slower than this baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed slowdown, 0.5 = 50%%")
+    args = parser.parse_args()
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "loop": bench_loop(args.seconds),
+        "functions": bench_functions(args.calls, args.rounds, ALLOC_CALLS),
+    }
+    print(json.dumps(report, indent=2))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        for problem in problems:
+            print("REGRESSION", problem, file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# fdvl_build.py
+# Builds a CIRCUITPY image with the fdvl_* modules precompiled to .mpy, so the clock
+# does not compile them from source on every boot.
+# code.py and boot.py stay source files, CircuitPython only runs those by name.
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "RP2040 Files")
+BUILD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "build", "CIRCUITPY")
+MODULE_PREFIX = "fdvl_"
+SETTINGS_FILE = "settings.txt"
+MPY_CROSS = "mpy-cross"  # Must match the CircuitPython version on the clock (9.x)
+
+
+def compile_module(mpy_cross, source, target):
+    result = subprocess.run([mpy_cross, "-O2", "-o", target, source], capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError("{} failed for {}:\n{}".format(mpy_cross, source, result.stderr))
+
+
+def build(source_dir, build_dir, mpy_cross):
+    """Copy the firmware to build_dir with every fdvl_*.py replaced by its .mpy."""
+    if os.path.exists(build_dir):
+        shutil.rmtree(build_dir)
+    os.makedirs(build_dir)
+    for name in sorted(os.listdir(source_dir)):
+        source = os.path.join(source_dir, name)
+        if name == "__pycache__":
+            continue
+        if os.path.isdir(source):
+            shutil.copytree(source, os.path.join(build_dir, name))
+        elif name.startswith(MODULE_PREFIX) and name.endswith(".py"):
+            compile_module(mpy_cross, source, os.path.join(build_dir, name[:-3] + ".mpy"))
+        else:
+            shutil.copy(source, build_dir)
+
+
+def deploy(build_dir, drive):
+    """Copy a build to a mounted CIRCUITPY drive, removing .py files that would shadow the .mpy."""
+    for name in os.listdir(build_dir):
+        source = os.path.join(build_dir, name)
+        target = os.path.join(drive, name)
+        if name.endswith(".mpy"):
+            stale = target[:-4] + ".py"
+            if os.path.exists(stale):
+                os.remove(stale)  # CircuitPython imports a .py before a .mpy of the same name
+        if os.path.isdir(source):
+            shutil.copytree(source, target, dirs_exist_ok=True)
+        elif name == SETTINGS_FILE and os.path.exists(target):
+            continue  # Keep the settings of this clock
+        else:
+            shutil.copy(source, target)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompile the clock firmware for CircuitPython.")
+    parser.add_argument("--source", default=SOURCE_DIR, help="firmware directory")
+    parser.add_argument("--out", default=BUILD_DIR, help="build directory")
+    parser.add_argument("--mpy-cross", default=MPY_CROSS, help="path of the mpy-cross binary")
+    parser.add_argument("--deploy", metavar="DRIVE", help="copy the build to a mounted CIRCUITPY drive")
+    args = parser.parse_args()
+
+    if shutil.which(args.mpy_cross) is None and not os.path.exists(args.mpy_cross):
+        sys.exit("mpy-cross not found, download the CircuitPython 9.x build and pass --mpy-cross")
+    build(args.source, args.out, args.mpy_cross)
+    print("Built", os.path.abspath(args.out))
+    if args.deploy:
+        deploy(args.out, args.deploy)
+        print("Copied to", args.deploy)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+# fdvl_fleet.py
+# Provisions many clocks at once over their usb_cdc data ports: pushes settings and syncs
+# the time of every clock in parallel, reads them back and prints a report per clock.
+# The time sync maps host time to the clock's ticks_ms from the fastest of a few round
+# trips and has the clock write its RTC exactly at the start of a second.
+# Uses pyserial when it is installed, on Linux and macOS plain tty devices work without it.
+# --emulate runs simulated clocks (fdvl_sim) behind pseudo terminals for testing without hardware.
+import argparse
+import calendar
+import glob
+import json
+import math
+import os
+import random
+import select
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fdvl_sim import FIRMWARE_DIR, Simulator
+
+sys.path.insert(0, FIRMWARE_DIR)
+from fdvl_protocol import FRAME_MAGIC, HEADER_SIZE, frame_size  # noqa: E402
+
+JOBS = 16  # Clocks provisioned at the same time
+REPLY_TIMEOUT = 2.0  # Seconds to wait for an answer
+TIME_TOLERANCE_MS = 100  # The clock may differ this much from the host after a sync
+SYNC_PINGS = 8  # Round trips measured, the fastest one maps host time to the clock's ticks_ms
+SYNC_LEAD = 0.3  # Seconds from the handshake to the earliest second the RTC is set at
+TICKS_PERIOD = 1 << 29  # adafruit_ticks.ticks_ms wraps here
+MAX_LINE_LENGTH = 4095  # The firmware drops longer lines (LineReader.MAX_LINE_LENGTH with the newline)
+DATA_PORT_GLOB = "/dev/serial/by-id/usb-*-if02"  # CircuitPython's data CDC is interface 2, the console is 0
+
+
+class Port:
+    """Byte link to one clock, pyserial when available, else a raw POSIX tty."""
+
+    def __init__(self, path):
+        self.path = path
+        self.buffer = bytearray()
+        try:
+            import serial
+        except ImportError:
+            serial = None
+        if serial is not None:
+            self.serial = serial.Serial(path, 115200, timeout=0)
+            self.fd = None
+        else:
+            import tty
+            self.serial = None
+            self.fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+            tty.setraw(self.fd)
+
+    def write(self, data):
+        if self.serial is not None:
+            self.serial.write(data)
+            self.serial.flush()
+            return
+        view = memoryview(data)
+        while view:
+            try:
+                view = view[os.write(self.fd, view):]
+            except BlockingIOError:
+                select.select([], [self.fd], [], 0.1)
+
+    def fill(self, timeout):
+        """Wait up to timeout for data and add it to the buffer."""
+        if self.serial is not None:
+            self.serial.timeout = timeout
+            data = self.serial.read(max(1, self.serial.in_waiting))
+        else:
+            data = b""
+            if select.select([self.fd], [], [], timeout)[0]:
+                data = os.read(self.fd, 4096)
+        self.buffer.extend(data)
+
+    def drain(self):
+        """Forget output the clock sent before we asked for anything."""
+        self.fill(0)
+        self.buffer.clear()
+
+    def read_line(self, deadline):
+        """Next JSON line, None on timeout. Binary frames in between are skipped."""
+        while True:
+            if self.buffer[:1] == bytes((FRAME_MAGIC,)):
+                if self.take_frame() is not None:
+                    continue
+            else:
+                newline = self.buffer.find(b"\n")
+                if newline >= 0:
+                    line = bytes(self.buffer[:newline])
+                    del self.buffer[:newline + 1]
+                    return line
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            self.fill(remaining)
+
+    def take_frame(self):
+        if len(self.buffer) < HEADER_SIZE:
+            return None
+        size = frame_size(self.buffer[:HEADER_SIZE])
+        if size < 0:
+            del self.buffer[:1]  # Not a frame, resync
+            return None
+        if len(self.buffer) < size:
+            return None
+        frame = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return frame
+
+    def close(self):
+        if self.serial is not None:
+            self.serial.close()
+        else:
+            os.close(self.fd)
+
+
+def discover_ports():
+    """Data ports of every attached clock."""
+    try:
+        from serial.tools import list_ports
+    except ImportError:
+        return sorted(glob.glob(DATA_PORT_GLOB))
+    ports = []
+    for port in list_ports.comports():
+        name = "{} {}".format(port.interface or "", port.description or "")
+        if "CircuitPython" in name and "CDC2" in name:
+            ports.append(port.device)
+    return sorted(ports)
+
+
+def time_command(now):
+    """set_time for a time.struct_time, tm_mon is 0-11 and tm_wday 0 = Monday on the clock."""
+    return {"command": "set_time", "tm_year": now.tm_year, "tm_mon": now.tm_mon - 1, "tm_mday": now.tm_mday,
+            "tm_hour": now.tm_hour, "tm_min": now.tm_min, "tm_sec": now.tm_sec, "tm_wday": now.tm_wday}
+
+
+def send_json(port, message):
+    port.write((json.dumps(message) + "\n").encode("utf-8"))
+
+
+def read_reply(port, key, deadline, ident=None):
+    """Next JSON reply carrying key (and the id ident, if given), other lines are skipped."""
+    while True:
+        line = port.read_line(deadline)
+        if line is None:
+            raise TimeoutError("no {} reply".format(key))
+        try:
+            reply = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(reply, dict) and key in reply and (ident is None or reply[key] == ident):
+            return reply
+
+
+def read_settings(port):
+    send_json(port, {"command": "get_settings"})
+    return read_reply(port, "settings", time.monotonic() + REPLY_TIMEOUT)["settings"]
+
+
+def wall_time(t):
+    """Local wall time of time.time() t in seconds, counted like the clock counts its RTC time."""
+    return calendar.timegm(time.localtime(t)) + t % 1
+
+
+def measure(port):
+    """Fastest of SYNC_PINGS round trips as (host time when the clock answered, round trip s, pong)."""
+    best = None
+    for ident in range(SYNC_PINGS):
+        sent = time.time()
+        send_json(port, {"command": "sync_ping", "id": ident})
+        pong = read_reply(port, "pong", time.monotonic() + REPLY_TIMEOUT, ident)
+        received = time.time()
+        if best is None or received - sent < best[1]:
+            best = ((sent + received) / 2, received - sent, pong)
+        time.sleep(random.uniform(0, 0.02))  # Land at other points of the clock's serial poll
+    return best
+
+
+def clock_offset_ms(host_time, pong):
+    """How far the clock's RTC is ahead of the host's local time, None if the clock has no time."""
+    if pong["time"] is None:
+        return None
+    return round((pong["time"] + pong["ms"] / 1000 - wall_time(host_time)) * 1000)
+
+
+def sync_clock(port):
+    """Set the clock to the host's local time at the start of a second, return (round trip s, synced reply)."""
+    host_time, round_trip, pong = measure(port)
+    second = math.floor(host_time + SYNC_LEAD) + 1
+    message = time_command(time.localtime(second))
+    message["command"] = "sync_time"
+    message["tick"] = (pong["tick"] + round((second - host_time) * 1000)) % TICKS_PERIOD
+    send_json(port, message)
+    synced = read_reply(port, "synced", time.monotonic() + REPLY_TIMEOUT + SYNC_LEAD + 1)["synced"]
+    if "error" in synced:
+        raise ValueError(synced["error"])
+    return round_trip, synced
+
+
+def mismatched_keys(wanted, stored):
+    """Keys whose value on the clock differs from what was pushed."""
+    # Through JSON so tuples and lists compare equal
+    wanted = json.loads(json.dumps(wanted))
+    return sorted(key for key, value in wanted.items() if stored.get(key) != value)
+
+
+def provision(path, settings, patch, set_time):
+    """Push settings and time to one clock and verify them, return its report."""
+    report = {"port": path, "ok": False, "ms": {}}
+    timings = report["ms"]
+    started = time.monotonic()
+
+    def lap(step, since):
+        now = time.monotonic()
+        timings[step] = round((now - since) * 1000, 1)
+        return now
+
+    try:
+        port = Port(path)
+    except OSError as e:
+        report["error"] = str(e)
+        return report
+    try:
+        step = lap("open", started)
+        port.drain()
+        if settings is not None:
+            send_json(port, {"command": "patch_settings", "settings": settings} if patch else settings)
+            step = lap("settings", step)
+        if set_time:
+            round_trip, synced = sync_clock(port)
+            report["round_trip_ms"] = round(round_trip * 1000, 1)
+            report["offset_ms"] = synced["offset_ms"]  # Before the sync
+            report["drift_ppm"] = synced["drift_ppm"]
+            step = lap("sync", step)
+        if settings is not None:
+            report["mismatched"] = mismatched_keys(settings, read_settings(port))
+            step = lap("verify_settings", step)
+        if set_time:
+            host_time, round_trip, pong = measure(port)
+            report["residual_ms"] = clock_offset_ms(host_time, pong)
+            step = lap("verify_time", step)
+        report["ok"] = not report.get("mismatched") and abs(report.get("residual_ms") or 0) <= TIME_TOLERANCE_MS
+        if set_time and report["residual_ms"] is None:
+            report["ok"] = False
+    except (OSError, TimeoutError, ValueError) as e:
+        report["error"] = str(e)
+    finally:
+        port.close()
+    lap("total", started)
+    return report
+
+
+def provision_all(paths, settings, patch, set_time, jobs):
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(lambda path: provision(path, settings, patch, set_time), paths))
+
+
+def print_report(reports, elapsed):
+    for report in reports:
+        if report["ok"]:
+            status = "OK"
+        elif "error" in report:
+            status = "FAIL " + report["error"]
+        else:
+            status = "FAIL"
+            if report.get("mismatched"):
+                status += " settings differ: " + ", ".join(report["mismatched"])
+            if report.get("residual_ms") is None or abs(report["residual_ms"]) > TIME_TOLERANCE_MS:
+                status += " time off by {} ms".format(report.get("residual_ms"))
+        steps = " ".join("{}={}".format(step, ms) for step, ms in report["ms"].items())
+        print("{:40} {:50} {}".format(report["port"], status, steps))
+    failed = sum(1 for report in reports if not report["ok"])
+    print("{} clocks, {} failed, {:.2f} s".format(len(reports), failed, elapsed))
+
+
+class EmulatedClock(threading.Thread):
+    """The firmware in fdvl_sim, run in real time behind a pseudo terminal like a clock's data port."""
+    STEP = 0.01  # Seconds between simulation steps
+
+    def __init__(self, start=Simulator.DEFAULT_START):
+        super().__init__(daemon=True)
+        import tty
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.path = os.ttyname(self.slave)
+        self.sim = Simulator(start=start)
+        self.ready = threading.Event()
+        self.stopped = False
+
+    def run(self):
+        sim = self.sim
+        sim.boot()
+        self.ready.set()
+        last = time.monotonic()
+        while not self.stopped:
+            if select.select([self.master], [], [], self.STEP)[0]:
+                try:
+                    sim.serial.host_write(os.read(self.master, 4096))
+                except OSError:
+                    pass
+            now = time.monotonic()
+            sim.advance(now - last)
+            last = now
+            output = sim.serial.host_read()
+            if output:
+                os.write(self.master, output)
+
+    def stop(self):
+        self.stopped = True
+        self.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+def start_emulators(count):
+    clocks = [EmulatedClock() for _ in range(count)]
+    for clock in clocks:
+        clock.start()
+    for clock in clocks:
+        clock.ready.wait()
+    return clocks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Provision attached clocks with settings and the time.")
+    parser.add_argument("--settings", metavar="FILE", help="settings JSON to push, replaces all settings of a clock")
+    parser.add_argument("--patch", action="store_true", help="only change the keys in --settings")
+    parser.add_argument("--no-time", action="store_true", help="do not set the clocks to the host time")
+    parser.add_argument("--port", action="append", help="data port of a clock, repeatable (default: every clock found)")
+    parser.add_argument("--jobs", type=int, default=JOBS, help="clocks provisioned in parallel")
+    parser.add_argument("--emulate", type=int, metavar="N", help="provision N simulated clocks instead")
+    parser.add_argument("--serve", type=int, metavar="N",
+                        help="only run N simulated clocks and print their ports, until Ctrl-C")
+    parser.add_argument("--json", action="store_true", help="print the reports as JSON")
+    args = parser.parse_args()
+
+    if args.serve:
+        clocks = start_emulators(args.serve)
+        for clock in clocks:
+            print(clock.path)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            return
+
+    settings = None
+    if args.settings:
+        with open(args.settings) as f:
+            settings = json.load(f)
+        if "command" in settings:
+            sys.exit("{} is not a settings file".format(args.settings))
+        if len(json.dumps(settings)) > MAX_LINE_LENGTH:
+            sys.exit("settings are longer than the {} bytes the clock reads".format(MAX_LINE_LENGTH))
+    if settings is None and args.no_time:
+        sys.exit("nothing to do, give --settings or drop --no-time")
+
+    clocks = []
+    if args.emulate:
+        clocks = start_emulators(args.emulate)
+        paths = [clock.path for clock in clocks]
+    else:
+        paths = args.port or discover_ports()
+        if not paths:
+            sys.exit("no clocks found, pass --port")
+    try:
+        started = time.monotonic()
+        reports = provision_all(paths, settings, args.patch, not args.no_time, args.jobs)
+        elapsed = time.monotonic() - started
+    finally:
+        for clock in clocks:
+            clock.stop()
+    if args.json:
+        print(json.dumps({"elapsed_s": round(elapsed, 3), "clocks": reports}, indent=2))
+    else:
+        print_report(reports, elapsed)
+    if any(not report["ok"] for report in reports):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
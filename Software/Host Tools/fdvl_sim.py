@@ -0,0 +1,970 @@
+# fdvl_sim.py
+# Runs the unmodified firmware from "RP2040 Files" on CPython.
+# board, busio, digitalio, analogio, pwmio, countio, keypad, neopixel_write, neopixel,
+# usb_cdc, storage, supervisor, adafruit_ticks, gc, time, asyncio and os are replaced by
+# fakes driven by a virtual clock, with a simulated MAX31343 on the I2C bus.
+# Nothing is put into sys.modules, every Simulator loads its own copy of the firmware.
+import builtins
+import calendar
+import heapq
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+FIRMWARE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "RP2040 Files")
+FIRMWARE_PREFIX = "fdvl_"
+KEY_NUMBERS = {"BOTTOM": 0, "UP": 1, "DOWN": 2}  # Order of the pins given to Buttons in code.py
+TICKS_PERIOD = 1 << 29  # Same wrap as adafruit_ticks
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+
+class SimulationError(Exception):
+    """The firmware did something the simulator cannot model."""
+
+
+class VirtualClock:
+    """Seconds since power-up, advanced only by the scheduler and time.sleep()."""
+
+    def __init__(self, ticks_offset=0):
+        self.now = 0.0
+        self.ticks_offset = ticks_offset  # Start ticks_ms near the wrap to test it
+
+    def ticks_ms(self):
+        return (int(self.now * 1000) + self.ticks_offset) & TICKS_MAX
+
+
+# === Scheduler (asyncio) ===
+
+class _Sleep:
+    def __init__(self, delay):
+        self.delay = delay
+
+    def __await__(self):
+        yield self
+
+
+class _Wait:
+    def __init__(self, target):
+        self.target = target
+
+    def __await__(self):
+        yield self
+
+
+class _TimedWait:
+    """Wait for an Event for at most delay seconds, resumes with True when it timed out."""
+
+    def __init__(self, target, delay):
+        self.target = target
+        self.delay = delay
+
+    def __await__(self):
+        timed_out = yield self
+        return timed_out
+
+
+class _Wake:
+    """Waiter of a timed wait: the Event's set() and the timeout race, the first one resumes the task."""
+
+    def __init__(self, loop, task, target):
+        self.loop = loop
+        self.task = task
+        self.target = target
+        self.done = False
+
+    def __call__(self):
+        if not self.done:
+            self.done = True
+            self.loop.step(self.task)
+
+    def timeout(self):
+        if not self.done:
+            self.done = True
+            self.target.waiters.remove(self)
+            self.task.resume = True
+            self.loop.step(self.task)
+
+
+class WaitFor:
+    """asyncio.wait_for(): await an Event's wait() with a timeout, raises TimeoutError."""
+
+    def __init__(self, awaitable, timeout):
+        self.awaitable = awaitable
+        self.timeout = timeout
+
+    def __await__(self):
+        inner = self.awaitable.__await__()
+        try:
+            request = inner.send(None)
+        except StopIteration as e:
+            return e.value
+        if not isinstance(request, _Wait) or not isinstance(request.target, Event):
+            inner.close()
+            raise SimulationError("wait_for() only supports Event.wait()")
+        timed_out = yield from _TimedWait(request.target, self.timeout).__await__()
+        if timed_out:
+            inner.close()
+            raise TimeoutError()
+        try:
+            inner.send(None)
+        except StopIteration as e:
+            return e.value
+        raise SimulationError("Event.wait() did not return once set")
+
+
+class Task:
+    """A coroutine run by the Loop, awaitable like an asyncio task."""
+
+    def __init__(self, coro):
+        self.coro = coro
+        self.name = getattr(coro, "__name__", "task")
+        self.done = False
+        self.result = None
+        self.resume = None  # Sent to the coroutine when it is stepped next
+        self.waiters = []
+
+    def __await__(self):
+        if not self.done:
+            yield _Wait(self)
+        return self.result
+
+
+class Event:
+    """asyncio.Event on the virtual clock."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.flag = False
+        self.waiters = []
+
+    def is_set(self):
+        return self.flag
+
+    def set(self):
+        self.flag = True
+        for task in self.waiters:
+            self.loop.schedule(task, self.loop.clock.now)
+        self.waiters = []
+
+    def clear(self):
+        self.flag = False
+
+    async def wait(self):
+        if not self.flag:
+            await _Wait(self)
+        return True
+
+
+class Loop:
+    """Runs tasks and callbacks in virtual time order, CPU time takes no virtual time."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.queue = []  # Heap of (when, seq, Task or callable)
+        self.seq = 0
+        self.steps = {}  # Task name -> times it was resumed
+
+    def schedule(self, item, when):
+        self.seq += 1
+        heapq.heappush(self.queue, (when, self.seq, item))
+
+    def spawn(self, coro):
+        task = Task(coro)
+        self.schedule(task, self.clock.now)
+        return task
+
+    def run_until(self, deadline):
+        """Run everything due up to deadline, then leave the clock there."""
+        clock = self.clock
+        queue = self.queue
+        while queue and queue[0][0] <= deadline:
+            when, _, item = heapq.heappop(queue)
+            if when > clock.now:
+                clock.now = when
+            if isinstance(item, Task):
+                self.step(item)
+            else:
+                item()
+        if deadline > clock.now:
+            clock.now = deadline
+
+    def step(self, task):
+        self.steps[task.name] = self.steps.get(task.name, 0) + 1
+        resume, task.resume = task.resume, None
+        try:
+            request = task.coro.send(resume)
+        except StopIteration as e:
+            task.done = True
+            task.result = e.value
+            for waiter in task.waiters:
+                self.schedule(waiter, self.clock.now)
+            task.waiters = []
+            return
+        if request is None:
+            self.schedule(task, self.clock.now)
+        elif isinstance(request, _Sleep):
+            self.schedule(task, self.clock.now + max(0.0, request.delay))
+        elif isinstance(request, _Wait):
+            request.target.waiters.append(task)
+        elif isinstance(request, _TimedWait):
+            wake = _Wake(self, task, request.target)
+            request.target.waiters.append(wake)
+            self.schedule(wake.timeout, self.clock.now + max(0.0, request.delay))
+        else:
+            raise SimulationError("task {} awaited {!r}".format(task.name, request))
+
+
+# === MAX31343 ===
+
+def bcd2bin(value):
+    return (value & 0x0F) + (value >> 4) * 10
+
+
+def bin2bcd(value):
+    return ((value // 10) << 4) | (value % 10)
+
+
+class MAX31343:
+    """Register-level MAX31343: time keeping, SWO edges and alarm 1."""
+    ADDRESS = 0x68
+    R_STATUS = 0x00
+    R_INT_EN = 0x01
+    R_SECONDS = 0x06
+    R_YEAR = 0x0C
+    R_ALM1_SEC = 0x0D
+    STATUS_A1F = 0x01
+    ALARM_LOOKBACK = 31 * 86400  # Alarm 1 repeats at least monthly, older seconds need no check
+
+    def __init__(self, clock, epoch, ppm=0.0):
+        self.clock = clock
+        self.regs = bytearray(0x20)
+        self.ppm = ppm  # Crystal error, positive runs fast
+        self.epoch = epoch  # Time of day (calendar.timegm seconds) at set_at
+        self.set_at = clock.now
+        self.edges = 0  # SWO rising edges before set_at
+        self.checked = epoch  # Last second tested against alarm 1
+        self.pointer = 0
+        self.reads = 0
+        self.writes = 0
+
+    def elapsed(self):
+        return (self.clock.now - self.set_at) * (1 + self.ppm / 1e6)
+
+    def seconds(self):
+        """Current time of day as calendar.timegm seconds."""
+        return self.epoch + int(self.elapsed())
+
+    def swo_edges(self):
+        """Rising edges of the 1 Hz SWO output since power-up, one at the start of every second."""
+        return self.edges + int(self.elapsed())
+
+    def set_seconds(self, seconds):
+        """Load a new time, the divider chain restarts like after a write to the seconds register."""
+        self.edges = self.swo_edges()
+        self.epoch = seconds
+        self.checked = seconds
+        self.set_at = self.clock.now
+
+    def time_registers(self):
+        t = time.gmtime(self.seconds())
+        month = bin2bcd(t.tm_mon) | (0x80 if t.tm_year >= 2000 else 0)
+        return bytes((bin2bcd(t.tm_sec), bin2bcd(t.tm_min), bin2bcd(t.tm_hour), t.tm_wday + 1,
+                      bin2bcd(t.tm_mday), month, bin2bcd(t.tm_year % 100)))
+
+    def alarm_matches(self, seconds):
+        alarm = self.regs[self.R_ALM1_SEC:self.R_ALM1_SEC + 6]
+        t = time.gmtime(seconds)
+        if not alarm[0] & 0x80 and bcd2bin(alarm[0] & 0x7F) != t.tm_sec:
+            return False
+        if not alarm[1] & 0x80 and bcd2bin(alarm[1] & 0x7F) != t.tm_min:
+            return False
+        if not alarm[2] & 0x80 and bcd2bin(alarm[2] & 0x3F) != t.tm_hour:
+            return False
+        if not alarm[3] & 0x80:
+            if alarm[3] & 0x40:
+                if alarm[3] & 0x07 != t.tm_wday + 1:
+                    return False
+            elif bcd2bin(alarm[3] & 0x3F) != t.tm_mday:
+                return False
+        if not alarm[4] & 0x80 and bcd2bin(alarm[4] & 0x1F) != t.tm_mon:
+            return False
+        if not alarm[4] & 0x40 and bcd2bin(alarm[5]) != t.tm_year % 100:
+            return False
+        return True
+
+    def update(self):
+        """Raise the status flags for everything that happened since the last bus access."""
+        now = self.seconds()
+        if now > self.checked:
+            first = max(self.checked + 1, now - self.ALARM_LOOKBACK)
+            for second in range(first, now + 1):
+                if self.alarm_matches(second):
+                    self.regs[self.R_STATUS] |= self.STATUS_A1F
+                    break
+            self.checked = now
+
+    def write(self, data):
+        """I2C write: register pointer, then data with auto-increment."""
+        self.update()
+        if not data:
+            return
+        self.pointer = data[0]
+        data = data[1:]
+        if not data:
+            return
+        self.writes += 1
+        time_regs = bytearray(self.time_registers())
+        touches_time = False
+        for value in data:
+            reg = self.pointer
+            if self.R_SECONDS <= reg <= self.R_YEAR:
+                time_regs[reg - self.R_SECONDS] = value
+                touches_time = True
+            elif reg < len(self.regs):
+                self.regs[reg] = value
+            self.pointer = (reg + 1) % len(self.regs)
+        if touches_time:
+            century = 2000 if time_regs[5] & 0x80 else 1900
+            self.set_seconds(calendar.timegm((
+                century + bcd2bin(time_regs[6]), bcd2bin(time_regs[5] & 0x1F), bcd2bin(time_regs[4] & 0x3F),
+                bcd2bin(time_regs[2] & 0x3F), bcd2bin(time_regs[1] & 0x7F), bcd2bin(time_regs[0] & 0x7F))))
+
+    def read(self, count):
+        """I2C read from the register pointer, reading the status register clears it."""
+        self.update()
+        self.reads += 1
+        time_regs = self.time_registers()
+        out = bytearray(count)
+        for i in range(count):
+            reg = self.pointer
+            if self.R_SECONDS <= reg <= self.R_YEAR:
+                out[i] = time_regs[reg - self.R_SECONDS]
+            elif reg < len(self.regs):
+                out[i] = self.regs[reg]
+                if reg == self.R_STATUS:
+                    self.regs[reg] = 0
+            self.pointer = (reg + 1) % len(self.regs)
+        return out
+
+
+# === Fake CircuitPython modules ===
+
+class Pin:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return "board.{}".format(self.name)
+
+
+class DigitalInOut:
+    def __init__(self, sim, pin):
+        self.sim = sim
+        self.pin = pin
+        self.direction = sim.digitalio.Direction.INPUT
+        self.pull = None
+        self.drive_mode = None
+        self._value = False
+
+    def switch_to_input(self, pull=None):
+        self.direction = self.sim.digitalio.Direction.INPUT
+        self.pull = pull
+
+    def switch_to_output(self, value=False, drive_mode=None):
+        self.direction = self.sim.digitalio.Direction.OUTPUT
+        self._value = value
+
+    @property
+    def value(self):
+        if self.direction == self.sim.digitalio.Direction.OUTPUT:
+            return self._value
+        return self.sim.pin_levels.get(self.pin.name, self.pull == self.sim.digitalio.Pull.UP)
+
+    @value.setter
+    def value(self, value):
+        self._value = bool(value)
+
+    def deinit(self):
+        pass
+
+
+class AnalogIn:
+    reference_voltage = 3.3
+
+    def __init__(self, sim, pin):
+        self.sim = sim
+        self.pin = pin
+
+    @property
+    def value(self):
+        self.sim.adc_reads += 1
+        return self.sim.analog_values.get(self.pin.name, self.sim.light)
+
+    def deinit(self):
+        pass
+
+
+class PWMOut:
+    """Logs every change as (time, frequency, duty_cycle) in sim.pwm_log."""
+
+    def __init__(self, sim, pin, duty_cycle=0, frequency=500, variable_frequency=False):
+        self.sim = sim
+        self.pin = pin
+        self._duty_cycle = duty_cycle
+        self._frequency = frequency
+        self.variable_frequency = variable_frequency
+
+    @property
+    def duty_cycle(self):
+        return self._duty_cycle
+
+    @duty_cycle.setter
+    def duty_cycle(self, value):
+        if not 0 <= value <= 0xFFFF:
+            raise ValueError("duty_cycle must be 0-65535")
+        self._duty_cycle = value
+        self.sim.pwm_log.append((self.sim.clock.now, self._frequency, value))
+
+    @property
+    def frequency(self):
+        return self._frequency
+
+    @frequency.setter
+    def frequency(self, value):
+        if not self.variable_frequency:
+            raise ValueError("PWMOut was not created with variable_frequency")
+        self._frequency = value
+
+    def deinit(self):
+        pass
+
+
+class I2C:
+    def __init__(self, sim, scl, sda, frequency=100000, timeout=255):
+        self.sim = sim
+        self.locked = False
+
+    def device(self, address):
+        device = self.sim.i2c_devices.get(address)
+        if device is None:
+            raise OSError(19, "No I2C device at address: 0x{:x}".format(address))
+        self.sim.i2c_transactions += 1
+        return device
+
+    def try_lock(self):
+        if self.locked or self.sim.i2c_busy:
+            return False
+        self.locked = True
+        return True
+
+    def unlock(self):
+        self.locked = False
+
+    def scan(self):
+        return sorted(self.sim.i2c_devices)
+
+    def writeto(self, address, buffer, *, start=0, end=None):
+        self.device(address).write(bytes(buffer[start:end]))
+
+    def readfrom_into(self, address, buffer, *, start=0, end=None):
+        end = len(buffer) if end is None else end
+        buffer[start:end] = self.device(address).read(end - start)
+
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, *, out_start=0, out_end=None,
+                              in_start=0, in_end=None):
+        device = self.device(address)
+        device.write(bytes(buffer_out[out_start:out_end]))
+        in_end = len(buffer_in) if in_end is None else in_end
+        buffer_in[in_start:in_end] = device.read(in_end - in_start)
+
+    def deinit(self):
+        pass
+
+
+class Counter:
+    """countio.Counter, the SWO pin counts the simulated RTC's 1 Hz edges."""
+
+    def __init__(self, sim, pin, edge=None, pull=None):
+        self.sim = sim
+        self.pin = pin
+        self.offset = self.edges()
+
+    def edges(self):
+        if self.pin.name == self.sim.SWO_PIN and self.sim.swo_connected:
+            return self.sim.rtc.swo_edges()
+        return 0
+
+    @property
+    def count(self):
+        return self.edges() - self.offset
+
+    @count.setter
+    def count(self, value):
+        self.offset = self.edges() - value
+
+    def reset(self):
+        self.count = 0
+
+    def deinit(self):
+        pass
+
+
+class KeyEvent:
+    def __init__(self, key_number=0, pressed=True, timestamp=None):
+        self.key_number = key_number
+        self.pressed = pressed
+        self.released = not pressed
+        self.timestamp = timestamp
+
+
+class EventQueue:
+    def __init__(self, max_events):
+        self.max_events = max_events
+        self.queue = []
+        self.overflowed = False
+
+    def put(self, event):
+        if len(self.queue) >= self.max_events:
+            self.overflowed = True
+            return
+        self.queue.append(event)
+
+    def get(self):
+        return self.queue.pop(0) if self.queue else None
+
+    def get_into(self, event):
+        if not self.queue:
+            return False
+        new = self.queue.pop(0)
+        event.key_number = new.key_number
+        event.pressed = new.pressed
+        event.released = new.released
+        event.timestamp = new.timestamp
+        return True
+
+    def clear(self):
+        self.queue = []
+        self.overflowed = False
+
+    def __len__(self):
+        return len(self.queue)
+
+    def __bool__(self):
+        return bool(self.queue)
+
+
+class Keys:
+    """keypad.Keys, keys change state through Simulator.press() and release()."""
+
+    def __init__(self, sim, pins, *, value_when_pressed, pull=True, interval=0.02, max_events=64):
+        self.sim = sim
+        self.pins = pins
+        self.key_count = len(pins)
+        self.events = EventQueue(max_events)
+        self.pressed = [False] * len(pins)
+        sim.keys.append(self)
+
+    def set(self, key, pressed):
+        if self.pressed[key] != pressed:
+            self.pressed[key] = pressed
+            self.events.put(KeyEvent(key, pressed, self.sim.clock.ticks_ms()))
+
+    def reset(self):
+        self.pressed = [False] * self.key_count
+        self.events.clear()
+
+    def deinit(self):
+        self.sim.keys.remove(self)
+
+
+class SerialPort:
+    """usb_cdc.Serial with a host side: host_write() feeds the device, host_read() takes its output."""
+
+    def __init__(self):
+        self.rx = bytearray()
+        self.tx = bytearray()
+        self.timeout = 1
+        self.write_timeout = None
+        self.connected = True
+
+    @property
+    def in_waiting(self):
+        return len(self.rx)
+
+    @property
+    def out_waiting(self):
+        return 0
+
+    def readinto(self, buffer):
+        count = min(len(buffer), len(self.rx))
+        buffer[:count] = self.rx[:count]
+        del self.rx[:count]
+        return count
+
+    def read(self, size=None):
+        size = len(self.rx) if size is None else min(size, len(self.rx))
+        data = bytes(self.rx[:size])
+        del self.rx[:size]
+        return data
+
+    def readline(self):
+        newline = self.rx.find(b"\n")
+        return self.read(len(self.rx) if newline < 0 else newline + 1)
+
+    def write(self, data):
+        self.tx.extend(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        self.rx.clear()
+
+    def reset_output_buffer(self):
+        pass
+
+    def host_write(self, data):
+        self.rx.extend(data.encode() if isinstance(data, str) else data)
+
+    def host_read(self):
+        data = bytes(self.tx)
+        self.tx.clear()
+        return data
+
+
+class NeoPixel:
+    """Minimal neopixel.NeoPixel on top of the fake neopixel_write."""
+
+    def __init__(self, sim, pin, n, *, bpp=3, brightness=1.0, auto_write=True, pixel_order="GRB"):
+        self.sim = sim
+        self.pin = pin
+        self.n = n
+        self.brightness = brightness
+        self.auto_write = auto_write
+        self.order = tuple("RGB".index(channel) for channel in pixel_order[:3])
+        self.pixels = [(0, 0, 0)] * n
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, index):
+        return self.pixels[index]
+
+    def __setitem__(self, index, color):
+        self.pixels[index] = tuple(color)
+        if self.auto_write:
+            self.show()
+
+    def fill(self, color):
+        self.pixels = [tuple(color)] * self.n
+        if self.auto_write:
+            self.show()
+
+    def show(self):
+        buf = bytearray()
+        for color in self.pixels:
+            buf.extend(int(color[channel] * self.brightness) for channel in self.order)
+        self.sim.neopixel_write(self.pin, buf)
+
+    def deinit(self):
+        pass
+
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    return module
+
+
+class Simulator:
+    """One virtual clock board: fakes, simulated RTC, flash directory and a private copy of the firmware."""
+    SWO_PIN = "GP9"
+    LIGHT_PIN = "GP27"
+    DEFAULT_START = (2025, 6, 1, 12, 0, 0)  # RTC time at power-up
+    DEFAULT_LIGHT = 40000  # ADC value between the bright and dark thresholds
+    HEAP_SIZE = 190000  # Roughly what CircuitPython leaves free on an RP2040
+
+    def __init__(self, firmware_dir=FIRMWARE_DIR, flash_dir=None, start=DEFAULT_START, ppm=0.0,
+                 ticks_offset=0, echo=False, settings=None):
+        self.firmware_dir = os.path.abspath(firmware_dir)
+        if flash_dir is None:
+            self.tempdir = tempfile.TemporaryDirectory(prefix="fdvl_flash_")
+            flash_dir = self.tempdir.name
+        self.flash_dir = flash_dir
+        if settings is not None:
+            with open(os.path.join(flash_dir, "settings.txt"), "w") as f:
+                json.dump(settings, f)
+        elif not os.path.exists(os.path.join(flash_dir, "settings.txt")):
+            shutil.copy(os.path.join(self.firmware_dir, "settings.txt"), flash_dir)
+        self.echo = echo
+        self.output = []  # Lines printed by the firmware
+
+        self.clock = VirtualClock(ticks_offset)
+        self.loop = Loop(self.clock)
+        self.rtc = MAX31343(self.clock, calendar.timegm(start), ppm)
+        self.i2c_devices = {MAX31343.ADDRESS: self.rtc}
+        self.i2c_busy = False  # Set to make every try_lock() fail
+        self.swo_connected = True  # Clear to count no SWO edges, the firmware falls back to reading the RTC
+        self.i2c_transactions = 0
+        self.light = self.DEFAULT_LIGHT
+        self.analog_values = {}
+        self.adc_reads = 0
+        self.pin_levels = {}
+        self.keys = []
+        self.leds = {}  # Pin name -> last buffer written
+        self.led_writes = 0
+        self.pwm_log = []
+        self.mem_free = self.HEAP_SIZE - 60000  # Reported by gc.mem_free(), set it to test low-memory paths
+        self.serial = SerialPort()
+        self.console = SerialPort()
+        self.modules = {}
+        self.firmware = None  # Globals of code.py once booted
+        self.fakes = self.make_fakes()
+        self.builtins = dict(builtins.__dict__, __import__=self.import_module, open=self.open, print=self.print)
+
+    # --- Fake modules ---
+
+    def make_fakes(self):
+        sim = self
+        pins = {}
+        for number in range(30):
+            pins["GP{}".format(number)] = Pin("GP{}".format(number))
+        for number in range(4):
+            pins["A{}".format(number)] = pins["GP{}".format(26 + number)]
+        pins["LED"] = pins["GP25"]
+        fakes = {}
+        fakes["board"] = _module("board", **pins)
+        self.digitalio = fakes["digitalio"] = _module(
+            "digitalio",
+            DigitalInOut=lambda pin: DigitalInOut(sim, pin),
+            Direction=types.SimpleNamespace(INPUT="INPUT", OUTPUT="OUTPUT"),
+            Pull=types.SimpleNamespace(UP="UP", DOWN="DOWN"),
+            DriveMode=types.SimpleNamespace(PUSH_PULL="PUSH_PULL", OPEN_DRAIN="OPEN_DRAIN"))
+        fakes["analogio"] = _module("analogio", AnalogIn=lambda pin: AnalogIn(sim, pin))
+        fakes["pwmio"] = _module("pwmio", PWMOut=lambda pin, **kwargs: PWMOut(sim, pin, **kwargs))
+        fakes["busio"] = _module("busio", I2C=lambda scl, sda, **kwargs: I2C(sim, scl, sda, **kwargs))
+        fakes["countio"] = _module(
+            "countio",
+            Counter=lambda pin, **kwargs: Counter(sim, pin, **kwargs),
+            Edge=types.SimpleNamespace(RISE="RISE", FALL="FALL", RISE_AND_FALL="RISE_AND_FALL"))
+        fakes["keypad"] = _module(
+            "keypad",
+            Keys=lambda pins, **kwargs: Keys(sim, pins, **kwargs),
+            Event=KeyEvent)
+        fakes["neopixel_write"] = _module("neopixel_write", neopixel_write=self.neopixel_write)
+        fakes["neopixel"] = _module(
+            "neopixel", RGB="RGB", GRB="GRB", RGBW="RGBW", GRBW="GRBW",
+            NeoPixel=lambda pin, n, **kwargs: NeoPixel(sim, pin, n, **kwargs))
+        fakes["usb_cdc"] = _module(
+            "usb_cdc", data=self.serial, console=self.console,
+            enable=lambda console=True, data=False: None)
+        fakes["storage"] = _module(
+            "storage", enable_usb_drive=lambda: None, disable_usb_drive=lambda: None,
+            remount=lambda path, readonly=False, **kwargs: None)
+        fakes["supervisor"] = _module(
+            "supervisor", ticks_ms=self.clock.ticks_ms,
+            runtime=types.SimpleNamespace(serial_connected=True, serial_bytes_available=0))
+        fakes["adafruit_ticks"] = _module(
+            "adafruit_ticks", ticks_ms=self.clock.ticks_ms, ticks_add=ticks_add, ticks_diff=ticks_diff,
+            ticks_less=lambda a, b: ticks_diff(a, b) < 0)
+        fakes["time"] = _module(
+            "time", monotonic=lambda: sim.clock.now, monotonic_ns=lambda: int(sim.clock.now * 1e9),
+            sleep=self.sleep, time=lambda: int(sim.rtc.seconds()), struct_time=time.struct_time,
+            localtime=lambda seconds=None: time.gmtime(sim.rtc.seconds() if seconds is None else seconds),
+            mktime=lambda t: calendar.timegm(tuple(t)[:6]))
+        fakes["gc"] = _module(
+            "gc", mem_free=lambda: sim.mem_free, mem_alloc=lambda: sim.HEAP_SIZE - sim.mem_free,
+            collect=lambda: None, enable=lambda: None, disable=lambda: None, isenabled=lambda: True)
+        fakes["asyncio"] = _module(
+            "asyncio", sleep=_Sleep, sleep_ms=lambda ms: _Sleep(ms / 1000),
+            create_task=self.loop.spawn, gather=self.gather, run=self.run,
+            wait_for=WaitFor, wait_for_ms=lambda awaitable, timeout: WaitFor(awaitable, timeout / 1000),
+            TimeoutError=TimeoutError, Event=lambda: Event(self.loop), Task=Task)
+        fakes["os"] = _module(
+            "os", sep="/", listdir=lambda path="/": os.listdir(self.flash_path(path)),
+            remove=lambda path: os.remove(self.flash_path(path)),
+            rename=self.rename, stat=lambda path: os.stat(self.flash_path(path)),
+            mkdir=lambda path: os.mkdir(self.flash_path(path)), sync=lambda: None,
+            getenv=lambda key, default=None: default, urandom=os.urandom,
+            uname=lambda: ("rp2040", "rp2040", "9.2.7", "9.2.7 on host", "Simulated FEDEVEL clock"))
+        return fakes
+
+    def neopixel_write(self, pin, buf):
+        # The firmware passes a DigitalInOut, NeoPixel passes the pin itself
+        self.leds[getattr(pin, "pin", pin).name] = bytes(buf)
+        self.led_writes += 1
+
+    def sleep(self, seconds):
+        # Blocking sleep, the whole board stands still like on the device
+        self.clock.now += max(0.0, seconds)
+
+    async def gather(self, *awaitables):
+        tasks = [item if isinstance(item, Task) else self.loop.spawn(item) for item in awaitables]
+        return [await task for task in tasks]
+
+    def run(self, coro):
+        """asyncio.run(): schedule main and run until the boot deadline, advance() continues it."""
+        self.loop.spawn(coro)
+        self.loop.run_until(self.boot_until)
+
+    def flash_path(self, path):
+        return os.path.join(self.flash_dir, path.lstrip("/"))
+
+    def open(self, path, *args, **kwargs):
+        if isinstance(path, str):
+            path = self.flash_path(path)
+        return open(path, *args, **kwargs)
+
+    def rename(self, old, new):
+        # FAT cannot rename over an existing file, the firmware handles that case
+        if os.path.exists(self.flash_path(new)):
+            raise OSError(17, "File exists")
+        os.rename(self.flash_path(old), self.flash_path(new))
+
+    def print(self, *args, sep=" ", end="\n", file=None, flush=False):
+        line = sep.join(str(arg) for arg in args)
+        self.output.append(line)
+        if self.echo:
+            sys.stdout.write("[{:10.3f}] {}{}".format(self.clock.now, line, end))
+
+    # --- Firmware loading ---
+
+    def import_module(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if name in self.fakes:
+            return self.fakes[name]
+        if name in self.modules:
+            return self.modules[name]
+        path = os.path.join(self.firmware_dir, name + ".py")
+        if name.startswith(FIRMWARE_PREFIX) and os.path.exists(path):
+            return self.load(name, path)
+        return builtins.__import__(name, globals, locals, fromlist, level)
+
+    def load(self, name, path):
+        """Execute a firmware file as a module that imports through the fakes."""
+        module = types.ModuleType(name)
+        module.__file__ = path
+        module.__builtins__ = self.builtins
+        self.modules[name] = module
+        with open(path) as f:
+            source = f.read()
+        exec(compile(source, path, "exec"), module.__dict__)
+        return module
+
+    def module(self, name):
+        """A firmware module loaded against this simulator, e.g. module("fdvl_display")."""
+        return self.import_module(name)
+
+    def boot(self, run_for=0.0):
+        """Run code.py: module-level setup, then the task loop for run_for virtual seconds."""
+        self.boot_until = self.clock.now + run_for
+        path = os.path.join(self.firmware_dir, "code.py")
+        self.firmware = {"__name__": "__main__", "__file__": path, "__builtins__": self.builtins}
+        with open(path) as f:
+            source = f.read()
+        exec(compile(source, path, "exec"), self.firmware)
+        return self.firmware
+
+    def soft_reset(self, run_for=0.0):
+        """Ctrl-D: stop the firmware and run code.py again, the RTC and the flash keep their state."""
+        self.loop.queue.clear()
+        self.keys = []
+        self.modules = {}
+        return self.boot(run_for)
+
+    def advance(self, seconds):
+        """Run the firmware for a number of virtual seconds."""
+        self.loop.run_until(self.clock.now + seconds)
+
+    def at(self, delay, callback):
+        """Call callback after delay virtual seconds, between firmware tasks."""
+        self.loop.schedule(callback, self.clock.now + delay)
+
+    # --- Inputs ---
+
+    def key_number(self, key):
+        return KEY_NUMBERS[key] if isinstance(key, str) else key
+
+    def press(self, key):
+        for keys in self.keys:
+            keys.set(self.key_number(key), True)
+
+    def release(self, key):
+        for keys in self.keys:
+            keys.set(self.key_number(key), False)
+
+    def click(self, key, hold=0.1):
+        """Press now and release after hold seconds."""
+        self.press(key)
+        self.at(hold, lambda: self.release(key))
+
+    # --- Outputs ---
+
+    def read_display(self, display=None):
+        """Decode the LED framebuffer into text like "12:34", lit segments that form no glyph are "?"."""
+        display = display or self.firmware["display"]
+        frame = display.frame
+        glyphs = {}
+        for index, mask in enumerate(display.GLYPHS):
+            glyphs.setdefault(mask, index)
+        text = ""
+        for position in range(4):
+            mask = 0
+            for bit, offset in enumerate(display.SEGMENT_INDEX[position]):
+                if frame[offset] or frame[offset + 1] or frame[offset + 2]:
+                    mask |= 1 << bit
+            glyph = glyphs.get(mask)
+            if glyph is None:
+                text += "?"
+            elif glyph < 10:
+                text += str(glyph)
+            elif glyph == display.MINUS:
+                text += "-"
+            else:
+                text += " "
+            if position == 1:
+                offset = display.DOT_INDEX[0]
+                text += ":" if frame[offset] or frame[offset + 1] or frame[offset + 2] else " "
+        return text
+
+    def buzzer_on_time(self):
+        """Virtual seconds the buzzer PWM had a non-zero duty cycle."""
+        total = 0.0
+        since = None
+        for when, frequency, duty in self.pwm_log:
+            if duty and since is None:
+                since = when
+            elif not duty and since is not None:
+                total += when - since
+                since = None
+        if since is not None:
+            total += self.clock.now - since
+        return total
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) % TICKS_PERIOD
+
+
+def ticks_diff(ticks1, ticks2):
+    diff = (ticks1 - ticks2) & TICKS_MAX
+    return ((diff + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
+
+
+if __name__ == "__main__":
+    # Boot the firmware and print what the display shows once per virtual second
+    import argparse
+    parser = argparse.ArgumentParser(description="Run the clock firmware on the host.")
+    parser.add_argument("--seconds", type=float, default=10.0, help="virtual seconds to run")
+    parser.add_argument("--quiet", action="store_true", help="do not echo firmware output")
+    args = parser.parse_args()
+    sim = Simulator(echo=not args.quiet)
+    sim.boot()
+    for _ in range(int(args.seconds)):
+        sim.advance(1.0)
+        print("[{:10.3f}] display {}".format(sim.clock.now, sim.read_display()))
@@ -0,0 +1,129 @@
+# test_alarms.py
+# Daily alarms over a simulated week: every alarm must fire exactly once in its minute on
+# its weekdays, and never on other days.
+# The alarm engine is walked through the whole week second by second with the stalls a
+# busy loop produces, the firmware itself runs in fdvl_sim across the turn of the week.
+import calendar
+import random
+import sys
+import time
+import unittest
+
+from fdvl_sim import FIRMWARE_DIR, Simulator
+
+sys.path.insert(0, FIRMWARE_DIR)
+from fdvl_alarms import Alarms, EVERY_DAY  # noqa: E402
+from fdvl_schedule import MINUTES_PER_DAY  # noqa: E402
+
+WEEK_START = (2025, 6, 2, 0, 0, 0)  # A Monday
+MAX_STALL = 240  # Longest stall of the walk in seconds, within Alarms.CATCH_UP_MINUTES
+SEEDS = range(1, 21)  # Seeds of the random loop stalls
+
+# (minute of day, weekday mask), two alarms share 07:30 and the edges of the day are covered
+ALARMS = (
+    (0, EVERY_DAY),
+    (7 * 60 + 30, 0x1F),  # Monday to Friday
+    (7 * 60 + 30, 0x01),  # Monday only, same minute as the one above
+    (9 * 60, 0x60),  # Weekend
+    (12 * 60 + 15, 0x04),  # Wednesday
+    (23 * 60 + 59, 0x40),  # Sunday, the last minute of the week
+    (23 * 60 + 59, 0x00),  # No day, never fires
+)
+
+
+def expected_fires(start, end):
+    """(day number, minute of day, alarm index) of every alarm minute from start to end."""
+    expected = []
+    for minute_start in range(start - start % 60 + 60, end + 1, 60):
+        t = time.gmtime(minute_start)
+        minute = t.tm_hour * 60 + t.tm_min
+        for index, (alarm_minute, mask) in enumerate(ALARMS):
+            if alarm_minute == minute and mask & (1 << t.tm_wday):
+                expected.append((minute_start // 86400, minute, index))
+    return expected
+
+
+def walk_week(seed):
+    """Feed a week of clock time to the engine the way the firmware does, return the problems."""
+    rng = random.Random(seed)
+    alarms = Alarms()
+    alarms.build([(minute, mask, index) for index, (minute, mask) in enumerate(ALARMS)])
+    start = calendar.timegm(WEEK_START) - 30
+    end = start + 7 * 86400 + 120
+    fired = []
+    now = start
+    checked_minute = -1
+    while True:
+        t = time.gmtime(now)
+        if t.tm_min != checked_minute:
+            checked_minute = t.tm_min
+            minute = t.tm_hour * 60 + t.tm_min
+            for index in alarms.check(t.tm_wday, minute):
+                # A caught up alarm belongs to the day of its own minute, which may be before midnight
+                alarm_minute = ALARMS[index][0]
+                alarm_start = now - now % 60 - (minute - alarm_minute) % MINUTES_PER_DAY * 60
+                fired.append((alarm_start // 86400, alarm_minute, index))
+        if now >= end:
+            break
+        # Mostly one SWO tick per check, now and then a stall of up to a few minutes, the last one ends at end
+        now = min(now + (rng.randint(60, MAX_STALL) if rng.random() < 0.002 else rng.randint(1, 2)), end)
+    return compare(expected_fires(start, end), fired)
+
+
+def run_firmware(swo=True):
+    """Run code.py from Sunday 23:50 to Monday 00:10 and count the alarms it sounds."""
+    settings = {"alarms": [
+        {"time": "23:55", "days": [6]},
+        {"time": "23:56", "days": [0]},  # Monday only, not on Sunday
+        {"time": "00:00"},
+        {"time": "00:00", "days": [0], "melody": "C5:100 E5:100"},
+        {"time": "00:05", "days": [1]},  # Tuesday only, not on Monday
+    ]}
+    sim = Simulator(start=(2025, 6, 1, 23, 50, 0), settings=settings)
+    sim.swo_connected = swo
+    sounded = []
+    try:
+        sim.boot(1.0)
+        sequencer = sim.firmware["sequencer"]
+        play = sequencer.play
+
+        def record(pattern):
+            clock_time = sim.firmware["clock"].time
+            sounded.append("{:02d}:{:02d}".format(clock_time["tm_hour"], clock_time["tm_min"]))
+            play(pattern)
+
+        sequencer.play = record
+        sim.advance(20 * 60)
+    finally:
+        sim.tempdir.cleanup()
+    return compare(["23:55", "00:00", "00:00"], sounded)
+
+
+def compare(expected, fired):
+    problems = []
+    for item in sorted(set(expected) | set(fired)):
+        want = expected.count(item)
+        got = fired.count(item)
+        if got < want:
+            problems.append("missed {}".format(item))
+        elif got > want:
+            problems.append("{} extra fire(s) of {}".format(got - want, item))
+    return problems
+
+
+class WeekTest(unittest.TestCase):
+    def test_engine(self):
+        for seed in SEEDS:
+            with self.subTest(seed=seed):
+                self.assertEqual(walk_week(seed), [])
+
+    def test_firmware(self):
+        self.assertEqual(run_firmware(), [])
+
+    def test_firmware_without_swo(self):
+        # The RTC is read every second instead, the alarms must not depend on SWO ticks
+        self.assertEqual(run_firmware(swo=False), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+# test_buttons.py
+# fdvl_buttons on the fake keypad of fdvl_sim: hold times become SHORT, LONG and REPEAT
+# events, also with ticks_ms close to its wrap, and keys held at power-up stay silent.
+import unittest
+
+from fdvl_sim import TICKS_PERIOD, Simulator
+
+SCAN = 0.01  # BUTTON_INTERVAL in code.py
+
+
+class ButtonsTest(unittest.TestCase):
+    ticks_offset = 0
+
+    def setUp(self):
+        self.sim = Simulator(ticks_offset=self.ticks_offset)
+        self.addCleanup(self.sim.tempdir.cleanup)
+        board = self.sim.fakes["board"]
+        self.buttons = self.sim.module("fdvl_buttons").Buttons(board.GP15, board.GP14, board.GP13)
+
+    def run_scans(self, seconds):
+        """Poll get_event() like button_task, return the events seen."""
+        events = []
+        start = self.sim.clock.now
+        while self.sim.clock.now - start < seconds:
+            event = self.buttons.get_event()
+            if event:
+                events.append(event)
+            self.sim.clock.now += SCAN
+        return events
+
+    def test_short(self):
+        self.run_scans(0.5)
+        self.sim.press("BOTTOM")
+        self.run_scans(0.2)
+        self.sim.release("BOTTOM")
+        self.assertEqual(self.run_scans(0.2), ["BOTTOM_SHORT"])
+
+    def test_long_and_repeat(self):
+        self.run_scans(0.5)
+        self.sim.press("UP")
+        events = self.run_scans(1.5)
+        self.sim.release("UP")
+        events += self.run_scans(0.2)
+        self.assertEqual(events, ["UP_LONG", "UP_REPEAT", "UP_REPEAT"])
+
+    def test_chord(self):
+        self.run_scans(0.5)
+        self.sim.press("UP")
+        self.run_scans(0.1)
+        self.sim.press("DOWN")
+        self.run_scans(0.1)
+        self.sim.release("UP")
+        self.sim.release("DOWN")
+        self.assertEqual(self.run_scans(0.2), ["UP_DOWN_CHORD"])
+
+    def test_held_at_power_up(self):
+        # Pressed before the pull-ups settled, released after: neither a press nor a chord
+        self.sim.press("BOTTOM")
+        self.run_scans(0.4)
+        self.sim.release("BOTTOM")
+        self.assertEqual(self.run_scans(0.5), [])
+        # The next press is a normal one
+        self.sim.press("BOTTOM")
+        self.run_scans(0.1)
+        self.sim.release("BOTTOM")
+        self.assertEqual(self.run_scans(0.2), ["BOTTOM_SHORT"])
+
+
+class WrapTest(ButtonsTest):
+    """ticks_ms starts 65 s before its wrap like after a CircuitPython reset."""
+    ticks_offset = TICKS_PERIOD - 65536
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+# test_buzzer.py
+# buzzer_task of code.py in fdvl_sim: every step of a pattern starts on time, also when a
+# new pattern replaces one whose step the task is still sleeping on.
+import unittest
+
+from fdvl_sim import Simulator
+
+
+class BuzzerTaskTest(unittest.TestCase):
+    def setUp(self):
+        self.sim = Simulator()
+        self.addCleanup(self.sim.tempdir.cleanup)
+        self.sim.boot(2.0)
+        self.parse_melody = self.sim.module("fdvl_buzzer").parse_melody
+
+    def play(self, melody):
+        """Start a pattern like alert() does, return the virtual time it started."""
+        sequencer = self.sim.firmware["sequencer"]
+        sequencer.play(self.parse_melody(melody))
+        self.sim.firmware["state"].buzzer_started.set()
+        return self.sim.clock.now
+
+    def steps(self, since):
+        """(seconds after since, frequency, on) of every PWM change, rounded to ms."""
+        return [(round(when - since, 3), frequency, bool(duty))
+                for when, frequency, duty in self.sim.pwm_log if when >= since]
+
+    def test_steps_on_time(self):
+        start = self.play("1000:100 -:50 2000:200")
+        self.sim.advance(1.0)
+        self.assertEqual(self.steps(start), [(0.0, 1000, True), (0.1, 1000, False), (0.15, 2000, True),
+                                             (0.35, 2000, False)])
+
+    def test_new_pattern_wakes_the_task(self):
+        self.play("1000:3000")
+        self.sim.advance(0.5)
+        start = self.play("2000:100 -:100 3000:100")
+        self.sim.advance(4.0)
+        self.assertEqual(self.steps(start), [(0.0, 2000, True), (0.1, 2000, False), (0.2, 3000, True),
+                                             (0.3, 3000, False)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+# test_display.py
+# Change-driven redraw of fdvl_display: frames that look the same are not sent again,
+# and the LEDs end up exactly as if every frame had been sent.
+import unittest
+
+from fdvl_sim import Simulator
+
+FRAME = 1.0 / 60  # Display task period in code.py
+
+
+class RedrawTest(unittest.TestCase):
+    def setUp(self):
+        self.sim = Simulator()
+        self.addCleanup(self.sim.tempdir.cleanup)
+        board = self.sim.fakes["board"]
+        Display = self.sim.module("fdvl_display").Display
+        self.skipping = Display(board.GP18, board.GP28)
+        self.always = Display(board.GP16, board.GP17)  # Same display, pushed on every frame
+        self.frames = 0
+
+    def frame(self, show, *args):
+        """Draw one frame on both displays and check that their LEDs match."""
+        self.always.invalidate()
+        getattr(self.skipping, show)(*args)
+        getattr(self.always, show)(*args)
+        self.frames += 1
+        leds = self.sim.leds
+        self.assertEqual(leds.get("GP18"), leds.get("GP16"), "chain 1 after {} frames".format(self.frames))
+        self.assertEqual(leds.get("GP28"), leds.get("GP17"), "chain 2 after {} frames".format(self.frames))
+        self.sim.clock.now += FRAME
+
+    def run_clock(self, seconds, brightness="NORMAL"):
+        """show_time at 60 Hz, the dots follow a 50% SWO square wave."""
+        start = self.sim.clock.now
+        while self.sim.clock.now - start < seconds:
+            elapsed = int(self.sim.clock.now)
+            rtc_time = {'tm_hour': 12 + elapsed // 3600, 'tm_min': elapsed // 60 % 60, 'tm_sec': elapsed % 60}
+            swo_state = self.sim.clock.now % 1.0 < 0.5
+            self.frame("show_time", rtc_time, swo_state, brightness)
+
+    def test_clock_pushes_only_changes(self):
+        self.run_clock(120)
+        # Two dot changes and now and then a new minute per second, the other 58 frames are skipped
+        self.assertEqual(self.always.frames_pushed, self.frames)
+        self.assertEqual(self.skipping.frames_pushed + self.skipping.frames_skipped, self.frames)
+        self.assertLessEqual(self.skipping.frames_pushed, 2 * 120 + 3)
+        self.assertGreaterEqual(self.skipping.frames_skipped, self.frames - 2 * 120 - 3)
+
+    def test_every_kind_of_frame(self):
+        self.run_clock(5)
+        self.run_clock(3, "BRIGHT")  # A fade changes the level on every frame
+        for n in range(300):
+            self.frame("show_timer", 30 - n // 60, n % 60 < 30, "NORMAL")
+        for n in range(300):
+            self.frame("show_stopwatch", 59000 + n * 17, n % 60 < 30, "NORMAL")
+        rtc_time = {'tm_hour': 12, 'tm_min': 0, 'tm_sec': 0}
+        for n in range(60):
+            self.frame("show_time_with_effect", rtc_time, True, n * FRAME)
+        self.run_clock(2, "DARK")
+        self.assertEqual(self.always.frames_pushed, self.frames)
+        self.assertLess(self.skipping.frames_pushed, self.frames)
+
+    def test_dots_do_not_alias_a_digit(self):
+        # 12:00 with the dots lit, then 12:04 with them dark
+        self.frame("show_time", {'tm_hour': 12, 'tm_min': 0, 'tm_sec': 0}, True, "NORMAL")
+        self.frame("show_time", {'tm_hour': 12, 'tm_min': 4, 'tm_sec': 0}, False, "NORMAL")
+        self.assertEqual(self.skipping.frames_pushed, 2)
+
+    def test_pushes_write_both_chains(self):
+        writes = self.sim.led_writes
+        self.run_clock(10)
+        self.assertEqual(self.sim.led_writes - writes, 2 * (self.skipping.frames_pushed + self.always.frames_pushed))
+
+
+if __name__ == "__main__":
+    unittest.main()
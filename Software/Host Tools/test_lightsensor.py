@@ -0,0 +1,92 @@
+# test_lightsensor.py
+# fdvl_lightsensor fed with synthetic ADC traces through the fake analogio of fdvl_sim:
+# bursts are only taken every sample interval, and noise around a threshold does not
+# make the mode flicker.
+import random
+import unittest
+
+from fdvl_sim import Simulator
+
+FRAME = 1.0 / 60  # get_brightness() is called once per display frame
+BRIGHT = 30000
+DARK = 49000
+BAND = 2000  # LightSensor.HYSTERESIS
+
+
+class LightSensorTest(unittest.TestCase):
+    def setUp(self):
+        self.sim = Simulator()
+        self.addCleanup(self.sim.tempdir.cleanup)
+        self.sim.light = 40000  # Between the thresholds
+        LightSensor = self.sim.module("fdvl_lightsensor").LightSensor
+        self.sensor = LightSensor(self.sim.fakes["board"].GP27, BRIGHT, DARK)
+
+    def run_trace(self, trace, seconds):
+        """Set the ADC to trace(t) before every frame, return the modes seen in order without repeats."""
+        modes = [self.sensor.mode]
+        start = self.sim.clock.now
+        while self.sim.clock.now - start < seconds:
+            self.sim.light = max(0, min(65535, int(trace(self.sim.clock.now - start))))
+            mode = self.sensor.get_brightness()
+            if mode != modes[-1]:
+                modes.append(mode)
+            self.sim.clock.now += FRAME
+        return modes
+
+    def noise(self, center, amplitude, seed=1):
+        rng = random.Random(seed)
+        return lambda t: center + rng.uniform(-amplitude, amplitude)
+
+    def test_sampling_interval(self):
+        reads = self.sim.adc_reads
+        self.run_trace(self.noise(40000, 5000), 10.0)
+        bursts = (self.sim.adc_reads - reads) // self.sensor.OVERSAMPLE
+        self.assertEqual((self.sim.adc_reads - reads) % self.sensor.OVERSAMPLE, 0)
+        self.assertIn(bursts, (19, 20))  # Every 0.5 s
+        # One read per frame before, 60 per second, now OVERSAMPLE per burst, 8 per second
+        self.assertLessEqual(self.sim.adc_reads - reads, 10 * 8)
+
+    def test_configured_interval(self):
+        self.sensor.update_thresholds(BRIGHT, DARK, interval=2.0)
+        self.run_trace(lambda t: 40000, 1.0)  # The burst already scheduled
+        reads = self.sim.adc_reads
+        self.run_trace(lambda t: 40000, 10.0)
+        self.assertIn((self.sim.adc_reads - reads) // self.sensor.OVERSAMPLE, (5, 6))
+
+    def test_level_follows_the_light(self):
+        # 1/4 of the way per burst, settled within 30 s
+        self.run_trace(lambda t: 12345, 30.0)
+        self.assertLessEqual(abs(self.sensor.level - 12345), 4)
+        self.run_trace(lambda t: 65535, 30.0)
+        self.assertLessEqual(abs(self.sensor.level - 65535), 4)
+
+    def test_spike_is_filtered(self):
+        self.run_trace(lambda t: 45000, 5.0)
+        modes = self.run_trace(lambda t: 65535 if 1.0 <= t < 1.1 else 45000, 5.0)
+        self.assertEqual(modes, ["NORMAL"])
+
+    def test_bright_threshold_hysteresis(self):
+        # Noise across the threshold, inside the band: no switch either way
+        self.assertEqual(self.run_trace(self.noise(BRIGHT, BAND * 0.9), 30.0), ["NORMAL"])
+        self.assertEqual(self.run_trace(lambda t: BRIGHT - 2 * BAND, 10.0), ["NORMAL", "BRIGHT"])
+        self.assertEqual(self.run_trace(self.noise(BRIGHT, BAND * 0.9, seed=2), 30.0), ["BRIGHT"])
+        # Leaving takes more than the band above the threshold
+        self.assertEqual(self.run_trace(lambda t: BRIGHT + BAND * 0.9, 10.0), ["BRIGHT"])
+        self.assertEqual(self.run_trace(lambda t: BRIGHT + 2 * BAND, 10.0), ["BRIGHT", "NORMAL"])
+
+    def test_dark_threshold_hysteresis(self):
+        self.assertEqual(self.run_trace(self.noise(DARK, BAND * 0.9), 30.0), ["NORMAL"])
+        self.assertEqual(self.run_trace(lambda t: DARK + 2 * BAND, 10.0), ["NORMAL", "DARK"])
+        self.assertEqual(self.run_trace(self.noise(DARK, BAND * 0.9, seed=2), 30.0), ["DARK"])
+        self.assertEqual(self.run_trace(lambda t: DARK - BAND * 0.9, 10.0), ["DARK"])
+        self.assertEqual(self.run_trace(lambda t: DARK - 2 * BAND, 10.0), ["DARK", "NORMAL"])
+
+    def test_slow_ramp_switches_once_per_threshold(self):
+        # Dusk over a minute with noise on top, from bright through normal to dark
+        rng = random.Random(3)
+        modes = self.run_trace(lambda t: 20000 + 40000 * t / 60 + rng.uniform(-1500, 1500), 60.0)
+        self.assertEqual(modes, ["NORMAL", "BRIGHT", "NORMAL", "DARK"])
+
+
+if __name__ == "__main__":
+    unittest.main()
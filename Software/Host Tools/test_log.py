@@ -0,0 +1,68 @@
+# test_log.py
+# fdvl_log ring buffer: repeats are folded into one record, only identical debug and info
+# records are rate-limited, and records keep no references to the objects logged.
+import unittest
+
+from fdvl_sim import Simulator
+
+
+class LogTest(unittest.TestCase):
+    def setUp(self):
+        self.sim = Simulator()
+        self.addCleanup(self.sim.tempdir.cleanup)
+        self.fdvl_log = self.sim.module("fdvl_log")
+        self.log = self.fdvl_log.Log()
+
+    def records(self):
+        return [(level, text, repeats) for tick, level, text, repeats in self.log.records()]
+
+    def test_repeats_folded(self):
+        for n in range(5):
+            self.log.info("Tick {}", 1)
+        self.log.info("Tick {}", 2)
+        self.assertEqual(self.records(), [("INFO", "Tick 1", 4), ("INFO", "Tick 2", 0)])
+
+    def test_rate_limit_identical_only(self):
+        # Interleaved with other messages, an identical record within RATE_LIMIT_MS is folded
+        for n in range(3):
+            self.log.info("RTC read {}", "ok")
+            self.log.debug("SWO ticks {}", 1)
+            self.log.info("Value {}", n)  # Other arguments always get a record
+            self.sim.clock.now += 0.1
+        self.assertEqual(self.records(), [
+            ("INFO", "RTC read ok", 2), ("DEBUG", "SWO ticks 1", 2),
+            ("INFO", "Value 0", 0), ("INFO", "Value 1", 0), ("INFO", "Value 2", 0)])
+        self.sim.clock.now += 1.0
+        self.log.info("RTC read {}", "ok")
+        self.assertEqual(self.records()[-1], ("INFO", "RTC read ok", 0))
+
+    def test_warnings_never_limited(self):
+        for n in range(3):
+            self.log.warning("Bus busy {}", 0x68)
+            self.log.error("Write failed {}", 0x68)
+        self.assertEqual(self.records(), [("WARNING", "Bus busy 104", 0), ("ERROR", "Write failed 104", 0)] * 3)
+
+    def test_arguments_compacted(self):
+        settings = {"gamma": 2.2}
+        error = ValueError("bad value " + "x" * 100)
+        self.log.info("Settings {} after {}", settings, error)
+        settings["gamma"] = 1.0
+        text = self.records()[0][1]
+        self.assertTrue(text.startswith("Settings {'gamma': 2.2} after bad value xxx"))
+        self.assertTrue(text.endswith("..."))
+        kept = self.log.args[:3]
+        self.assertNotIn(settings, kept)
+        self.assertLessEqual(len(kept[1]), self.log.MAX_ARG_LENGTH)
+        self.log.info("Numbers {} {:.1f} {}", 12345, 0.25, None)
+        self.assertEqual(self.records()[1][1], "Numbers 12345 0.2 None")
+
+    def test_clear(self):
+        self.log.info("Tick {}", 1)
+        self.log.clear()
+        self.log.debug("Other")
+        self.log.info("Tick {}", 1)
+        self.assertEqual(self.records(), [("DEBUG", "Other", 0), ("INFO", "Tick 1", 0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
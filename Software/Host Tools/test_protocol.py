@@ -0,0 +1,181 @@
+# test_protocol.py
+# Binary frames of fdvl_protocol: everything encoded decodes to the same values, and
+# corrupt or incomplete frames are rejected.
+import sys
+import types
+import unittest
+
+from fdvl_sim import FIRMWARE_DIR, Simulator
+
+sys.path.insert(0, FIRMWARE_DIR)
+import fdvl_protocol as protocol  # noqa: E402
+
+
+class FrameTest(unittest.TestCase):
+    def test_crc(self):
+        # Check value of CRC-16/CCITT-FALSE
+        self.assertEqual(protocol.crc16(b"123456789"), 0x29B1)
+
+    def test_round_trip(self):
+        for seq, payload in ((0, b""), (1, b"\x02\x00"), (255, bytes(range(256))),
+                             (7, bytes(protocol.MAX_PAYLOAD))):
+            frame = protocol.encode_frame(seq, payload)
+            self.assertEqual(frame[0], protocol.FRAME_MAGIC)
+            self.assertEqual(protocol.frame_size(frame[:protocol.HEADER_SIZE]), len(frame))
+            decoded_seq, decoded = protocol.decode_frame(frame)
+            self.assertEqual(decoded_seq, seq)
+            self.assertEqual(bytes(decoded), payload)
+
+    def test_seq_wraps(self):
+        seq, payload = protocol.decode_frame(protocol.encode_frame(256 + 3, b"\x01"))
+        self.assertEqual(seq, 3)
+
+    def test_crc_mismatch(self):
+        frame = protocol.encode_frame(5, b"\x04\x00\x02\x00")
+        for i in range(1, len(frame)):
+            corrupt = bytearray(frame)
+            corrupt[i] ^= 0x10
+            with self.assertRaises(ValueError, msg="byte {} flipped".format(i)):
+                protocol.decode_frame(corrupt)
+
+    def test_truncated_and_overlong(self):
+        frame = protocol.encode_frame(5, b"\x04\x00\x02\x00")
+        for end in range(len(frame)):
+            with self.assertRaises(ValueError, msg="{} of {} bytes".format(end, len(frame))):
+                protocol.decode_frame(frame[:end])
+        with self.assertRaises(ValueError):
+            protocol.decode_frame(frame + b"\x00")
+
+    def test_bad_magic(self):
+        frame = bytearray(protocol.encode_frame(5, b""))
+        frame[0] = ord("{")
+        with self.assertRaises(ValueError):
+            protocol.decode_frame(frame)
+
+    def test_frame_size_limit(self):
+        header = bytes((protocol.FRAME_MAGIC, 0)) + (protocol.MAX_PAYLOAD + 1).to_bytes(2, "little")
+        self.assertEqual(protocol.frame_size(header), -1)
+
+
+class RecordTest(unittest.TestCase):
+    def test_batch_round_trip(self):
+        # Set time, set colors and query the settings in one frame
+        time_data = protocol.encode_time({'tm_year': 2025, 'tm_mon': 5, 'tm_mday': 1, 'tm_hour': 12,
+                                          'tm_min': 30, 'tm_sec': 59, 'tm_wday': 6})
+        settings_data = protocol.encode_settings({"default_color": [10, 20, 30]})
+        records = [(protocol.CMD_SET_TIME, time_data), (protocol.CMD_SET_SETTINGS, settings_data),
+                   (protocol.CMD_GET_SETTINGS, b""), (protocol.CMD_GET_LAPS, b"\x3c\x00")]
+        payload = b"".join(protocol.encode_record(cmd, data) for cmd, data in records)
+        seq, decoded = protocol.decode_frame(protocol.encode_frame(9, payload))
+        self.assertEqual([(cmd, bytes(data)) for cmd, data in protocol.iter_records(decoded)], records)
+
+    def test_truncated_record(self):
+        payload = protocol.encode_record(protocol.CMD_SET_TIME, bytes(9))
+        with self.assertRaises(ValueError):
+            list(protocol.iter_records(payload[:-1]))
+
+    def test_record_too_long(self):
+        with self.assertRaises(ValueError):
+            protocol.encode_record(protocol.CMD_SET_SETTINGS, bytes(256))
+
+
+class ValueTest(unittest.TestCase):
+    def test_time(self):
+        time_dict = {'tm_year': 2099, 'tm_mon': 11, 'tm_mday': 31, 'tm_hour': 23,
+                     'tm_min': 59, 'tm_sec': 59, 'tm_wday': 3}
+        self.assertEqual(protocol.decode_time(protocol.encode_time(time_dict)), time_dict)
+
+    def test_settings(self):
+        settings = {}
+        for n, (name, fmt, scale) in enumerate(protocol.SETTINGS_FIELDS):
+            if fmt == "<BBB":
+                settings[name] = [n, 255 - n, 128]
+            elif name in ("dots_always_on", "auto_brightness"):
+                settings[name] = bool(n % 2)
+            elif scale:
+                settings[name] = (n + 1) * 5 / scale
+            else:
+                settings[name] = n + 1
+        decoded = protocol.decode_settings(protocol.encode_settings(settings))
+        self.assertEqual(set(decoded), set(settings))
+        for name, value in settings.items():
+            if isinstance(value, float):
+                self.assertAlmostEqual(decoded[name], value, msg=name)
+            else:
+                self.assertEqual(decoded[name], value, name)
+
+    def test_partial_settings(self):
+        settings = {"gamma": 2.2, "night_color": [255, 0, 0], "unknown": 1}
+        self.assertEqual(protocol.decode_settings(protocol.encode_settings(settings)),
+                         {"gamma": 2.2, "night_color": [255, 0, 0]})
+
+    def test_unknown_settings_field(self):
+        with self.assertRaises(ValueError):
+            protocol.decode_settings(bytes((len(protocol.SETTINGS_FIELDS), 0)))
+
+    def test_laps(self):
+        sim = Simulator()
+        self.addCleanup(sim.tempdir.cleanup)
+        swo = types.SimpleNamespace(total_ticks=0, edge_ms=0)  # No SWO edges, timed by ticks_ms
+        stopwatch = sim.module("fdvl_stopwatch").Stopwatch(swo)
+        stopwatch.reset(5000)
+        for lap in range(1, 131):
+            stopwatch.lap(5000 + 1234 * lap)
+        # The ring keeps the last MAX_LAPS, read back one record at a time
+        first = 0
+        splits = []
+        while True:
+            first_lap, laps, page = protocol.decode_laps(protocol.encode_laps(stopwatch, first))
+            self.assertEqual(laps, 130)
+            self.assertLessEqual(len(page), protocol.LAPS_PER_RECORD)
+            if not page:
+                break
+            if not splits:
+                self.assertEqual(first_lap, 130 - stopwatch.MAX_LAPS)
+            splits.extend(page)
+            first = first_lap + len(page)
+        self.assertEqual(splits, [1234 * lap for lap in range(131 - stopwatch.MAX_LAPS, 131)])
+
+
+class DeviceTest(unittest.TestCase):
+    """Frames sent to the firmware running in fdvl_sim."""
+
+    def setUp(self):
+        self.sim = Simulator(start=(2025, 6, 1, 12, 0, 0))
+        self.addCleanup(self.sim.tempdir.cleanup)
+        self.sim.boot(2.0)
+
+    def exchange(self, frame):
+        self.sim.serial.host_write(bytes(frame))
+        self.sim.advance(0.2)
+        return protocol.decode_frame(self.sim.serial.host_read())
+
+    def test_batch(self):
+        new_time = {'tm_year': 2030, 'tm_mon': 0, 'tm_mday': 2, 'tm_hour': 3,
+                    'tm_min': 4, 'tm_sec': 5, 'tm_wday': 2}
+        payload = (protocol.encode_record(protocol.CMD_SET_TIME, protocol.encode_time(new_time))
+                   + protocol.encode_record(protocol.CMD_SET_SETTINGS, protocol.encode_settings({"gamma": 2.0}))
+                   + protocol.encode_record(protocol.CMD_GET_SETTINGS)
+                   + protocol.encode_record(0x42))
+        seq, replies = self.exchange(protocol.encode_frame(17, payload))
+        self.assertEqual(seq, 17)
+        replies = [(cmd, bytes(data)) for cmd, data in protocol.iter_records(replies)]
+        self.assertEqual([cmd for cmd, data in replies], [
+            protocol.CMD_SET_TIME | protocol.REPLY_FLAG, protocol.CMD_SET_SETTINGS | protocol.REPLY_FLAG,
+            protocol.CMD_GET_SETTINGS | protocol.REPLY_FLAG, 0x42 | protocol.REPLY_FLAG])
+        self.assertEqual([data[0] for cmd, data in replies], [
+            protocol.STATUS_OK, protocol.STATUS_OK, protocol.STATUS_OK, protocol.STATUS_UNKNOWN_COMMAND])
+        self.assertEqual(protocol.decode_settings(replies[2][1][1:])["gamma"], 2.0)
+        self.assertEqual(self.sim.firmware["rtc"].get_time()['tm_year'], 2030)
+
+    def test_corrupt_frame(self):
+        frame = bytearray(protocol.encode_frame(3, protocol.encode_record(protocol.CMD_GET_TIME)))
+        frame[-1] ^= 0xFF
+        seq, replies = self.exchange(frame)
+        self.assertEqual(seq, 3)
+        self.assertEqual([(cmd, bytes(data)) for cmd, data in protocol.iter_records(replies)],
+                         [(protocol.CMD_ERROR, bytes((protocol.STATUS_BAD_FRAME,)))])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+# test_swo.py
+# fdvl_swo on the fake countio.Counter of fdvl_sim, counting the simulated RTC's 1 Hz
+# edges: a stalled loop loses no second, and the soft clock recovers from an edge the
+# counter missed or counted twice at the next minute rollover.
+import calendar
+import time
+import unittest
+
+from fdvl_sim import Simulator
+
+POLL = 0.02  # SWO_INTERVAL in code.py
+START = (2025, 6, 1, 12, 0, 10)
+
+
+class SWOTest(unittest.TestCase):
+    def setUp(self):
+        self.sim = Simulator(start=START)
+        self.addCleanup(self.sim.tempdir.cleanup)
+        board = self.sim.fakes["board"]
+        self.swo = self.sim.module("fdvl_swo").SWO(board.GP9)
+        fdvl_rtc = self.sim.module("fdvl_rtc")
+        self.clock = fdvl_rtc.SoftClock(fdvl_rtc.RTC(board.GP5, board.GP4))
+        self.ticks = 0
+
+    def run_polls(self, seconds, interval=POLL):
+        """Poll like swo_task: take the ticks and advance the soft clock by them."""
+        end = self.sim.clock.now + seconds
+        while self.sim.clock.now < end:
+            self.sim.clock.now += interval
+            ticks = self.swo.take_ticks()
+            self.ticks += ticks
+            self.clock.tick(ticks)
+
+    def clock_seconds(self):
+        t = self.clock.time
+        return calendar.timegm((t['tm_year'], t['tm_mon'] + 1, t['tm_mday'], t['tm_hour'], t['tm_min'], t['tm_sec']))
+
+    def rtc_seconds(self):
+        return self.sim.rtc.seconds()
+
+    def test_every_edge_counted(self):
+        self.run_polls(30.0)
+        self.assertEqual(self.ticks, 30)
+        self.assertEqual(self.clock_seconds(), self.rtc_seconds())
+
+    def test_stalled_loop(self):
+        # Nobody looks for 3.5 s, the counter keeps the edges of that time
+        self.run_polls(1.0)
+        self.sim.clock.now += 3.5
+        self.run_polls(0.02)
+        self.assertEqual(self.ticks, 4)
+        self.assertEqual(self.swo.total_ticks, 4)
+        self.assertEqual(self.clock_seconds(), self.rtc_seconds())
+        # The edge estimate is no older than the polling latency allows
+        edge_age = self.sim.clock.ticks_ms() - self.swo.edge_ms
+        self.assertLessEqual(edge_age, self.swo.EDGE_LATENCY_MS)
+
+    def test_edge_estimate(self):
+        self.run_polls(10.0)
+        # Edges are at whole seconds of the simulation, the estimate trails by at most one poll
+        for n in range(50):
+            self.run_polls(POLL)
+            age = self.sim.clock.ticks_ms() - self.swo.edge_ms
+            self.assertEqual(age // 1000, 0)
+            self.assertAlmostEqual(age, round(self.sim.clock.now % 1.0 * 1000), delta=POLL * 1000 + 1)
+
+    def test_missed_edge(self):
+        self.run_polls(5.0)
+        self.swo.counter.offset += 1  # One rising edge not counted
+        self.run_polls(5.0)
+        self.assertEqual(self.clock_seconds(), self.rtc_seconds() - 1)
+        # Re-read at the minute rollover, the soft clock is right again
+        self.run_polls(50.0)
+        self.assertEqual(self.clock.corrections, 1)
+        self.assertEqual(self.clock_seconds(), self.rtc_seconds())
+
+    def test_doubled_edge(self):
+        self.run_polls(5.0)
+        self.swo.counter.offset -= 1  # A glitch counted as a second edge
+        self.run_polls(POLL)
+        self.assertEqual(self.clock_seconds(), self.rtc_seconds() + 1)
+        self.run_polls(50.0)
+        self.assertEqual(self.clock.corrections, 1)
+        self.assertEqual(self.clock_seconds(), self.rtc_seconds())
+
+    def test_is_high(self):
+        self.run_polls(2.0)
+        levels = []
+        for n in range(50):
+            self.run_polls(POLL)
+            levels.append(self.swo.is_high())
+        # High for the first half of each second after an edge
+        self.assertIn(sum(levels), (24, 25, 26))
+
+    def test_restart(self):
+        self.run_polls(2.3)
+        # Writing the time restarts the divider chain, the next edge is a second after the write
+        self.sim.rtc.set_seconds(calendar.timegm(time.gmtime(self.rtc_seconds())))
+        self.swo.restart(self.sim.clock.ticks_ms())
+        self.clock.sync()
+        self.run_polls(0.9)
+        self.assertEqual(self.clock_seconds(), self.rtc_seconds())
+        self.run_polls(0.2)
+        self.assertEqual(self.clock_seconds(), self.rtc_seconds())
+
+
+if __name__ == "__main__":
+    unittest.main()
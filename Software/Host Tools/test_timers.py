@@ -0,0 +1,192 @@
+# test_timers.py
+# Named timers of code.py in fdvl_sim: they count real seconds, so setting the clock while
+# one runs leaves its remaining time alone, and alarm 1 of the simulated MAX31343 reports
+# expiry and carries the countdown through a soft reset.
+import calendar
+import json
+import unittest
+
+from fdvl_sim import Simulator
+
+
+class ClockChangeTest(unittest.TestCase):
+    def setUp(self):
+        self.sim = Simulator(start=(2025, 6, 1, 12, 0, 0))
+        self.addCleanup(self.sim.tempdir.cleanup)
+        self.sim.boot(2.0)
+
+    def command(self, **data):
+        self.sim.serial.host_write((json.dumps(data) + "\n").encode("utf-8"))
+        self.sim.advance(0.2)
+        return self.sim.serial.host_read()
+
+    def remaining(self):
+        reply = json.loads(self.command(command="get_timers"))
+        return {timer["name"]: timer["remaining"] for timer in reply["timers"]}
+
+    def shifted_time(self, seconds):
+        """The clock's time moved by seconds, as the fields of a set_time command."""
+        clock_time = dict(self.sim.firmware["clock"].time)
+        clock_time["tm_hour"] += seconds // 3600
+        return clock_time
+
+    def run_timer(self, change):
+        """Start a 120 s timer, change the time 10 s in with change(), return when it fired."""
+        self.command(command="add_timer", name="tea", seconds=120)
+        started = self.sim.clock.now
+        self.sim.advance(10.0)
+        change()
+        self.assertAlmostEqual(self.remaining()["tea"], 110, delta=1)
+        while "tea" in self.sim.firmware["timers"]:
+            self.assertEqual(self.sim.buzzer_on_time(), 0)
+            self.assertLess(self.sim.clock.now - started, 130, "timer did not fire")
+            self.sim.advance(0.5)
+        self.assertGreater(self.sim.buzzer_on_time(), 0)
+        return self.sim.clock.now - started
+
+    def test_set_back(self):
+        fired = self.run_timer(lambda: self.command(command="set_time", **self.shifted_time(-3600)))
+        self.assertAlmostEqual(fired, 120, delta=1.5)
+
+    def test_set_forward(self):
+        fired = self.run_timer(lambda: self.command(command="set_time", **self.shifted_time(3600)))
+        self.assertAlmostEqual(fired, 120, delta=1.5)
+
+    def test_sync(self):
+        def sync():
+            tick = self.sim.clock.ticks_ms() + 500
+            self.command(command="sync_time", tick=tick, **self.shifted_time(-3600))
+            self.sim.advance(1.0)
+            self.assertIn("synced", json.loads(self.sim.serial.host_read()))
+        fired = self.run_timer(sync)
+        self.assertAlmostEqual(fired, 120, delta=2)
+
+    def test_soft_clock_behind(self):
+        # A1F fires the timer on the RTC's time, a soft clock seconds behind does not delay it
+        self.command(command="add_timer", name="tea", seconds=20)
+        expiry = self.sim.firmware["timers"].get("tea")
+        self.sim.advance(5.0)
+        self.sim.firmware["clock"].time["tm_sec"] -= 5
+        while "tea" in self.sim.firmware["timers"]:
+            self.sim.advance(0.1)
+        self.assertEqual(self.sim.rtc.seconds(), expiry)
+
+    def test_alarm_follows(self):
+        self.command(command="add_timer", name="tea", seconds=120)
+        self.command(command="set_time", **self.shifted_time(-3600))
+        # Alarm 1 moves with the timer, from 12:02 to 11:02
+        rtc = self.sim.rtc
+        alarm = rtc.regs[rtc.R_ALM1_SEC:rtc.R_ALM1_SEC + 3]
+        self.assertEqual(alarm[2] & 0x3F, 0x11)
+
+
+class NoSwoTest(unittest.TestCase):
+    """The RTC is read every second instead, the timers must not depend on SWO ticks."""
+
+    def setUp(self):
+        self.sim = Simulator(start=(2025, 6, 1, 12, 0, 0))
+        self.addCleanup(self.sim.tempdir.cleanup)
+        self.sim.swo_connected = False
+        self.sim.boot(2.0)
+
+    def test_timer_fires(self):
+        command = {"command": "add_timer", "name": "tea", "seconds": 20}
+        self.sim.serial.host_write((json.dumps(command) + "\n").encode("utf-8"))
+        self.sim.advance(30.0)
+        self.assertNotIn("tea", self.sim.firmware["timers"])
+        self.assertGreater(self.sim.buzzer_on_time(), 0)
+
+    def test_countdown(self):
+        self.sim.click("DOWN")  # TIMER_MODE, 5 seconds
+        self.sim.advance(2.0)
+        self.sim.click("UP")  # One more minute
+        self.sim.advance(10.0)
+        self.assertIn(self.sim.read_display(), ("00:53", "00:52"))
+        self.sim.advance(60.0)
+        self.assertNotIn("timer", self.sim.firmware["timers"])
+        self.assertGreater(self.sim.buzzer_on_time(), 0)
+
+
+class AlarmRegisterTest(unittest.TestCase):
+    """fdvl_rtc alarm 1 on the register model of the MAX31343."""
+
+    def setUp(self):
+        self.sim = Simulator(start=(2025, 6, 30, 23, 59, 0))
+        self.addCleanup(self.sim.tempdir.cleanup)
+        board = self.sim.fakes["board"]
+        self.rtc = self.sim.module("fdvl_rtc").RTC(board.GP5, board.GP4)
+        self.start = calendar.timegm((2025, 6, 30, 23, 59, 0))
+
+    def test_flag_at_match(self):
+        self.rtc.set_alarm1(self.start + 90)  # Across midnight and the month's end
+        regs = self.sim.rtc.regs
+        self.assertEqual(bytes(regs[0x0D:0x12]), bytes((0x30, 0x00, 0x00, 0x01, 0xC0)))
+        self.assertTrue(regs[0x01] & self.rtc.STATUS_A1F)
+        self.sim.clock.now += 89.5
+        self.assertFalse(self.rtc.take_flag(self.rtc.STATUS_A1F))
+        self.sim.clock.now += 1.0
+        self.assertTrue(self.rtc.take_flag(self.rtc.STATUS_A1F))
+        self.assertFalse(self.rtc.take_flag(self.rtc.STATUS_A1F))  # Reported once
+
+    def test_read_back(self):
+        for delta in (1, 90, 6 * 86400 + 3601):
+            self.rtc.set_alarm1(self.start + delta)
+            self.assertEqual(self.rtc.get_alarm1(self.start), self.start + delta)
+        # Matches just passed are read back too, for a timer that ran out during a reset
+        self.assertEqual(self.rtc.get_alarm1(self.start + 6 * 86400 + 3661), self.start + 6 * 86400 + 3601)
+
+    def test_cleared(self):
+        self.rtc.set_alarm1(self.start + 5)
+        self.rtc.clear_alarm1()
+        self.assertIsNone(self.rtc.get_alarm1(self.start))
+        self.sim.clock.now += 10
+        self.assertFalse(self.sim.rtc.regs[0x01] & self.rtc.STATUS_A1F)
+
+
+class SoftResetTest(unittest.TestCase):
+    def setUp(self):
+        self.sim = Simulator(start=(2025, 6, 1, 12, 0, 0))
+        self.addCleanup(self.sim.tempdir.cleanup)
+        self.sim.boot(2.0)
+
+    def start_timer(self, seconds):
+        """Start the TIMER_MODE countdown, the timer named "timer", over serial."""
+        command = {"command": "add_timer", "name": "timer", "seconds": seconds}
+        self.sim.serial.host_write((json.dumps(command) + "\n").encode("utf-8"))
+        self.sim.advance(0.2)
+        self.assertIn("timer", self.sim.firmware["timers"])
+
+    def test_countdown_survives(self):
+        self.start_timer(120)
+        self.sim.advance(30.0)
+        self.sim.soft_reset(2.0)
+        timers = self.sim.firmware["timers"]
+        self.assertAlmostEqual(timers.get("timer") - self.sim.rtc.seconds(), 88, delta=1.5)
+        self.sim.click("DOWN")  # TIMER_MODE shows the restored countdown
+        self.sim.advance(1.0)
+        self.assertIn(self.sim.read_display(), ("01:27", "01:26"))
+        self.sim.advance(85.0)
+        self.assertEqual(self.sim.buzzer_on_time(), 0)
+        self.sim.advance(3.0)
+        self.assertNotIn("timer", timers)
+        self.assertGreater(self.sim.buzzer_on_time(), 0)
+
+    def test_expired_during_reset(self):
+        self.start_timer(10)
+        self.sim.advance(8.0)
+        self.sim.firmware = None
+        self.sim.loop.queue.clear()  # Stopped for the reset
+        self.sim.advance(5.0)
+        self.sim.soft_reset(0.5)
+        self.assertGreater(self.sim.buzzer_on_time(), 0)
+        self.assertEqual(len(self.sim.firmware["timers"]), 0)
+
+    def test_nothing_to_restore(self):
+        self.sim.soft_reset(2.0)
+        self.assertEqual(len(self.sim.firmware["timers"]), 0)
+        self.sim.advance(60.0)
+        self.assertEqual(self.sim.buzzer_on_time(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
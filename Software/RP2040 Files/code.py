@@ -1,14 +1,43 @@
 # code.py # type: ignore
 import time
 import board
-import digitalio
-import pwmio
-from fdvl_display import Display
-from fdvl_rtc import RTC
 from fdvl_buttons import Buttons
+from fdvl_display import Display
+from fdvl_rtc import RTC, SoftClock, time_to_seconds
+from fdvl_log import log
+
+# === Fast boot: show the time before anything else is loaded ===
+# Pull-ups settle in the background key scan while the display and RTC come up
+buttons = Buttons(board.GP15, board.GP14, board.GP13)  # BOTTOM, UP, DOWN
+display = Display(board.GP18, board.GP28)
+rtc = RTC(board.GP11, board.GP10)  # SCL=GP11, SDA=GP10
+# Time of day follows the SWO ticks, the RTC is read again on minute rollover
+clock = SoftClock(rtc)
+display.show_time(clock.time, True, "NORMAL")  # Default colors until settings are loaded
+first_frame_time = time.monotonic()  # Seconds since power-up
+
+import pwmio
 from fdvl_lightsensor import LightSensor
+from fdvl_swo import SWO
+from fdvl_serial import LineReader
+from fdvl_settings import Config, validate
+from fdvl_buzzer import Sequencer, beep_pattern, parse_melody
+from fdvl_stopwatch import Stopwatch
+from fdvl_timers import Timers
+from fdvl_alarms import Alarms
+from fdvl_sync import DriftHistory
+from fdvl_stats import (
+    Stats, STAGE_SERIAL, STAGE_RTC, STAGE_BUTTONS, STAGE_BUZZER, STAGE_SWO, STAGE_DISPLAY)
+from adafruit_ticks import ticks_ms, ticks_diff # type: ignore
+from fdvl_protocol import (
+    CMD_SET_TIME, CMD_GET_TIME, CMD_SET_SETTINGS, CMD_GET_SETTINGS, CMD_GET_LAPS, CMD_ERROR, REPLY_FLAG,
+    STATUS_OK, STATUS_ERROR, STATUS_BAD_FRAME, STATUS_UNKNOWN_COMMAND,
+    decode_frame, encode_frame, iter_records, encode_record,
+    decode_time, encode_time, decode_settings, encode_settings, encode_laps)
 import usb_cdc
 import json
+import asyncio
+import os
 
 
 #WATCHDOG
@@ -23,358 +52,810 @@ TIMER_MODE = "TIMER_MODE"
 STOPWATCH_MODE = "STOPWATCH_MODE"
 STOPWATCH_COUNTING = "STOPWATCH_COUNTING"
 STOPWATCH_PAUSED = "STOPWATCH_PAUSED"
-REFRESH_INTERVAL = 1.0 / 60  # 60 Hz
-SETTLE_PERIOD = 4.0  # Seconds to ignore button events after power-up
-RTC_UPDATE_INTERVAL = 1.0  # Seconds between RTC reads
+TIMER_NAME = "timer"  # Named timer behind TIMER_MODE, serial commands can use it too
+MAX_TIMER_SECONDS = 7 * 24 * 3600  # RTC alarm 1 matches the day of the month
+TIMER_FLAG_GRACE = 2  # Seconds the soft clock may be past a timer's expiry without A1F before it fires anyway
+TIMER_RESTORE_LATE = 60  # Seconds an alarm 1 match may be past at boot and still sound, a soft reset takes a few
+REFRESH_INTERVAL = 1.0 / 60  # 60 Hz display refresh
+BUTTON_INTERVAL = 0.01  # Seconds between button scans
+SWO_INTERVAL = 0.02  # Seconds between SWO tick counter checks
+SERIAL_INTERVAL = 0.02  # Seconds between serial polls
+EFFECT_DURATION = 5.0  # Seconds the snake rainbow effect runs
+RTC_UPDATE_INTERVAL = 1.0  # Seconds between SWO health checks
+SWO_TIMEOUT = 2.5  # Seconds without a SWO tick before the RTC is read directly
 SETTINGS_FILE = "/settings.txt"
-
-# Load settings from settings.txt
+SETTINGS_TEMP_FILE = "/settings.tmp"
+SETTINGS_SAVE_DELAY = 2.0  # Seconds without changes before settings are written to flash
+SETTINGS_INTERVAL = 0.5  # Seconds between checks for unsaved settings
+SYNC_FILE = "/sync.txt"  # Drift history of the time syncs
+SYNC_TEMP_FILE = "/sync.tmp"
+SYNC_MAX_DELAY_MS = 2000  # Furthest ahead a sync may be scheduled
+SYNC_SPIN_MS = 20  # The last milliseconds before a sync are waited out blocking, asyncio.sleep is not that exact
+
+# Settings each subsystem depends on, only the affected ones are reconfigured
+BUZZER_KEYS = (
+    "buzzer_frequency", "buzzer_beep_duration", "buzzer_stop_duration", "buzzer_pause_duration",
+    "buzzer_max_cycles", "buzzer_melody")
+LIGHT_SENSOR_KEYS = (
+    "light_sensor_bright_threshold", "light_sensor_dark_threshold",
+    "light_sensor_hysteresis", "light_sensor_interval")
+DISPLAY_KEYS = (
+    "bright_brightness", "normal_brightness", "dark_brightness", "off_brightness",
+    "default_color", "TIMER_POSITIVE_COLOR", "TIMER_NEGATIVE_COLOR", "STOPWATCH_COLOR", "night_color",
+    "night_color_hours_start", "night_color_minutes_start", "night_color_hours_end", "night_color_minutes_end",
+    "dots_always_on", "auto_brightness", "brightness_fade_time", "gamma", "schedule")
+ALARM_KEYS = ("alarms",)
+
+# Load settings from settings.txt, or from the temp file if a save was interrupted
 def load_settings():
-    try:
-        with open(SETTINGS_FILE, "r") as f:
-            return json.load(f)
-    except Exception as e:
-        print("Failed to load settings.txt:", e)
-        return {}
+    for path in (SETTINGS_FILE, SETTINGS_TEMP_FILE):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            log.warning("Failed to load {}: {}", path, e)
+    return {}
     
-def save_settings():
+def write_json_file(path, temp_path, data):
+    # Write a temp file first so a power cut never leaves a half-written file
+    with open(temp_path, "w") as f:
+        json.dump(data, f)
     try:
-        with open(SETTINGS_FILE, "w") as f:
-            json.dump(settings, f)
-            print("Settings saved.")
-    except Exception as e:
-        print("Failed to save settings:", e)
-
-def apply_settings():
-    # Update buzzer frequency
-    global buzzer
-    try:
-        buzzer.deinit()
-    except Exception:
-        pass
+        os.rename(temp_path, path)
+    except OSError:
+        # FAT cannot rename over an existing file
+        os.remove(path)
+        os.rename(temp_path, path)
 
+def save_settings():
     try:
-        buzzer = pwmio.PWMOut(board.A3, frequency=settings["buzzer_frequency"], duty_cycle=0)
-        print("Buzzer reinitialized with new frequency.")
+        write_json_file(SETTINGS_FILE, SETTINGS_TEMP_FILE, settings)
+        log.info("Settings saved.")
     except Exception as e:
-        print("Failed to reinitialize buzzer:", e)
+        log.error("Failed to save settings: {}", e)
 
-    # Update light sensor thresholds
+def save_sync():
     try:
-        light_sensor.update_thresholds(settings["light_sensor_bright_threshold"], settings["light_sensor_dark_threshold"])
-        print("Updated light sensor thresholds.")
+        write_json_file(SYNC_FILE, SYNC_TEMP_FILE, drift.to_json())
     except Exception as e:
-        print("Failed to update light sensor:", e)
+        log.error("Failed to save sync history: {}", e)
+
+def changed_keys(keys, changed):
+    return changed is None or any(key in changed for key in keys)
+
+def compile_buzzer_pattern():
+    """Melody from settings if there is one, else the beep cycles."""
+    if config.buzzer_melody:
+        try:
+            return parse_melody(config.buzzer_melody)
+        except ValueError as e:
+            log.warning("Failed to compile buzzer melody: {}", e)
+    return beep_pattern(config.buzzer_frequency, config.buzzer_beep_ms, config.buzzer_stop_ms,
+                        config.buzzer_pause_ms, config.buzzer_max_cycles)
+
+def compile_alarm_melody(melody):
+    """Buzzer pattern of an alarm's melody, None for the default pattern."""
+    if melody:
+        try:
+            return parse_melody(melody)
+        except ValueError as e:
+            log.warning("Failed to compile alarm melody: {}", e)
+    return None
+
+def apply_settings(changed=None):
+    """Reconfigure the subsystems affected by the changed keys (all of them if None)."""
+    global buzzer_pattern
+    # Recompile the buzzer pattern
+    if changed_keys(BUZZER_KEYS, changed):
+        buzzer_pattern = compile_buzzer_pattern()
+        log.debug("Updated buzzer pattern.")
+
+    # Rebuild the alarm index
+    if changed_keys(ALARM_KEYS, changed):
+        alarms.build([(minute, mask, compile_alarm_melody(melody)) for minute, mask, melody in config.alarm_entries])
+        log.debug("Updated {} alarms.", len(alarms))
 
     # Update light sensor thresholds
+    if changed_keys(LIGHT_SENSOR_KEYS, changed):
+        try:
+            light_sensor.update_thresholds(config.light_sensor_bright_threshold, config.light_sensor_dark_threshold,
+                                           config.light_sensor_hysteresis, config.light_sensor_interval)
+            log.debug("Updated light sensor thresholds.")
+        except Exception as e:
+            log.error("Failed to update light sensor: {}", e)
+
+    # Update display values
+    if changed_keys(DISPLAY_KEYS, changed):
+        try:
+            display.update_settings(config)
+            log.debug("Updated display values.")
+        except Exception as e:
+            log.error("Failed to update display: {}", e)
+
+def auto_brightness(level):
+    """Brightness interpolated from the filtered light level between the bright and dark thresholds."""
+    low = config.light_sensor_bright_threshold
+    high = config.light_sensor_dark_threshold
+    if level <= low or high <= low:
+        return config.bright_brightness
+    if level >= high:
+        return config.dark_brightness
+    return config.bright_brightness + (config.dark_brightness - config.bright_brightness) * (level - low) / (high - low)
+
+def update_settings(new_settings, replace=False):
+    """Merge (or with replace, swap in) new settings, apply what changed and schedule a save."""
+    global settings, config
     try:
-        display.update_settings(settings)
-        print("Updated display values.")
-    except Exception as e:
-        print("Failed to update display:", e)
-
-        
+        new_settings = dict(new_settings)
+        new_settings.update(validate(new_settings))
+    except ValueError as e:
+        # A malformed push is rejected as a whole, the running settings stay untouched
+        log.warning("Rejected settings: {}", e)
+        return []
+    changed = [key for key in new_settings if settings.get(key) != new_settings[key]]
+    if replace:
+        changed.extend(key for key in settings if key not in new_settings)
+        merged = new_settings
+    else:
+        merged = settings.copy()
+        merged.update(new_settings)
+    if not changed:
+        return changed
+    settings = merged
+    config = Config(settings)
+    apply_settings(changed)
+    # Coalesce bursts of updates into a single flash write
+    state.settings_dirty = True
+    state.settings_changed_at = time.monotonic()
+    log.info("Settings updated: {}", changed)
+    return changed
 
 
 # === Default Config ===
 settings = load_settings()
-
-
-BUZZER_CYCLE_TIME = settings.get("buzzer_beep_duration") + settings.get("buzzer_stop_duration") * 2 + settings.get("buzzer_beep_duration") + settings.get("buzzer_pause_duration")  # s per cycle
-print(settings)
+try:
+    settings.update(validate(settings))
+except ValueError as e:
+    log.warning("Invalid settings.txt: {}", e)
+config = Config(settings)  # Invalid or missing values fall back to defaults here
+log.debug("Settings: {}", settings)
 
 #SETUP SERIAL COMMUNICATION
 data_serial = usb_cdc.data
 data_serial.timeout = 0  # Non-blocking reads
-
-def read_line():
-    line = b""
-    while True:
-        if data_serial.in_waiting > 0:
-            char = data_serial.read(1)
-            if char == b"\n":
-                return line.decode().strip()
-            else:
-                line += char
+line_reader = LineReader(data_serial)
+
+def time_fields(data):
+    return {
+        'tm_year': data['tm_year'],
+        'tm_mon': data['tm_mon'],
+        'tm_mday': data['tm_mday'],
+        'tm_hour': data['tm_hour'],
+        'tm_min': data['tm_min'],
+        'tm_sec': data['tm_sec'],
+        'tm_wday': data['tm_wday']
+    }
+
+def shift_timers(delta):
+    """Keep the remaining time of every running timer when the clock moves by delta seconds."""
+    if not delta or not len(timers):
+        return
+    timers.shift(delta)
+    if state.timer_target is not None:
+        state.timer_target += delta
+    program_alarm()
+
+def set_rtc_time(new_time):
+    """Set the RTC outside a sync, the drift history cannot span this change."""
+    previous = clock.time
+    rtc.set_time(new_time)
+    clock.sync()
+    if previous:
+        shift_timers(time_to_seconds(new_time) - time_to_seconds(previous))
+    if drift.last_sync:
+        drift.break_chain()
+        save_sync()
+
+def ms_since_edge(tick):
+    """Milliseconds into the RTC's current second at ticks_ms tick, from the SWO edge."""
+    return min(max(ticks_diff(tick, swo.edge_ms), 0), 999)
+
+def write_reply(reply):
+    data_serial.write((json.dumps(reply) + "\n").encode("utf-8"))
+
+async def sync_write(new_time, tick):
+    """Write new_time to the RTC at ticks_ms tick, which the host put at the start of that second."""
+    delay = ticks_diff(tick, ticks_ms())
+    if delay > SYNC_SPIN_MS:
+        await asyncio.sleep((delay - SYNC_SPIN_MS) / 1000)
+    while ticks_diff(tick, ticks_ms()) > 0:
+        time.sleep(0.001)
+    # Offset before the write: the soft clock brought up to date plus the time since the last SWO edge
+    clock.tick(swo.take_ticks())
+    target = time_to_seconds(new_time)
+    previous = time_to_seconds(clock.time) if clock.time else None
+    offset_ms = None
+    if previous is not None:
+        offset_ms = (previous - target) * 1000 + ms_since_edge(tick)
+    rtc.set_time(new_time)  # Writing the seconds register restarts the RTC's divider chain
+    swo.restart(tick)  # Edges of the old chain must not advance the new time
+    clock.sync()
+    if previous is not None:
+        shift_timers(target - previous)
+    if offset_ms is None:
+        drift.break_chain()
+    else:
+        drift.record(target, offset_ms)
+    write_reply({"synced": {"offset_ms": offset_ms, "drift_ppm": drift.drift_ppm()}})
+    log.info("RTC synced, it was {} ms off", offset_ms)
+    save_sync()
 
 def handle_command(line):
-    global settings
     try:
         data = json.loads(line)
 
         cmd = data.get("command")
 
         if cmd == "set_time":
-            rtc.set_time({
-                'tm_year': data['tm_year'],
-                'tm_mon': data['tm_mon'],
-                'tm_mday': data['tm_mday'],
-                'tm_hour': data['tm_hour'],
-                'tm_min': data['tm_min'],
-                'tm_sec': data['tm_sec'],
-                'tm_wday': data['tm_wday']
-            })
-            print("RTC time updated via serial command.")
+            set_rtc_time(time_fields(data))
+            log.info("RTC time updated via serial command.")
+
+        elif cmd == "sync_ping":
+            # Answered right away, the host maps its time to ticks_ms from the fastest round trip
+            now = ticks_ms()
+            write_reply({"pong": data.get("id"), "tick": now,
+                         "time": time_to_seconds(clock.time) if clock.time else None, "ms": ms_since_edge(now)})
+
+        elif cmd == "sync_time":
+            # The fields are the time at ticks_ms "tick", the start of a second chosen by the host
+            tick = data["tick"]
+            delay = ticks_diff(tick, ticks_ms())
+            if 0 < delay <= SYNC_MAX_DELAY_MS:
+                asyncio.create_task(sync_write(time_fields(data), tick))
+            else:
+                write_reply({"synced": {"error": "sync time is {} ms away".format(delay)}})
+                log.warning("Sync rejected, {} ms away", delay)
+
+        elif cmd == "get_drift":
+            report = drift.to_json()
+            report["ppm"] = drift.drift_ppm()
+            write_reply({"drift": report})
 
         elif cmd == "get_settings":
-            print("Get settings received")
+            log.debug("Get settings received")
             # Send current settings back to serial as JSON
             json_data = json.dumps({"settings": settings}) + "\n"
             data_serial.write(json_data.encode("utf-8"))
 
+        elif cmd == "get_log":
+            # Records are formatted only here, oldest first
+            records = [{"t": tick, "level": level, "msg": text, "repeats": repeats}
+                       for tick, level, text, repeats in log.records()]
+            data_serial.write((json.dumps({"log": records}) + "\n").encode("utf-8"))
+            if data.get("clear"):
+                log.clear()
+
+        elif cmd == "get_stats":
+            # Stage timings and heap use since boot or the last reset
+            report = stats.report()
+            report["counters"] = {
+                "frames_pushed": display.frames_pushed,
+                "frames_skipped": display.frames_skipped,
+                "rtc_reads": clock.reads,
+                "rtc_corrections": clock.corrections,
+                "swo_ticks": swo.total_ticks,
+                "dropped_lines": line_reader.dropped_lines,
+            }
+            data_serial.write((json.dumps({"stats": report}) + "\n").encode("utf-8"))
+            if data.get("reset"):
+                stats.reset()
+
+        elif cmd == "add_timer":
+            # Same name restarts the timer
+            seconds = int(data["seconds"])
+            if not 0 < seconds <= MAX_TIMER_SECONDS:
+                raise ValueError("seconds out of range")
+            if start_timer(str(data["name"]), seconds):
+                log.info("Timer {} started for {} seconds", data["name"], seconds)
+            else:
+                log.warning("Timer {} not started, time of day unknown", data["name"])
+
+        elif cmd == "cancel_timer":
+            if cancel_timer(str(data["name"])):
+                log.info("Timer {} cancelled", data["name"])
+
+        elif cmd == "get_timers":
+            # Earliest first, remaining seconds on the clock's time
+            now = time_to_seconds(clock.time) if clock.time else 0
+            listing = [{"name": name, "remaining": expiry - now} for expiry, name in timers.items()]
+            data_serial.write((json.dumps({"timers": listing}) + "\n").encode("utf-8"))
+
+        elif cmd == "set_alarms":
+            # Replaces every alarm, saved with the settings
+            update_settings({"alarms": data["alarms"]})
+
+        elif cmd == "get_alarms":
+            data_serial.write((json.dumps({"alarms": config.alarms}) + "\n").encode("utf-8"))
+
+        elif cmd == "get_laps":
+            # Every kept lap split in ms, oldest first
+            first = stopwatch.first_lap()
+            laps = {"first": first, "count": stopwatch.laps,
+                    "splits": [stopwatch.split(lap) for lap in range(first, stopwatch.laps)]}
+            data_serial.write((json.dumps({"laps": laps}) + "\n").encode("utf-8"))
+
+        elif cmd == "patch_settings":
+            # Only the given keys change
+            update_settings(data["settings"])
+
         else:
             # Assume full settings update
-            settings = data
-            save_settings()
-            print("Settings updated:", settings)
-            apply_settings()
+            update_settings(data, replace=True)
 
     except Exception as e:
-        print("JSON parse error:", e)
+        log.warning("JSON parse error: {}", e)
 
-
-# Initialize button pins first to stabilize pull-ups
-buttons = Buttons(board.GP15, board.GP14, board.GP13)  # BOTTOM, UP, DOWN
+def handle_frame(frame):
+    """Run every command record of a binary frame and answer with one reply frame."""
+    try:
+        seq, payload = decode_frame(frame)
+    except ValueError as e:
+        log.warning("Frame error: {}", e)
+        error = encode_record(CMD_ERROR, bytes((STATUS_BAD_FRAME,)))
+        data_serial.write(encode_frame(frame[1] if len(frame) > 1 else 0, error))
+        return
+
+    replies = bytearray()
+    try:
+        for cmd, data in iter_records(payload):
+            reply = bytes((STATUS_OK,))
+            try:
+                if cmd == CMD_SET_TIME:
+                    set_rtc_time(decode_time(data))
+                    log.info("RTC time updated via binary command.")
+                elif cmd == CMD_GET_TIME:
+                    reply += encode_time(rtc.get_time())
+                elif cmd == CMD_SET_SETTINGS:
+                    update_settings(decode_settings(data))
+                elif cmd == CMD_GET_SETTINGS:
+                    reply += encode_settings(settings)
+                elif cmd == CMD_GET_LAPS:
+                    # Long lap lists take one record per LAPS_PER_RECORD, each asking from its first lap
+                    reply += encode_laps(stopwatch, data[0] | (data[1] << 8) if len(data) >= 2 else 0)
+                else:
+                    reply = bytes((STATUS_UNKNOWN_COMMAND,))
+            except Exception as e:
+                log.warning("Binary command {} failed: {}", cmd, e)
+                reply = bytes((STATUS_ERROR,))
+            replies.extend(encode_record(cmd | REPLY_FLAG, reply))
+    except ValueError as e:
+        log.warning("Frame error: {}", e)
+        replies.extend(encode_record(CMD_ERROR, bytes((STATUS_BAD_FRAME,))))
+    data_serial.write(encode_frame(seq, replies))
+
+
+stats = Stats()
+stats.first_frame = first_frame_time
+log.info("First frame after {:.2f} s", first_frame_time)
 
 # Initialize other peripherals
-rtc = RTC(board.GP11, board.GP10)  # SCL=GP11, SDA=GP10
-display = Display(board.GP18, board.GP28)
-light_sensor = LightSensor(board.GP27, settings.get("light_sensor_bright_threshold"), settings.get("light_sensor_dark_threshold"))  # Light sensor on GPIO27 (ADC1)
-buzzer = pwmio.PWMOut(board.A3, frequency=settings.get("buzzer_frequency"), duty_cycle=0)  # Buzzer on GPIO29 (A3)
+light_sensor = LightSensor(board.GP27, config.light_sensor_bright_threshold, config.light_sensor_dark_threshold)  # Light sensor on GPIO27 (ADC1)
+buzzer = pwmio.PWMOut(board.A3, frequency=config.buzzer_frequency, duty_cycle=0, variable_frequency=True)  # Buzzer on GPIO29 (A3)
+sequencer = Sequencer(buzzer)
+buzzer_pattern = None
+alarms = Alarms()
 
 apply_settings()
 
 # Initialize SWO (CLK_1HZ)
-swo = digitalio.DigitalInOut(board.GP9)  # SWO on GPIO9
-swo.direction = digitalio.Direction.INPUT
-swo.pull = digitalio.Pull.UP
-
-# Get initial time and set if invalid
-rtc_time = rtc.get_time()
+swo = SWO(board.GP9)  # SWO on GPIO9
+stopwatch = Stopwatch(swo)  # Whole seconds from SWO, the fraction from ticks_ms
+drift = DriftHistory()
+try:
+    with open(SYNC_FILE, "r") as f:
+        drift.load(json.load(f))
+except (OSError, ValueError) as e:
+    log.debug("No sync history: {}", e)
+timers = Timers()
+
+# Check the time read for the first frame and set it if invalid
+rtc_time = clock.time
 if rtc_time:
     if rtc_time['tm_year'] < 2025:
-        print("Invalid RTC time detected, setting to 2025-05-29 13:21:00")
+        log.warning("Invalid RTC time detected, setting to 2025-05-29 13:21:00")
         rtc.set_time({
             'tm_year': 2025, 'tm_mon': 4, 'tm_mday': 30,
             'tm_hour': 6, 'tm_min': 55, 'tm_sec': 0,
             'tm_wday': 4  # 
         })
         time.sleep(0.1)  # Brief delay to ensure RTC settles
-        rtc_time = rtc.get_time()
-    print("Initialization complete. Initial time: {:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}".format(
+        clock.sync()
+        if drift.last_sync:
+            drift.break_chain()  # The RTC lost its time, an offset from now on is not drift
+            save_sync()
+        rtc_time = clock.time
+    # Formatted right away, the record must not follow later changes of the time dict
+    log.info("Initialization complete. Initial time: {}", "{:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}".format(
         rtc_time['tm_year'], rtc_time['tm_mon'] + 1, rtc_time['tm_mday'],
         rtc_time['tm_hour'], rtc_time['tm_min'], rtc_time['tm_sec']))
 else:
-    print("Initialization failed: Could not read RTC")
-
-# State: Default to CLOCK_MODE after pin initialization
-mode = CLOCK_MODE
-sub_mode = None
-last_swo = False
-last_swo_change = 0
-#last_midnight_check = 0
-last_rtc_update = time.monotonic()
-effect_active = False
-effect_start = 0
-buzzer_cycle = 0  # Track buzzer cycle (0 to settings.get("buzzer_max_cycles")-1)
-buzzer_state = None  # Track buzzer state (Beep1, Stop1, Beep2, Stop2, Beep3, Pause)
-buzzer_state_start = 0  # Track start time of current buzzer state
-timer_seconds = 5  # Initial timer value
-timer_last_update = 0
-stopwatch_seconds = 0  # Stopwatch display value
-stopwatch_background_seconds = 0  # Background counting
-paused_time = 0  # Time when paused
-stopwatch_last_update = 0
-start_time = time.monotonic()
-settle_confirmed = False
-print("Entering mode: {}".format(mode))
-
-# loop_count = 0
-# last_time = time.monotonic()
-
-# Main loop
-while True:
-    #loop_count += 1
-    current_time = time.monotonic()
-
-    # Check for new settings via serial
-    if data_serial.in_waiting > 0:
-        command = read_line()
-        handle_command(command)
-
-    # if current_time - last_time >= 1.0:
-    #     print("Loop frequency:", loop_count, "Hz")
-    #     loop_count = 0
-    #     last_time = current_time
-    
-    # Confirm CLOCK_MODE after settle period (once)
-    if not settle_confirmed and current_time - start_time > SETTLE_PERIOD:
-        print("Confirmed: Remained in CLOCK_MODE after settle period")
-        settle_confirmed = True
-
-    # Update RTC time periodically
-    if mode == CLOCK_MODE and current_time - last_rtc_update >= RTC_UPDATE_INTERVAL:
-        new_time = rtc.get_time()
-        if new_time:
-            rtc_time = new_time
-        last_rtc_update = current_time
-
-    # Read buttons, ignore events during settle period
-    button_event = None
-    if current_time - start_time > SETTLE_PERIOD:
-        button_event = buttons.get_event()
+    log.error("Initialization failed: Could not read RTC")
+
+class ClockState:
+    """State shared by all tasks of the main loop."""
+
+    def __init__(self):
+        # Default to CLOCK_MODE after pin initialization
+        self.mode = CLOCK_MODE
+        self.sub_mode = None
+        self.swo_state = False
+        self.effect_active = False
+        self.effect_start = 0
+        self.buzzer_started = asyncio.Event()  # Wakes the buzzer task
+        self.timer_seconds = 5  # Initial timer value
+        self.timer_target = None  # Expiry time of the TIMER_MODE countdown, None when not armed
+        self.alarm_minute = -1  # Clock minute the alarms were last checked for
+        self.paused_ms = 0  # Stopwatch time shown while paused, the stopwatch keeps counting behind it
+        self.settle_confirmed = False
+        self.settings_dirty = False  # Settings changed but not written to flash yet
+        self.settings_changed_at = 0
+
+
+state = ClockState()
+log.info("Entering mode: {}", state.mode)
+
+
+def program_alarm():
+    """Point RTC alarm 1 at the timer due next, or turn it off when none runs."""
+    expiry = timers.next_expiry()
+    if expiry is None:
+        rtc.clear_alarm1()
+    else:
+        rtc.set_alarm1(expiry)
+
+
+def start_timer(name, seconds):
+    """Start (or restart) a named timer, False while the time of day is unknown."""
+    if not clock.time:
+        return False
+    expiry = time_to_seconds(clock.time) + seconds
+    first = timers.next_expiry()
+    timers.add(name, expiry)
+    if timers.next_expiry() != first:
+        program_alarm()
+    return True
+
+
+def cancel_timer(name):
+    first = timers.next_expiry()
+    if not timers.cancel(name):
+        return False
+    if timers.next_expiry() != first:
+        program_alarm()
+    return True
+
+
+def alert(pattern):
+    """Sound the buzzer, with the rainbow effect when the clock is shown."""
+    sequencer.play(pattern)
+    state.buzzer_started.set()
+    if state.mode == CLOCK_MODE:
+        state.effect_active = True
+        state.effect_start = time.monotonic()
+
+
+def timer_expired(name):
+    log.info("Timer {} expired", name)
+    alert(buzzer_pattern)
+
+
+def check_alarms():
+    """Sound the alarms of the clock's minute, looked up only when the minute changes."""
+    now = clock.time
+    if not now or now['tm_min'] == state.alarm_minute:
+        return
+    state.alarm_minute = now['tm_min']
+    for pattern in alarms.check(now['tm_wday'], now['tm_hour'] * 60 + now['tm_min']):
+        log.info("Alarm at {:02d}:{:02d}", now['tm_hour'], now['tm_min'])
+        alert(pattern or buzzer_pattern)
+
+
+def check_timers():
+    """Fire the timers that are due, once A1F reports that alarm 1 reached the first of them."""
+    expiry = timers.next_expiry()
+    if expiry is None:
+        return
+    now = time_to_seconds(clock.time) if clock.time else None
+    if rtc.take_flag(rtc.STATUS_A1F):
+        due = expiry if now is None else max(now, expiry)
+    elif now is not None and now - expiry >= TIMER_FLAG_GRACE:
+        due = now  # No A1F, e.g. the alarm could not be written while the bus was busy
+    else:
+        return
+    for name in timers.pop_expired(due):
+        timer_expired(name)
+    program_alarm()
+
+
+def arm_timer():
+    """Run the TIMER_MODE countdown as the named timer TIMER_NAME."""
+    if state.timer_seconds <= 0:
+        return
+    try:
+        if start_timer(TIMER_NAME, state.timer_seconds):
+            state.timer_target = timers.get(TIMER_NAME)
+    except ValueError as e:
+        log.warning("TIMER_MODE: {}", e)
+
+
+def restore_timer():
+    """Take back the countdown alarm 1 still holds after a soft reset, as TIMER_NAME."""
+    if not clock.time:
+        return
+    now = time_to_seconds(clock.time)
+    expiry = rtc.get_alarm1(now)
+    if expiry is None:
+        return
+    fired = rtc.take_flag(rtc.STATUS_A1F)
+    if expiry > now and not fired:
+        timers.add(TIMER_NAME, expiry)
+        log.info("Timer {} restored from alarm 1, {} seconds left", TIMER_NAME, expiry - now)
+    elif 0 <= now - expiry <= TIMER_RESTORE_LATE:
+        timer_expired(TIMER_NAME)  # Ran out during the reset
+    program_alarm()
+
+
+# Only the timer due first survives a soft reset, alarm 1 holds its expiry but not its name
+restore_timer()
+
+
+def update_timer(ticks):
+    """Remaining time of the TIMER_MODE countdown, negative once it expired."""
+    if state.timer_target is not None:
+        remaining = state.timer_target - time_to_seconds(clock.time)
+        # Expiry comes from check_timers(), until then the countdown never shows zero
+        if TIMER_NAME in timers:
+            state.timer_seconds = max(remaining, 1)
+            return
+        # Expired, count on from the ticks so added time starts a new countdown
+        state.timer_seconds = min(remaining, 0)
+        state.timer_target = None
+        return
+    # Time of day unknown, count the SWO ticks down instead
+    previous = state.timer_seconds
+    state.timer_seconds -= ticks
+    if previous > 0 >= state.timer_seconds:
+        log.info("TIMER_MODE: Timer reached zero")
+    if previous >= 0 > state.timer_seconds:
+        log.info("TIMER_MODE: Timer entered negative time")
+
+
+def handle_button(button_event, current_time):
+    """Apply a button event to the current mode."""
+    if state.mode == CLOCK_MODE:
+        if button_event == "DOWN_SHORT":
+            state.mode = TIMER_MODE
+            state.timer_target = timers.get(TIMER_NAME)
+            if state.timer_target is None:
+                state.timer_seconds = 5
+                arm_timer()
+            else:
+                update_timer(0)  # Still running in the background
+            log.info("Entering mode: {}", state.mode)
+        elif button_event == "UP_SHORT":
+            state.mode = STOPWATCH_MODE
+            state.sub_mode = STOPWATCH_COUNTING
+            stopwatch.reset(buttons.event_time)  # Counts from the key press, not from its release
+            state.paused_ms = 0
+            log.info("Entering mode: {} ({})", state.mode, state.sub_mode)
+        elif button_event == "BOTTOM_SHORT":
+            state.effect_active = True
+            state.effect_start = current_time
+            sequencer.play(buzzer_pattern)
+            state.buzzer_started.set()
+            log.info("CLOCK_MODE: Starting snake rainbow effect with buzzer")
+    elif state.mode == TIMER_MODE:
+        if button_event == "BOTTOM_SHORT":
+            state.mode = CLOCK_MODE
+            # A running countdown goes on in the background, an expired one is done
+            if TIMER_NAME not in timers:
+                state.timer_target = None
+            log.info("Entering mode: {}", state.mode)
+        elif button_event == "UP_DOWN_CHORD":
+            state.mode = CLOCK_MODE
+            cancel_timer(TIMER_NAME)
+            state.timer_target = None
+            log.info("TIMER_MODE: Timer cancelled, entering mode: {}", state.mode)
+        elif button_event in ("DOWN_SHORT", "DOWN_LONG", "DOWN_REPEAT"):
+            state.timer_seconds += 5
+            arm_timer()
+            log.info("TIMER_MODE: Added 5 seconds, new time: {} seconds", state.timer_seconds)
+        elif button_event in ("UP_SHORT", "UP_LONG", "UP_REPEAT"):
+            state.timer_seconds += 60
+            arm_timer()
+            log.info("TIMER_MODE: Added 1 minute, new time: {} seconds", state.timer_seconds)
+    elif state.mode == STOPWATCH_MODE:
+        if button_event == "BOTTOM_SHORT":
+            state.mode = CLOCK_MODE
+            log.info("Entering mode: {}", state.mode)
+        elif button_event == "UP_SHORT":
+            if state.sub_mode == STOPWATCH_COUNTING:
+                stopwatch.reset(buttons.event_time)
+                log.info("STOPWATCH_MODE: Reset to 00:00, mode: {}", state.sub_mode)
+            elif state.sub_mode == STOPWATCH_PAUSED:
+                state.sub_mode = STOPWATCH_COUNTING
+                state.paused_ms = 0
+                log.info("STOPWATCH_MODE: Resumed from background time, mode: {}", state.sub_mode)
+        elif button_event == "UP_LONG":
+            if state.sub_mode == STOPWATCH_COUNTING:
+                # The split is taken at the press, the LONG event only confirms it
+                split = stopwatch.lap(buttons.event_time)
+                log.info("STOPWATCH_MODE: Lap {} at {} ms", stopwatch.laps, split)
+        elif button_event == "DOWN_SHORT":
+            if state.sub_mode == STOPWATCH_COUNTING:
+                state.sub_mode = STOPWATCH_PAUSED
+                state.paused_ms = stopwatch.elapsed(buttons.event_time)
+                log.info("STOPWATCH_MODE: Paused at {} ms, mode: {}", state.paused_ms, state.sub_mode)
+            elif state.sub_mode == STOPWATCH_PAUSED:
+                state.sub_mode = STOPWATCH_COUNTING
+                stopwatch.start(buttons.event_time, state.paused_ms)
+                log.info("STOPWATCH_MODE: Resumed from paused time, mode: {}", state.sub_mode)
+
+
+def clock_advanced(ticks):
+    """Fire what is due at the clock's new time, after SWO ticks or a direct read of the RTC."""
+    check_timers()
+    check_alarms()
+    if state.mode == TIMER_MODE:
+        update_timer(ticks)
+
+
+async def serial_task():
+    """Check for new settings via serial."""
+    while True:
+        started = stats.start()
+        # Partial lines stay buffered in the reader, the other tasks keep running
+        command = line_reader.poll()
+        while command is not None:
+            if isinstance(command, bytes):
+                handle_frame(command)
+            elif command:
+                handle_command(command)
+            command = line_reader.poll()
+        stats.stop(STAGE_SERIAL, started)
+        await asyncio.sleep(SERIAL_INTERVAL)
+
+
+async def settings_task():
+    """Write changed settings to flash once they stop changing."""
+    while True:
+        if state.settings_dirty and time.monotonic() - state.settings_changed_at >= SETTINGS_SAVE_DELAY:
+            state.settings_dirty = False
+            save_settings()
+        await asyncio.sleep(SETTINGS_INTERVAL)
 
-    # Process button events
-    if button_event:
-        if mode == CLOCK_MODE:
-            if button_event == "DOWN_SHORT":
-                mode = TIMER_MODE
-                timer_seconds = 5
-                timer_last_update = current_time
-                print("Entering mode: {}".format(mode))
-            elif button_event == "UP_SHORT":
-                mode = STOPWATCH_MODE
-                sub_mode = STOPWATCH_COUNTING
-                stopwatch_seconds = 0
-                stopwatch_background_seconds = 0
-                paused_time = 0
-                stopwatch_last_update = current_time
-                print("Entering mode: {} ({})".format(mode, sub_mode))
-            elif button_event == "BOTTOM_SHORT":
-                effect_active = True
-                effect_start = current_time
-                buzzer_cycle = 0
-                buzzer_state = "Beep1"
-                buzzer_state_start = current_time
-                buzzer.duty_cycle = 32768  # Start first beep
-                print("CLOCK_MODE: Starting snake rainbow effect with buzzer")
-        elif mode == TIMER_MODE:
-            if button_event == "BOTTOM_SHORT":
-                mode = CLOCK_MODE
-                print("Entering mode: {}".format(mode))
-            elif button_event == "DOWN_SHORT":
-                timer_seconds += 5
-                print("TIMER_MODE: Added 5 seconds, new time: {} seconds".format(timer_seconds))
-            elif button_event == "UP_SHORT":
-                timer_seconds += 60
-                print("TIMER_MODE: Added 1 minute, new time: {} seconds".format(timer_seconds))
-        elif mode == STOPWATCH_MODE:
-            if button_event == "BOTTOM_SHORT":
-                mode = CLOCK_MODE
-                print("Entering mode: {}".format(mode))
-            elif button_event == "UP_SHORT":
-                if sub_mode == STOPWATCH_COUNTING:
-                    stopwatch_seconds = 0
-                    stopwatch_background_seconds = 0
-                    stopwatch_last_update = current_time
-                    print("STOPWATCH_MODE: Reset to 00:00, mode: {}".format(sub_mode))
-                elif sub_mode == STOPWATCH_PAUSED:
-                    sub_mode = STOPWATCH_COUNTING
-                    stopwatch_seconds = stopwatch_background_seconds
-                    paused_time = 0
-                    print("STOPWATCH_MODE: Resumed from background time, mode: {}".format(sub_mode))
-            elif button_event == "DOWN_SHORT":
-                if sub_mode == STOPWATCH_COUNTING:
-                    sub_mode = STOPWATCH_PAUSED
-                    paused_time = stopwatch_seconds
-                    print("STOPWATCH_MODE: Paused at {:02d}:{:02d}, mode: {}".format(
-                        paused_time // 60, paused_time % 60, sub_mode))
-                elif sub_mode == STOPWATCH_PAUSED:
-                    sub_mode = STOPWATCH_COUNTING
-                    stopwatch_seconds = paused_time
-                    print("STOPWATCH_MODE: Resumed from paused time, mode: {}".format(sub_mode))
-    
-    # Handle buzzer pattern during rainbow effect
-    if effect_active:
-        elapsed = current_time - buzzer_state_start
-        cycle_elapsed = current_time - effect_start - (buzzer_cycle * BUZZER_CYCLE_TIME)
-        
-        if buzzer_cycle < settings.get("buzzer_max_cycles"):
-            if buzzer_state == "Beep1" and elapsed >= settings.get("buzzer_beep_duration"):
-                buzzer.duty_cycle = 0
-                buzzer_state = "Stop1"
-                buzzer_state_start = current_time
-            elif buzzer_state == "Stop1" and elapsed >= settings.get("buzzer_stop_duration"):
-                buzzer.duty_cycle = 32768
-                buzzer_state = "Beep2"
-                buzzer_state_start = current_time
-            elif buzzer_state == "Beep2" and elapsed >= settings.get("buzzer_beep_duration"):
-                buzzer.duty_cycle = 0
-                buzzer_state = "Stop2"
-                buzzer_state_start = current_time
-            elif buzzer_state == "Stop2" and elapsed >= settings.get("buzzer_stop_duration"):
-                buzzer.duty_cycle = 32768
-                buzzer_state = "Beep3"
-                buzzer_state_start = current_time
-            elif buzzer_state == "Beep3" and elapsed >= settings.get("buzzer_beep_duration"):
-                buzzer.duty_cycle = 0
-                buzzer_state = "Pause"
-                buzzer_state_start = current_time
-            elif buzzer_state == "Pause" and elapsed >= settings.get("buzzer_pause_duration"):
-                buzzer_cycle += 1
-                if buzzer_cycle < settings.get("buzzer_max_cycles"):
-                    buzzer.duty_cycle = 32768
-                    buzzer_state = "Beep1"
-                    buzzer_state_start = current_time
-        
-        # End effect after 5 seconds
-        if current_time - effect_start >= 5:
-            effect_active = False
-            buzzer.duty_cycle = 0  # Ensure buzzer is off
-            print("CLOCK_MODE: Snake rainbow effect ended")
-    
-    # # Check for midnight (once per minute)
-    # if current_time - last_midnight_check >= 60:
-    #     if rtc_time and rtc_time['tm_hour'] == 0 and rtc_time['tm_min'] == 0:
-    #         new_time = rtc.get_time()
-    #         if new_time:
-    #             rtc_time = new_time
-    #             print("Midnight sync: {:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}".format(
-    #                 rtc_time['tm_year'], rtc_time['tm_mon'] + 1, rtc_time['tm_mday'],
-    #                 rtc_time['tm_hour'], rtc_time['tm_min'], rtc_time['tm_sec']))
-    #     last_midnight_check = current_time
-    
-    # Synchronize timer and stopwatch with SWO
-    swo_state = swo.value
-    if swo_state and not last_swo and current_time - last_swo_change > 0.1:
-        if mode == TIMER_MODE:
-            timer_seconds -= 1
-            timer_last_update = current_time
-            if timer_seconds == 0:
-                print("TIMER_MODE: Timer reached zero")
-            elif timer_seconds == -1:
-                print("TIMER_MODE: Timer entered negative time")
-        elif mode == STOPWATCH_MODE:
-            stopwatch_background_seconds += 1
-            if sub_mode == STOPWATCH_COUNTING:
-                stopwatch_seconds += 1
-            stopwatch_last_update = current_time
-    
-    # Update SWO state
-    if swo_state != last_swo:
-        last_swo = swo_state
-        last_swo_change = current_time
-
-    brightness = light_sensor.get_brightness()
-    # Update display
-    if mode == CLOCK_MODE:
-        if effect_active:
-            display.show_time_with_effect(rtc_time, swo_state, current_time - effect_start)
-        else:
-            display.show_time(rtc_time, swo_state, brightness)
-    elif mode == TIMER_MODE:
-        if buttons.is_bottom_held():
-            display.show_time(rtc_time, swo_state, brightness)
-            print("TIMER_MODE: Showing clock time during BOTTOM_BTN hold")
-        else:
-            display.show_timer(timer_seconds, swo_state, brightness)
-    elif mode == STOPWATCH_MODE:
-        if buttons.is_bottom_held():
-            display.show_time(rtc_time, swo_state, brightness)
-            print("STOPWATCH_MODE: Showing clock time during BOTTOM_BTN hold")
+
+async def rtc_task():
+    """Fall back to reading the RTC every second while SWO ticks are missing."""
+    while True:
+        started = stats.start()
+        if time.monotonic() - swo.last_tick > SWO_TIMEOUT:
+            clock.sync()
+            clock_advanced(0)
+        stats.stop(STAGE_RTC, started)
+        await asyncio.sleep(RTC_UPDATE_INTERVAL)
+
+
+async def button_task():
+    """Read buttons, ignore events during settle period."""
+    while True:
+        started = stats.start()
+        current_time = time.monotonic()
+        button_event = buttons.get_event()
+        if buttons.stable:
+            # Confirm CLOCK_MODE once the pull-ups have settled
+            if not state.settle_confirmed:
+                log.info("Confirmed: Remained in CLOCK_MODE after settle period")
+                state.settle_confirmed = True
+            if button_event:
+                handle_button(button_event, current_time)
+        stats.stop(STAGE_BUTTONS, started)
+        await asyncio.sleep(BUTTON_INTERVAL)
+
+
+async def buzzer_task():
+    """Play buzzer patterns, sleeping until the next step is due or a new pattern starts."""
+    while True:
+        await state.buzzer_started.wait()
+        delay = 0
+        while delay is not None:
+            state.buzzer_started.clear()
+            started = stats.start()
+            delay = sequencer.update(ticks_ms())
+            stats.stop(STAGE_BUZZER, started)
+            if delay is not None:
+                # play() sets the event, its first step must not wait for a step of the old pattern
+                try:
+                    await asyncio.wait_for_ms(state.buzzer_started.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+
+async def swo_task():
+    """Synchronize timer and stopwatch with SWO."""
+    while True:
+        started = stats.start()
+        # Consume every tick counted since the last look, a busy loop never drops a second
+        ticks = swo.take_ticks()
+        clock.tick(ticks)
+        if ticks:
+            clock_advanced(ticks)
+        state.swo_state = swo.is_high()
+        stats.stop(STAGE_SWO, started)
+        await asyncio.sleep(SWO_INTERVAL)
+
+
+async def display_task():
+    """Update display."""
+    light_level = None
+    period = -1
+    while True:
+        started = stats.frame()  # Frame gaps show up in get_stats as "frame_gap"
+        current_time = time.monotonic()
+        swo_state = state.swo_state
+        brightness = light_sensor.get_brightness()
+        if config.auto_brightness:
+            if display.period != period:
+                period = display.period
+                light_level = None  # A period's own brightness ended or began, restore the auto level
+            # Continuous level, the display fades to it and keeps it between samples
+            if light_sensor.level != light_level:
+                light_level = light_sensor.level
+                display.set_level(auto_brightness(light_level))
+            brightness = None
         else:
-            display_seconds = paused_time if sub_mode == STOPWATCH_PAUSED else stopwatch_seconds
-            display.show_stopwatch(display_seconds, swo_state, brightness)
+            light_level = None
+        # End effect after EFFECT_DURATION
+        if state.effect_active and current_time - state.effect_start >= EFFECT_DURATION:
+            state.effect_active = False
+            sequencer.stop()  # Ensure buzzer is off
+            log.info("CLOCK_MODE: Snake rainbow effect ended")
+        if state.mode == CLOCK_MODE:
+            if state.effect_active:
+                display.show_time_with_effect(clock.time, swo_state, current_time - state.effect_start)
+                light_level = None  # The effect runs at normal brightness, restore the auto level after it
+            else:
+                display.show_time(clock.time, swo_state, brightness)
+        elif state.mode == TIMER_MODE:
+            if buttons.is_bottom_held():
+                display.show_time(clock.time, swo_state, brightness)
+                log.debug("TIMER_MODE: Showing clock time during BOTTOM_BTN hold")
+            else:
+                display.show_timer(state.timer_seconds, swo_state, brightness)
+        elif state.mode == STOPWATCH_MODE:
+            if buttons.is_bottom_held():
+                display.show_time(clock.time, swo_state, brightness)
+                log.debug("STOPWATCH_MODE: Showing clock time during BOTTOM_BTN hold")
+            else:
+                display_ms = state.paused_ms if state.sub_mode == STOPWATCH_PAUSED else stopwatch.elapsed(ticks_ms())
+                display.show_stopwatch(display_ms, swo_state, brightness)
+
+        stats.stop(STAGE_DISPLAY, started)
+        #watchdog.feed()
+        await asyncio.sleep(REFRESH_INTERVAL)
+
+
+async def main():
+    # Each stage runs at its own rate, a slow one no longer holds up the others
+    await asyncio.gather(
+        asyncio.create_task(serial_task()),
+        asyncio.create_task(settings_task()),
+        asyncio.create_task(rtc_task()),
+        asyncio.create_task(button_task()),
+        asyncio.create_task(buzzer_task()),
+        asyncio.create_task(swo_task()),
+        asyncio.create_task(display_task()),
+    )
+
 
-    #watchdog.feed()
-    time.sleep(REFRESH_INTERVAL)
\ No newline at end of file
+asyncio.run(main())
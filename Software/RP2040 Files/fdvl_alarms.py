@@ -0,0 +1,76 @@
+# fdvl_alarms.py
+# Daily alarms as (minute of day, weekday mask, pattern) in an index sorted by minute,
+# searched once per minute of the clock instead of on every frame.
+from array import array
+from fdvl_schedule import MINUTES_PER_DAY
+
+MAX_ALARMS = 32
+EVERY_DAY = 0x7F  # Bit n is weekday n, Monday = 0 as in tm_wday
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+def bisect_left(values, value):
+    """First index of a sorted sequence whose item is not below value."""
+    low = 0
+    high = len(values)
+    while low < high:
+        middle = (low + high) >> 1
+        if values[middle] < value:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+class Alarms:
+    """Sorted alarm index, check() reports each alarm once for the minute it is reached.
+
+    Minutes skipped in one step (a stalled loop, a late RTC read) are caught up to
+    CATCH_UP_MINUTES, a longer jump means the time was set and only the new minute counts.
+    """
+    CATCH_UP_MINUTES = 5
+
+    def __init__(self):
+        self.minutes = array("H")  # Minute of the day, ascending
+        self.masks = array("B")  # Weekdays of each alarm
+        self.patterns = []  # Buzzer pattern of each alarm, None for the default one
+        self.last_minute = -1  # Minute of the week of the last check, -1 before the first
+
+    def build(self, entries):
+        """Replace the alarms with (minute of day, weekday mask, pattern) entries in any order."""
+        entries = sorted(entries[:MAX_ALARMS], key=lambda entry: entry[0])
+        self.minutes = array("H", [entry[0] for entry in entries])
+        self.masks = array("B", [entry[1] for entry in entries])
+        self.patterns = [entry[2] for entry in entries]
+
+    def __len__(self):
+        return len(self.minutes)
+
+    def due(self, weekday, minute, fired):
+        """Append the patterns of the alarms set for a minute of the day on a weekday."""
+        minutes = self.minutes
+        bit = 1 << weekday
+        i = bisect_left(minutes, minute)
+        while i < len(minutes) and minutes[i] == minute:
+            if self.masks[i] & bit:
+                fired.append(self.patterns[i])
+            i += 1
+
+    def check(self, weekday, minute):
+        """Patterns of the alarms reached since the last check, call when the minute changes.
+
+        The first check only notes the time, an alarm is not repeated by a restart within its minute.
+        """
+        now = weekday * MINUTES_PER_DAY + minute
+        last = self.last_minute
+        self.last_minute = now
+        fired = []
+        if last < 0 or now == last or not self.minutes:
+            return fired
+        steps = (now - last) % MINUTES_PER_WEEK
+        if steps > self.CATCH_UP_MINUTES:
+            steps = 1
+        for back in range(steps - 1, -1, -1):
+            week_minute = (now - back) % MINUTES_PER_WEEK
+            self.due(week_minute // MINUTES_PER_DAY, week_minute % MINUTES_PER_DAY, fired)
+        return fired
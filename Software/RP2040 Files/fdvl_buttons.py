@@ -1,130 +1,117 @@
 # fdvl_buttons.py
-import time
-import digitalio # type: ignore
+import keypad # type: ignore
+from adafruit_ticks import ticks_ms, ticks_add, ticks_diff # type: ignore
 
 class Buttons:
-    DEBOUNCE_TIME = 0.02  # 20ms
+    NAMES = ("BOTTOM", "UP", "DOWN")  # Key numbers 0, 1, 2
+    DEBOUNCE_TIME = 0.02  # 20ms background scan interval
     SHORT_PRESS_TIME = 0.5  # Max time for short press
     LONG_PRESS_TIME = 1.0  # Min time for long press
-    INIT_STABILIZE_TIME = 3.0  # 3s to stabilize pull-ups
-    CONFIRM_COUNT = 3  # Number of readings to confirm state
-    CONFIRM_INTERVAL = 0.01  # 10ms between readings
-    DIAG_LOG_TIME = 0.0  # Disable diagnostic logs
+    REPEAT_INTERVAL = 0.2  # Time between repeat events while a long press is held
+    INIT_STABILIZE_TIME = 0.3  # Pull-ups settle while the rest of the clock boots, events are dropped meanwhile
+    MAX_EVENTS = 8  # Pending events kept before the oldest is dropped
 
     def __init__(self, bottom_pin, up_pin, down_pin):
-        self.bottom = digitalio.DigitalInOut(bottom_pin)
-        self.bottom.direction = digitalio.Direction.INPUT
-        self.bottom.pull = digitalio.Pull.UP
-        self.up = digitalio.DigitalInOut(up_pin)
-        self.up.direction = digitalio.Direction.INPUT
-        self.up.pull = digitalio.Pull.UP
-        self.down = digitalio.DigitalInOut(down_pin)
-        self.down.direction = digitalio.Direction.INPUT
-        self.down.pull = digitalio.Pull.UP
-        
-        # Wait for pull-ups to stabilize
-        time.sleep(self.INIT_STABILIZE_TIME)
-        
-        self.start_time = time.monotonic()
-        # Validate initial states, retry if low
-        self.last_state = {
-            "bottom": False,#self.validate_initial_state(self.bottom, "BOTTOM"),
-            "up": False,#self.validate_initial_state(self.up, "UP"),
-            "down": False#self.validate_initial_state(self.down, "DOWN")
-        }
-        self.last_change = {"bottom": self.start_time, "up": self.start_time, "down": self.start_time}
+        # Pins are scanned and debounced in the background, the main loop never sleeps here
+        self.keys = keypad.Keys(
+            (bottom_pin, up_pin, down_pin),
+            value_when_pressed=False,
+            pull=True,
+            interval=self.DEBOUNCE_TIME,
+            max_events=self.MAX_EVENTS)
+        self.key_event = keypad.Event()
+        self.short_ms = int(self.SHORT_PRESS_TIME * 1000)
+        self.long_ms = int(self.LONG_PRESS_TIME * 1000)
+        self.repeat_ms = int(self.REPEAT_INTERVAL * 1000)
+
+        self.start_ticks = ticks_ms()
+        self.stable = False
+        self.pressed = 0  # Bitmask of held keys
+        self.chord = 0  # Bitmask of keys pressed together in the current chord
+        self.long_sent = 0  # Bitmask of held keys that already emitted LONG
+        self.press_start = [0, 0, 0]
+        self.next_repeat = [0, 0, 0]
+        self.events = []
+        self.event_ticks = []
         self.event = None
-        self.bottom_press_start = 0
-        self.was_pressed = {"bottom": False, "up": False, "down": False}
-        print("Initial button states - BOTTOM: {}, UP: {}, DOWN: {}".format(
-            self.last_state["bottom"], self.last_state["up"], self.last_state["down"]))
-        self.is_bottom_holding = False
+        self.event_time = 0  # ticks_ms of the key press behind the last event
+
+    def queue(self, event, ticks):
+        """Queue an event with its press time, dropping the oldest if nobody is reading."""
+        if len(self.events) >= self.MAX_EVENTS:
+            self.events.pop(0)
+            self.event_ticks.pop(0)
+        self.events.append(event)
+        self.event_ticks.append(ticks)
+
+    def chord_name(self, mask):
+        """Name a chord after its keys, e.g. UP_DOWN_CHORD."""
+        name = ""
+        for key, key_name in enumerate(self.NAMES):
+            if mask & (1 << key):
+                name += key_name + "_"
+        return name + "CHORD"
 
-    # def validate_initial_state(self, pin, name):
-    #     """Validate initial pin state, retry if low."""
-    #     for _ in range(5):  # Try up to 5 times
-    #         if self.confirm_state(pin, True):  # Expect high (not pressed)
-    #             return True
-    #         print("Warning: {} button initially low, retrying...".format(name))
-    #         time.sleep(0.1)
-    #     print("Error: {} button stuck low after retries".format(name))
-    #     return False  # Default to not pressed to avoid false events
+    def scan(self):
+        """Turn background key transitions and hold times into queued events."""
+        now = ticks_ms()
+        key_event = self.key_event
+        if not self.stable:
+            if ticks_diff(now, self.start_ticks) < self.INIT_STABILIZE_TIME * 1000:
+                self.keys.events.clear()
+                return
+            self.stable = True
 
-    def confirm_state(self, pin, expected_state):
-        """Confirm pin state with multiple readings."""
-        for _ in range(self.CONFIRM_COUNT):
-            if pin.value != expected_state:
-                return False
-            time.sleep(self.CONFIRM_INTERVAL)
-        return True
+        while self.keys.events.get_into(key_event):
+            key = key_event.key_number
+            bit = 1 << key
+            if key_event.pressed:
+                # A key going down while another short press is held starts a chord
+                if self.pressed & ~self.long_sent:
+                    self.chord |= self.pressed | bit
+                self.pressed |= bit
+                self.long_sent &= ~bit
+                self.press_start[key] = key_event.timestamp
+            else:
+                if not self.pressed & bit:
+                    continue  # Went down while the pull-ups settled, its press was dropped
+                self.pressed &= ~bit
+                if self.chord & bit:
+                    if not self.pressed & self.chord:
+                        self.queue(self.chord_name(self.chord), key_event.timestamp)
+                        self.chord = 0
+                elif not self.long_sent & bit:
+                    if ticks_diff(key_event.timestamp, self.press_start[key]) < self.short_ms:
+                        self.queue(self.NAMES[key] + "_SHORT", self.press_start[key])
+                self.long_sent &= ~bit
+
+        # Long press and auto-repeat for keys held on their own
+        held = self.pressed & ~self.chord
+        key = 0
+        while held:
+            if held & 1:
+                bit = 1 << key
+                if not self.long_sent & bit:
+                    if ticks_diff(now, self.press_start[key]) >= self.long_ms:
+                        self.long_sent |= bit
+                        self.next_repeat[key] = ticks_add(self.press_start[key], self.long_ms + self.repeat_ms)
+                        self.queue(self.NAMES[key] + "_LONG", self.press_start[key])
+                elif ticks_diff(now, self.next_repeat[key]) >= 0:
+                    self.queue(self.NAMES[key] + "_REPEAT", self.next_repeat[key])
+                    self.next_repeat[key] = ticks_add(self.next_repeat[key], self.repeat_ms)
+            held >>= 1
+            key += 1
 
     def is_bottom_held(self):
         """Check if BOTTOM_BTN is held for >= 1s."""
-        current_time = time.monotonic()
-        current_state = not self.bottom.value  # Active low
-        if current_state and self.last_state["bottom"] and not self.is_bottom_holding:
-            self.bottom_press_start = current_time
-            self.is_bottom_holding = True
-        elif not current_state:
-            self.bottom_press_start = 0
-            self.is_bottom_holding = False
-        return current_state and (current_time - self.bottom_press_start >= self.LONG_PRESS_TIME)
+        return bool(self.pressed & 1) and ticks_diff(ticks_ms(), self.press_start[0]) >= self.long_ms
 
     def get_event(self):
-        """Check for button events (short press)."""
-        current_time = time.monotonic()
+        """Return the next button event (SHORT, LONG, REPEAT or CHORD) or None, never blocks."""
+        self.scan()
         event = None
-
-        # Check BOTTOM_BTN
-        current_state = not self.bottom.value  # Active low
-        if current_state != self.last_state["bottom"]:
-            if self.confirm_state(self.bottom, not current_state):
-                if current_time - self.last_change["bottom"] > self.DEBOUNCE_TIME:
-                    self.last_state["bottom"] = current_state
-                    # if current_time - self.start_time < self.DIAG_LOG_TIME:
-                    #     print("BOTTOM_BTN state changed to: {}".format("pressed" if current_state else "released"))
-                    if current_state:
-                        self.was_pressed["bottom"] = True
-                        self.last_change["bottom"] = current_time
-                    elif self.was_pressed["bottom"]:  # Released after being pressed
-                        press_duration = current_time - self.last_change["bottom"]
-                        if press_duration < self.SHORT_PRESS_TIME:
-                            event = "BOTTOM_SHORT"
-                        self.was_pressed["bottom"] = False
-        
-        # Check UP_BTN
-        current_state = not self.up.value
-        if current_state != self.last_state["up"]:
-            if self.confirm_state(self.up, not current_state):
-                if current_time - self.last_change["up"] > self.DEBOUNCE_TIME:
-                    self.last_state["up"] = current_state
-                    # if current_time - self.start_time < self.DIAG_LOG_TIME:
-                    #     print("UP_BTN state changed to: {}".format("pressed" if current_state else "released"))
-                    if current_state:
-                        self.was_pressed["up"] = True
-                        self.last_change["up"] = current_time
-                    elif self.was_pressed["up"]:
-                        press_duration = current_time - self.last_change["up"]
-                        if press_duration < self.SHORT_PRESS_TIME:
-                            event = "UP_SHORT"
-                        self.was_pressed["up"] = False
-        
-        # Check DOWN_BTN
-        current_state = not self.down.value
-        if current_state != self.last_state["down"]:
-            if self.confirm_state(self.down, not current_state):
-                if current_time - self.last_change["down"] > self.DEBOUNCE_TIME:
-                    self.last_state["down"] = current_state
-                    # if current_time - self.start_time < self.DIAG_LOG_TIME:
-                    #     print("DOWN_BTN state changed to: {}".format("pressed" if current_state else "released"))
-                    if current_state:
-                        self.was_pressed["down"] = True
-                        self.last_change["down"] = current_time
-                    elif self.was_pressed["down"]:
-                        press_duration = current_time - self.last_change["down"]
-                        if press_duration < self.SHORT_PRESS_TIME:
-                            event = "DOWN_SHORT"
-                        self.was_pressed["down"] = False
-        
+        if self.events:
+            event = self.events.pop(0)
+            self.event_time = self.event_ticks.pop(0)
         self.event = event
-        return event
\ No newline at end of file
+        return event
@@ -0,0 +1,108 @@
+# fdvl_buzzer.py
+from array import array
+from adafruit_ticks import ticks_ms, ticks_add, ticks_diff # type: ignore
+
+BEEP_DUTY = 32768  # 50% duty
+DEFAULT_NOTE_MS = 200
+NOTES = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+
+# A pattern is a flat array("H") of (frequency, duty_cycle, duration_ms) steps,
+# frequency 0 or duty 0 is silence.
+
+
+def beep_pattern(frequency, beep_ms, stop_ms, pause_ms, cycles):
+    """Beep1, Stop1, Beep2, Stop2, Beep3, Pause repeated for a number of cycles."""
+    steps = array("H")
+    for _ in range(cycles):
+        steps.extend((
+            frequency, BEEP_DUTY, beep_ms,
+            frequency, 0, stop_ms,
+            frequency, BEEP_DUTY, beep_ms,
+            frequency, 0, stop_ms,
+            frequency, BEEP_DUTY, beep_ms,
+            frequency, 0, pause_ms))
+    return steps
+
+
+def note_frequency(note):
+    """Frequency in Hz of a note like A4, C#5 or Bb3, or of a plain number."""
+    if note[0].isdigit():
+        return int(note)
+    semitone = NOTES[note[0].upper()]
+    octave = note[1:]
+    if octave[:1] == "#":
+        semitone += 1
+        octave = octave[1:]
+    elif octave[:1] == "b":
+        semitone -= 1
+        octave = octave[1:]
+    midi = 12 * (int(octave) + 1) + semitone
+    return int(440 * 2 ** ((midi - 69) / 12) + 0.5)
+
+
+def parse_melody(text, duty=BEEP_DUTY):
+    """Compile a melody like "C5:100 -:50 E5 2300:400" into a pattern, '-' is a rest."""
+    steps = array("H")
+    for token in text.split():
+        note, _, duration = token.partition(":")
+        try:
+            duration = int(duration) if duration else DEFAULT_NOTE_MS
+            if note == "-":
+                steps.extend((0, 0, duration))
+            else:
+                steps.extend((note_frequency(note), duty, duration))
+        except (KeyError, ValueError, IndexError):
+            raise ValueError("bad melody step: {}".format(token))
+    return steps
+
+
+class Sequencer:
+    """Plays a compiled pattern on a PWMOut, advanced from deadlines instead of per-frame state checks."""
+
+    def __init__(self, pwm):
+        self.pwm = pwm
+        self.steps = array("H")
+        self.index = 0  # Offset of the next step in steps
+        self.deadline = 0  # ticks_ms when the current step ends
+        self.frequency = 0
+        self.active = False
+
+    def play(self, steps):
+        """Start a pattern from its first step."""
+        self.steps = steps
+        self.index = 0
+        self.active = True
+        self.deadline = ticks_ms()
+        self.update(self.deadline)
+
+    def stop(self):
+        """Silence the buzzer and forget the pattern."""
+        self.active = False
+        self.pwm.duty_cycle = 0
+
+    def update(self, now):
+        """Advance past finished steps, return ms until the next deadline or None when done."""
+        if not self.active:
+            return None
+        remaining = ticks_diff(self.deadline, now)
+        if remaining > 0:
+            return remaining
+        steps = self.steps
+        while self.index < len(steps):
+            frequency = steps[self.index]
+            duty = steps[self.index + 1]
+            # Deadlines add up from the start, late wake-ups do not stretch the pattern
+            self.deadline = ticks_add(self.deadline, steps[self.index + 2])
+            self.index += 3
+            if frequency and duty:
+                if frequency != self.frequency:
+                    self.pwm.frequency = frequency
+                    self.frequency = frequency
+                self.pwm.duty_cycle = duty
+            else:
+                self.pwm.duty_cycle = 0
+            remaining = ticks_diff(self.deadline, now)
+            if remaining > 0:
+                return remaining
+        self.stop()
+        return None
@@ -1,6 +1,8 @@
 # fdvl_display.py
-import neopixel # type: ignore
-import math
+import digitalio # type: ignore
+from neopixel_write import neopixel_write # type: ignore
+from adafruit_ticks import ticks_ms, ticks_diff # type: ignore
+from fdvl_schedule import compile_schedule
 
 class Display:
     # Brightness settings
@@ -8,6 +10,9 @@ class Display:
     NORMAL_BRIGHTNESS = 0.05
     DARK_BRIGHTNESS = 0.02
     OFF_BRIGHTNESS = 0.01
+    LEVEL_SCALE = 1024  # Integer level of brightness 1.0
+    FADE_TIME = 1.0  # Seconds for a transition between brightness levels
+    GAMMA = 1.0  # 1.0 keeps colors linear
 
     # LED Configuration
     NUM_LEDS_CHAIN1 = 28  # LED201-LED228
@@ -25,69 +30,244 @@ class Display:
     OFF = (0, 0, 0)
     DOTS_ALWAYS_ON = True
 
-    def update_settings(self, settings):
+    def update_settings(self, config):
+        """Take display values from a validated fdvl_settings.Config."""
         # Update brightness levels
-        self.BRIGHT_BRIGHTNESS = settings.get("bright_brightness", self.BRIGHT_BRIGHTNESS)
-        self.NORMAL_BRIGHTNESS = settings.get("normal_brightness", self.NORMAL_BRIGHTNESS)
-        self.DARK_BRIGHTNESS = settings.get("dark_brightness", self.DARK_BRIGHTNESS)
-        self.OFF_BRIGHTNESS = settings.get("off_brightness", self.OFF_BRIGHTNESS)
-
-        # Update colors
-        self.DEFAULT_COLOR = tuple(settings.get("default_color", self.DEFAULT_COLOR))
-        self.TIMER_POSITIVE_COLOR = tuple(settings.get("TIMER_POSITIVE_COLOR", self.TIMER_POSITIVE_COLOR))
-        self.TIMER_NEGATIVE_COLOR = tuple(settings.get("TIMER_NEGATIVE_COLOR", self.TIMER_NEGATIVE_COLOR))
-        self.STOPWATCH_COLOR = tuple(settings.get("STOPWATCH_COLOR", self.STOPWATCH_COLOR))
-        self.NIGHT_COLOR = tuple(settings.get("night_color", self.NIGHT_COLOR))
+        self.BRIGHT_BRIGHTNESS = config.bright_brightness
+        self.NORMAL_BRIGHTNESS = config.normal_brightness
+        self.DARK_BRIGHTNESS = config.dark_brightness
+        self.OFF_BRIGHTNESS = config.off_brightness
+        self.FADE_TIME = config.brightness_fade_time
+        self.fade_ms = int(self.FADE_TIME * 1000)
+        self.update_levels()
+        if config.gamma != self.GAMMA:
+            self.GAMMA = config.gamma
+            self.build_gamma()
+            self.build_lut()
+            self.last_level = self.wheel_level = -1  # Same level, new curve
+
+        # Update colors, already (R, G, B) tuples of ints
+        self.DEFAULT_COLOR = config.default_color
+        self.TIMER_POSITIVE_COLOR = config.TIMER_POSITIVE_COLOR
+        self.TIMER_NEGATIVE_COLOR = config.TIMER_NEGATIVE_COLOR
+        self.STOPWATCH_COLOR = config.STOPWATCH_COLOR
+        self.NIGHT_COLOR = config.night_color
 
         # Night mode time
-        self.NIGHT_COLOR_HOURS_START = settings.get("night_color_hours_start", self.NIGHT_COLOR_HOURS_START)
-        self.NIGHT_COLOR_MINUTES_START = settings.get("night_color_minutes_start", self.NIGHT_COLOR_MINUTES_START)
-        self.NIGHT_COLOR_HOURS_END = settings.get("night_color_hours_end", self.NIGHT_COLOR_HOURS_END)
-        self.NIGHT_COLOR_MINUTES_END = settings.get("night_color_minutes_end", self.NIGHT_COLOR_MINUTES_END)
+        self.NIGHT_COLOR_HOURS_START = config.night_color_hours_start
+        self.NIGHT_COLOR_MINUTES_START = config.night_color_minutes_start
+        self.NIGHT_COLOR_HOURS_END = config.night_color_hours_end
+        self.NIGHT_COLOR_MINUTES_END = config.night_color_minutes_end
+
+        # Daily periods, night mode unless settings define a schedule
+        self.build_schedule(config.schedule_periods)
 
         # Dots always on
-        self.DOTS_ALWAYS_ON = settings.get("dots_always_on", self.DOTS_ALWAYS_ON)
-
-    # Seven-segment patterns (a, b, c, d, e, f, g)
-    DIGIT_PATTERNS = {
-        0: [1, 1, 1, 1, 1, 1, 0],
-        1: [0, 1, 1, 0, 0, 0, 0],
-        2: [1, 1, 0, 1, 1, 0, 1],
-        3: [1, 1, 1, 1, 0, 0, 1],
-        4: [0, 1, 1, 0, 0, 1, 1],
-        5: [1, 0, 1, 1, 0, 1, 1],
-        6: [1, 0, 1, 1, 1, 1, 1],
-        7: [1, 1, 1, 0, 0, 0, 0],
-        8: [1, 1, 1, 1, 1, 1, 1],
-        9: [1, 1, 1, 1, 0, 1, 1],
-        '-': [0, 0, 0, 0, 0, 0, 1]  # Middle bar for negative sign
-    }
-    SEGMENT_OFFSETS = [3, 4, 6, 0, 1, 2, 5]  # a, b, c, d, e, f, g
+        self.DOTS_ALWAYS_ON = config.dots_always_on
+
+    # Seven-segment glyphs as bitmasks, bit 0 = segment a ... bit 6 = segment g
+    GLYPHS = bytes((
+        0x3F, 0x06, 0x5B, 0x4F, 0x66, 0x6D, 0x7D, 0x07, 0x7F, 0x6F,  # 0-9
+        0x40,  # Middle bar for negative sign
+        0x00,  # Blank
+    ))
+    MINUS = 10
+    BLANK = 11
+    SEGMENT_OFFSETS = (3, 4, 6, 0, 1, 2, 5)  # a, b, c, d, e, f, g
+    DOT_LEDS = (28, 29)  # LED229, LED230 (first LEDs of chain 2)
+    HUE_STEPS = 256  # Entries in the rainbow hue wheel
 
     def __init__(self, pin1, pin2):
-        self.pixels1 = neopixel.NeoPixel(pin1, self.NUM_LEDS_CHAIN1, pixel_order=self.PIXEL_ORDER, auto_write=False)
-        self.pixels2 = neopixel.NeoPixel(pin2, self.NUM_LEDS_CHAIN2, pixel_order=self.PIXEL_ORDER, auto_write=False)
-        self.brightness = self.NORMAL_BRIGHTNESS
+        self.pin1 = digitalio.DigitalInOut(pin1)
+        self.pin1.direction = digitalio.Direction.OUTPUT
+        self.pin2 = digitalio.DigitalInOut(pin2)
+        self.pin2.direction = digitalio.Direction.OUTPUT
+
+        # Colors are scaled through an integer LUT, rebuilt only when the level changes
+        self.update_levels()
+        self.level = self.normal_level
+        self.target_level = self.level
+        self.fade_from = self.level
+        self.fade_start = ticks_ms()
+        self.fade_ms = int(self.FADE_TIME * 1000)
+        self.build_gamma()
+        self.lut = bytearray(256)
+        self.build_lut()
+
+        # Color and brightness of the time by minute of day
+        self.build_schedule(((
+            self.NIGHT_COLOR_HOURS_START * 60 + self.NIGHT_COLOR_MINUTES_START,
+            self.NIGHT_COLOR_HOURS_END * 60 + self.NIGHT_COLOR_MINUTES_END,
+            self.NIGHT_COLOR, None),))
+
+        # One GRB framebuffer for both chains, each chain is sent straight from its slice
+        self.frame = bytearray(3 * (self.NUM_LEDS_CHAIN1 + self.NUM_LEDS_CHAIN2))
+        view = memoryview(self.frame)
+        self.chain1 = view[:3 * self.NUM_LEDS_CHAIN1]
+        self.chain2 = view[3 * self.NUM_LEDS_CHAIN1:]
+
+        # Framebuffer byte offset of each segment (a-g) for every digit position
+        self.SEGMENT_INDEX = tuple(
+            bytes(3 * (7 * position + offset) for offset in self.SEGMENT_OFFSETS)
+            for position in range(4))
+        self.DOT_INDEX = bytes(3 * led for led in self.DOT_LEDS)
+
+        # Last frame pushed to the LEDs: packed glyph/dot bits, color and brightness level
+        self.last_bits = -1
+        self.last_color = None
+        self.last_level = -1
+        self.frames_pushed = 0
+        self.frames_skipped = 0
+
+        # Rainbow for the snake effect, built on its first frame to keep boot short
+        self.HUE_WHEEL = None
+        self.wheel = None
+        self.wheel_level = -1
+
+        # Snake effect LED order and base hues, cached per HH:MM and dot state
+        self.effect_key = -1
+        self.effect_leds = b""
+        self.effect_hues = b""
+
+    def build_schedule(self, periods):
+        """Compile (start, end, color, brightness) periods, period 0 is the default look."""
+        self.SCHEDULE = compile_schedule(periods)
+        self.PERIOD_COLORS = [self.DEFAULT_COLOR]
+        self.PERIOD_LEVELS = [-1]  # -1 follows the light sensor
+        for start, end, color, brightness in periods:
+            self.PERIOD_COLORS.append(color or self.DEFAULT_COLOR)
+            self.PERIOD_LEVELS.append(-1 if brightness is None else self.to_level(brightness))
+        self.period = -1  # Period of the last time shown, -1 before it or while something else is shown
+
+    def build_wheel(self):
+        """Full-saturation rainbow in GRB, the scaled copy is rebuilt on level change."""
+        self.HUE_WHEEL = bytearray(3 * self.HUE_STEPS)
+        for i in range(self.HUE_STEPS):
+            r, g, b = self.hsv_to_rgb(i / self.HUE_STEPS)
+            self.HUE_WHEEL[3 * i] = g
+            self.HUE_WHEEL[3 * i + 1] = r
+            self.HUE_WHEEL[3 * i + 2] = b
+        self.wheel = bytearray(3 * self.HUE_STEPS)
+        self.wheel_level = -1
+
+    def invalidate(self):
+        """Force the next frame to be pushed even if it looks unchanged."""
+        self.last_bits = -1
+
+    def to_level(self, brightness):
+        """Integer level of a 0.0-1.0 brightness."""
+        return int(brightness * self.LEVEL_SCALE + 0.5)
+
+    def update_levels(self):
+        """Precompute the integer level of every brightness mode."""
+        self.bright_level = self.to_level(self.BRIGHT_BRIGHTNESS)
+        self.normal_level = self.to_level(self.NORMAL_BRIGHTNESS)
+        self.dark_level = self.to_level(self.DARK_BRIGHTNESS)
+        self.off_level = self.to_level(self.OFF_BRIGHTNESS)
+
+    def build_gamma(self):
+        """Gamma curve applied to color values before brightness."""
+        gamma = self.GAMMA
+        self.gamma_table = bytes(int(255 * (v / 255) ** gamma + 0.5) for v in range(256))
+
+    def build_lut(self):
+        """Map 0-255 color values to output bytes at the current level."""
+        lut = self.lut
+        gamma_table = self.gamma_table
+        level = self.level
+        for v in range(256):
+            lut[v] = (gamma_table[v] * level) >> 10  # LEVEL_SCALE is 2 ** 10
+
+    def fade_to(self, level):
+        """Start a fade from the current level to a new target level."""
+        if level == self.target_level:
+            return
+        self.fade_from = self.level
+        self.fade_start = ticks_ms()
+        self.target_level = level
+
+    def set_level(self, brightness):
+        """Fade to a 0.0-1.0 brightness, e.g. one following the light level."""
+        self.fade_to(self.to_level(brightness))
 
     def set_brightness(self, mode):
         """Set display brightness based on mode."""
         if mode == "BRIGHT":
-            self.brightness = self.BRIGHT_BRIGHTNESS
+            self.fade_to(self.bright_level)
         elif mode == "NORMAL":
-            self.brightness = self.NORMAL_BRIGHTNESS
+            self.fade_to(self.normal_level)
         elif mode == "DARK":
-            self.brightness = self.DARK_BRIGHTNESS
+            self.fade_to(self.dark_level)
         elif mode == "OFF":
-            self.brightness = self.OFF_BRIGHTNESS
-        self.pixels1.brightness = self.brightness
-        self.pixels2.brightness = self.brightness
+            self.fade_to(self.off_level)
 
-    def display_digit(self, pixels, digit, start_idx, color):
-        """Display a digit or symbol on a seven-segment display."""
-        pattern = self.DIGIT_PATTERNS.get(digit, [0] * 7)
-        for i, on in enumerate(pattern):
-            led_idx = start_idx + self.SEGMENT_OFFSETS[i]
-            pixels[led_idx] = color if on else self.OFF
+    def update_fade(self):
+        """Move the level along the current fade, rebuild the LUT when it changes."""
+        if self.level == self.target_level:
+            return
+        elapsed = ticks_diff(ticks_ms(), self.fade_start)
+        if elapsed >= self.fade_ms:
+            level = self.target_level
+        else:
+            level = self.fade_from + (self.target_level - self.fade_from) * elapsed // self.fade_ms
+        if level != self.level:
+            self.level = level
+            self.build_lut()
+
+    def write_frame(self):
+        """Send the framebuffer to both LED chains."""
+        neopixel_write(self.pin1, self.chain1)
+        neopixel_write(self.pin2, self.chain2)
+        self.frames_pushed += 1
+
+    def draw_glyph(self, position, glyph, g, r, b):
+        """Draw a glyph bitmask at a digit position (0-3) in GRB bytes."""
+        frame = self.frame
+        mask = self.GLYPHS[glyph]
+        for offset in self.SEGMENT_INDEX[position]:
+            if mask & 1:
+                frame[offset] = g
+                frame[offset + 1] = r
+                frame[offset + 2] = b
+            else:
+                frame[offset] = 0
+                frame[offset + 1] = 0
+                frame[offset + 2] = 0
+            mask >>= 1
+
+    def show_digits(self, d1, d2, d3, d4, color, dots_on, brightness_mode):
+        """Push four glyphs and the double dot, skip the write if nothing visible changed.
+
+        brightness_mode None keeps the level last set with set_level().
+        """
+        if brightness_mode is not None:
+            self.set_brightness(brightness_mode)
+        self.update_fade()
+        bits = d1 | (d2 << 4) | (d3 << 8) | (d4 << 12) | (65536 if dots_on else 0)
+        if bits == self.last_bits and color == self.last_color and self.level == self.last_level:
+            self.frames_skipped += 1
+            return False
+        self.last_bits = bits
+        self.last_color = color
+        self.last_level = self.level
+
+        lut = self.lut
+        g = lut[color[1]]
+        r = lut[color[0]]
+        b = lut[color[2]]
+        self.draw_glyph(0, d1, g, r, b)
+        self.draw_glyph(1, d2, g, r, b)
+        self.draw_glyph(2, d3, g, r, b)
+        self.draw_glyph(3, d4, g, r, b)
+        frame = self.frame
+        for offset in self.DOT_INDEX:
+            frame[offset] = g if dots_on else 0
+            frame[offset + 1] = r if dots_on else 0
+            frame[offset + 2] = b if dots_on else 0
+        # LED231 is never written and stays off
+        self.write_frame()
+        self.effect_key = -1  # Framebuffer no longer holds an effect frame
+        return True
 
     def hsv_to_rgb(self, h, s=1.0, v=1.0):
         """Convert HSV to RGB (0-255 range)."""
@@ -119,111 +299,62 @@ class Display:
             return
         hours = rtc_time['tm_hour']
         minutes = rtc_time['tm_min']
-        h_tens = hours // 10
-        h_units = hours % 10
-        m_tens = minutes // 10
-        m_units = minutes % 10
 
-        color = self.DEFAULT_COLOR
-        if hours >= self.NIGHT_COLOR_HOURS_START and hours <= self.NIGHT_COLOR_HOURS_END and minutes >= self.NIGHT_COLOR_MINUTES_START and minutes <= self.NIGHT_COLOR_MINUTES_END:
-            color = self.NIGHT_COLOR
+        period = self.SCHEDULE[hours * 60 + minutes]
+        self.period = period
+        color = self.PERIOD_COLORS[period]
+        level = self.PERIOD_LEVELS[period]
+        if level >= 0:
+            # The period's own brightness replaces the light sensor mode
+            self.fade_to(level)
+            brightness_mode = None
 
         if self.DOTS_ALWAYS_ON:
             swo_state = 1
 
-        self.set_brightness(brightness_mode)
-        self.display_digit(self.pixels1, h_tens, 0, color)
-        self.display_digit(self.pixels1, h_units, 7, color)
-        self.display_digit(self.pixels1, m_tens, 14, color)
-        self.display_digit(self.pixels1, m_units, 21, color)
-        dot_color = color if swo_state else self.OFF
-        self.pixels2[0] = dot_color  # LED229
-        self.pixels2[1] = dot_color  # LED230
-        self.pixels2[2] = self.OFF   # LED231
-        self.pixels1.show()
-        self.pixels2.show()
+        self.show_digits(hours // 10, hours % 10, minutes // 10, minutes % 10, color, swo_state, brightness_mode)
 
     def show_timer(self, seconds, swo_state, brightness_mode):
         """Display timer in MM:SS or HH:MM with appropriate colors."""
+        self.period = -1  # No schedule period applies
         abs_seconds = abs(seconds)
         is_negative = seconds < 0
         color = self.TIMER_NEGATIVE_COLOR if is_negative else self.TIMER_POSITIVE_COLOR
 
         if abs_seconds <= 3599:  # MM:SS (up to 59:59)
-            minutes = abs_seconds // 60
-            secs = abs_seconds % 60
-            m_tens = minutes // 10
-            m_units = minutes % 10
-            s_tens = secs // 10
-            s_units = secs % 10
-            self.set_brightness(brightness_mode)
-            if is_negative and minutes < 10:
-                self.display_digit(self.pixels1, '-', 0, color)  # Negative sign
-            else:
-                self.display_digit(self.pixels1, m_tens, 0, color)
-            self.display_digit(self.pixels1, m_units, 7, color)
-            self.display_digit(self.pixels1, s_tens, 14, color)
-            self.display_digit(self.pixels1, s_units, 21, color)
-            self.pixels2[0] = color  # LED229 always on
-            self.pixels2[1] = color  # LED230 always on
+            high = abs_seconds // 60
+            low = abs_seconds % 60
+            dots_on = True  # LED229/LED230 always on
         else:  # HH:MM (after 59:59)
-            hours = abs_seconds // 3600
-            minutes = (abs_seconds % 3600) // 60
-            h_tens = hours // 10
-            h_units = hours % 10
-            m_tens = minutes // 10
-            m_units = minutes % 10
-            self.set_brightness(brightness_mode)
-            if is_negative and hours < 10:
-                self.display_digit(self.pixels1, '-', 0, color)  # Negative sign
-            else:
-                self.display_digit(self.pixels1, h_tens, 0, color)
-            self.display_digit(self.pixels1, h_units, 7, color)
-            self.display_digit(self.pixels1, m_tens, 14, color)
-            self.display_digit(self.pixels1, m_units, 21, color)
-            dot_color = color if swo_state else self.OFF
-            self.pixels2[0] = dot_color  # LED229 flashes with SWO
-            self.pixels2[1] = dot_color  # LED230 flashes with SWO
-        self.pixels2[2] = self.OFF  # LED231 always off
-        self.pixels1.show()
-        self.pixels2.show()
-
-    def show_stopwatch(self, seconds, swo_state, brightness_mode):
-        """Display stopwatch in MM:SS or HH:MM with YELLOW color."""
-        if seconds < 0:
-            seconds = 0  # Stopwatch doesn't go negative
-        if seconds <= 3599:  # MM:SS (up to 59:59)
-            minutes = seconds // 60
-            secs = seconds % 60
-            m_tens = minutes // 10
-            m_units = minutes % 10
-            s_tens = secs // 10
-            s_units = secs % 10
-            self.set_brightness(brightness_mode)
-            self.display_digit(self.pixels1, m_tens, 0, self.STOPWATCH_COLOR)
-            self.display_digit(self.pixels1, m_units, 7, self.STOPWATCH_COLOR)
-            self.display_digit(self.pixels1, s_tens, 14, self.STOPWATCH_COLOR)
-            self.display_digit(self.pixels1, s_units, 21, self.STOPWATCH_COLOR)
-            self.pixels2[0] = self.STOPWATCH_COLOR  # LED229 always on
-            self.pixels2[1] = self.STOPWATCH_COLOR  # LED230 always on
+            high = abs_seconds // 3600
+            low = (abs_seconds % 3600) // 60
+            dots_on = swo_state  # LED229/LED230 flash with SWO
+        if is_negative and high < 10:
+            first = self.MINUS  # Negative sign
+        else:
+            first = high // 10
+        self.show_digits(first, high % 10, low // 10, low % 10, color, dots_on, brightness_mode)
+
+    def show_stopwatch(self, milliseconds, swo_state, brightness_mode):
+        """Display stopwatch in SS:hh, MM:SS or HH:MM with YELLOW color."""
+        self.period = -1
+        if milliseconds < 0:
+            milliseconds = 0  # Stopwatch doesn't go negative
+        color = self.STOPWATCH_COLOR
+        seconds = milliseconds // 1000
+        if seconds <= 59:  # SS:hh (seconds and hundredths for the first minute)
+            high = seconds
+            low = milliseconds % 1000 // 10
+            dots_on = True
+        elif seconds <= 3599:  # MM:SS (up to 59:59)
+            high = seconds // 60
+            low = seconds % 60
+            dots_on = True  # LED229/LED230 always on
         else:  # HH:MM (after 59:59)
-            hours = seconds // 3600
-            minutes = (seconds % 3600) // 60
-            h_tens = hours // 10
-            h_units = hours % 10
-            m_tens = minutes // 10
-            m_units = minutes % 10
-            self.set_brightness(brightness_mode)
-            self.display_digit(self.pixels1, h_tens, 0, self.STOPWATCH_COLOR)
-            self.display_digit(self.pixels1, h_units, 7, self.STOPWATCH_COLOR)
-            self.display_digit(self.pixels1, m_tens, 14, self.STOPWATCH_COLOR)
-            self.display_digit(self.pixels1, m_units, 21, self.STOPWATCH_COLOR)
-            dot_color = self.STOPWATCH_COLOR if swo_state else self.OFF
-            self.pixels2[0] = dot_color  # LED229 flashes with SWO
-            self.pixels2[1] = dot_color  # LED230 flashes with SWO
-        self.pixels2[2] = self.OFF  # LED231 always off
-        self.pixels1.show()
-        self.pixels2.show()
+            high = seconds // 3600
+            low = (seconds % 3600) // 60
+            dots_on = swo_state  # LED229/LED230 flash with SWO
+        self.show_digits(high // 10, high % 10, low // 10, low % 10, color, dots_on, brightness_mode)
 
     def show_time_with_effect(self, rtc_time, swo_state, effect_time):
         """Display HH:MM with snake rainbow effect."""
@@ -231,48 +362,53 @@ class Display:
             return
         hours = rtc_time['tm_hour']
         minutes = rtc_time['tm_min']
-        h_tens = hours // 10
-        h_units = hours % 10
-        m_tens = minutes // 10
-        m_units = minutes % 10
-
-        # Get active LEDs
-        active_leds = []
-        patterns = [
-            self.DIGIT_PATTERNS.get(h_tens, [0] * 7),
-            self.DIGIT_PATTERNS.get(h_units, [0] * 7),
-            self.DIGIT_PATTERNS.get(m_tens, [0] * 7),
-            self.DIGIT_PATTERNS.get(m_units, [0] * 7)
-        ]
-        # Display 1: LED201-LED207 (0-6)
-        for i, on in enumerate(patterns[0]):
-            if on:
-                active_leds.append((1, self.SEGMENT_OFFSETS[i]))
-        # Display 2: LED208-LED214 (7-13)
-        for i, on in enumerate(patterns[1]):
-            if on:
-                active_leds.append((1, 7 + self.SEGMENT_OFFSETS[i]))
-        # Display 3: LED215-LED221 (14-20)
-        for i, on in enumerate(patterns[2]):
-            if on:
-                active_leds.append((1, 14 + self.SEGMENT_OFFSETS[i]))
-        # Display 4: LED222-LED228 (21-27)
-        for i, on in enumerate(patterns[3]):
-            if on:
-                active_leds.append((1, 21 + self.SEGMENT_OFFSETS[i]))
-        # Double dot: LED229, LED230
-        if swo_state:
-            active_leds.append((2, 0))
-            active_leds.append((2, 1))
-
-        # Generate rainbow colors
-        num_leds = len(active_leds)
+        key = (hours * 60 + minutes) * 2 + (1 if swo_state else 0)
+        if key != self.effect_key:
+            self.build_effect(hours, minutes, swo_state)
+            self.effect_key = key
+        leds = self.effect_leds
+        num_leds = len(leds)
         if num_leds == 0:
             return
-        colors = []
+
+        self.set_brightness("NORMAL")  # Effect uses normal brightness
+        self.update_fade()
+        if self.HUE_WHEEL is None:
+            self.build_wheel()
+        if self.level != self.wheel_level:
+            lut = self.lut
+            for i in range(len(self.wheel)):
+                self.wheel[i] = lut[self.HUE_WHEEL[i]]
+            self.wheel_level = self.level
+
+        # Only the snake shift and hue rotation change between frames
+        wheel = self.wheel
+        hues = self.effect_hues
+        frame = self.frame
+        steps = self.HUE_STEPS
+        shift = int(effect_time * num_leds) % num_leds
+        rotation = int(effect_time * steps)
         for i in range(num_leds):
-            hue = (i / num_leds + effect_time) % 1.0
-            colors.append(self.hsv_to_rgb(hue))
+            j = i + shift
+            if j >= num_leds:
+                j -= num_leds
+            hue = 3 * ((hues[j] + rotation) % steps)
+            offset = 3 * leds[i]
+            frame[offset] = wheel[hue]
+            frame[offset + 1] = wheel[hue + 1]
+            frame[offset + 2] = wheel[hue + 2]
+
+        self.write_frame()
+        self.invalidate()  # Effect frames are not tracked, redraw once it ends
+
+    def build_effect(self, hours, minutes, swo_state):
+        """Cache the snake order of lit LEDs and their base hues for one HH:MM and dot state."""
+        masks = (
+            self.GLYPHS[hours // 10],
+            self.GLYPHS[hours % 10],
+            self.GLYPHS[minutes // 10],
+            self.GLYPHS[minutes % 10]
+        )
 
         # Order: D4 -> D3 -> LED230 -> LED229 -> D2 -> D1 -> LED231
         display_order = [3, 2, -2, -1, 1, 0, -3]  # -1=LED229, -2=LED230, -3=LED231
@@ -281,35 +417,23 @@ class Display:
         for disp_idx in display_order:
             if disp_idx >= 0:  # Display
                 start_idx = disp_idx * 7
-                pattern = patterns[disp_idx]
+                mask = masks[disp_idx]
                 for seg_idx in segment_order:
-                    if pattern[seg_idx]:
-                        led_map.append((1, start_idx + self.SEGMENT_OFFSETS[seg_idx]))
+                    if mask & (1 << seg_idx):
+                        led_map.append(start_idx + self.SEGMENT_OFFSETS[seg_idx])
             else:  # Dots
                 if disp_idx == -1 and swo_state:
-                    led_map.append((2, 0))  # LED229
+                    led_map.append(self.DOT_LEDS[0])  # LED229
                 elif disp_idx == -2 and swo_state:
-                    led_map.append((2, 1))  # LED230
+                    led_map.append(self.DOT_LEDS[1])  # LED230
                 elif disp_idx == -3:
                     pass  # LED231 not used
 
-        # Apply colors with shift
-        shift = int(effect_time * num_leds) % num_leds
-        for i, (chain, idx) in enumerate(led_map):
-            color_idx = (i + shift) % num_leds
-            if chain == 1:
-                self.pixels1[idx] = colors[color_idx]
-            else:
-                self.pixels2[idx] = colors[color_idx]
+        num_leds = len(led_map)
+        self.effect_leds = bytes(led_map)
+        self.effect_hues = bytes(i * self.HUE_STEPS // num_leds for i in range(num_leds))
 
-        # Clear unused LEDs
-        for i in range(self.NUM_LEDS_CHAIN1):
-            if (1, i) not in led_map:
-                self.pixels1[i] = self.OFF
-        for i in range(self.NUM_LEDS_CHAIN2):
-            if (2, i) not in led_map:
-                self.pixels2[i] = self.OFF
-
-        self.set_brightness("NORMAL")  # Effect uses normal brightness
-        self.pixels1.show()
-        self.pixels2.show()
\ No newline at end of file
+        # Unused LEDs stay dark until the order changes again
+        frame = self.frame
+        for i in range(len(frame)):
+            frame[i] = 0
@@ -1,25 +1,60 @@
 # fdvl_lightsensor.py
 import analogio # type: ignore
+from adafruit_ticks import ticks_ms, ticks_add, ticks_diff # type: ignore
 
 class LightSensor:
-    # Brightness thresholds
+    # Brightness thresholds, higher ADC value means darker
     BRIGHT_THRESHOLD = 30000
     DARK_THRESHOLD = 49000
+    HYSTERESIS = 2000  # A mode is entered HYSTERESIS past its threshold and left HYSTERESIS back
+    SAMPLE_INTERVAL = 0.5  # Seconds between sample bursts
+    OVERSAMPLE = 4  # ADC reads averaged per burst
+    EMA_SHIFT = 2  # Each burst moves the level 1/4 of the way
 
     def __init__(self, adc_pin, light_sensor_bright_threshold, light_sensor_dark_threshold):
         self.adc = analogio.AnalogIn(adc_pin)
         self.BRIGHT_THRESHOLD = light_sensor_bright_threshold
         self.DARK_THRESHOLD = light_sensor_dark_threshold
+        self.interval_ms = int(self.SAMPLE_INTERVAL * 1000)
+        self.level = self.sample()  # Filtered ADC value, 0-65535
+        self.mode = "NORMAL"
+        self.mode = self.classify(self.level)
+        self.next_sample = ticks_add(ticks_ms(), self.interval_ms)
 
-    def update_thresholds(self, bright, dark):
+    def update_thresholds(self, bright, dark, hysteresis=None, interval=None):
         self.BRIGHT_THRESHOLD = bright
         self.DARK_THRESHOLD = dark
+        if hysteresis is not None:
+            self.HYSTERESIS = hysteresis
+        if interval is not None:
+            self.interval_ms = int(interval * 1000)
 
-    def get_brightness(self):
-        """Determine brightness mode based on light sensor."""
-        value = self.adc.value
-        if value < self.BRIGHT_THRESHOLD:
+    def sample(self):
+        """Average a burst of ADC reads."""
+        total = 0
+        for _ in range(self.OVERSAMPLE):
+            total += self.adc.value
+        return total // self.OVERSAMPLE
+
+    def classify(self, level):
+        """Brightness mode for a level, staying in the current mode inside its hysteresis band."""
+        mode = self.mode
+        band = self.HYSTERESIS
+        if mode == "BRIGHT" and level < self.BRIGHT_THRESHOLD + band:
+            return mode
+        if mode == "DARK" and level > self.DARK_THRESHOLD - band:
+            return mode
+        if level < self.BRIGHT_THRESHOLD - band:
             return "BRIGHT"
-        elif value > self.DARK_THRESHOLD:
+        if level > self.DARK_THRESHOLD + band:
             return "DARK"
-        return "NORMAL"
\ No newline at end of file
+        return "NORMAL"
+
+    def get_brightness(self):
+        """Determine brightness mode based on light sensor, sampling only every SAMPLE_INTERVAL."""
+        now = ticks_ms()
+        if ticks_diff(now, self.next_sample) >= 0:
+            self.next_sample = ticks_add(now, self.interval_ms)
+            self.level += (self.sample() - self.level) >> self.EMA_SHIFT
+            self.mode = self.classify(self.level)
+        return self.mode
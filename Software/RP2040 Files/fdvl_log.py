@@ -0,0 +1,150 @@
+# fdvl_log.py
+from array import array
+import supervisor # type: ignore
+from adafruit_ticks import ticks_ms, ticks_add, ticks_diff # type: ignore
+
+DEBUG = 0
+INFO = 1
+WARNING = 2
+ERROR = 3
+LEVEL_NAMES = ("DEBUG", "INFO", "WARNING", "ERROR")
+_NO_ARG = object()  # Default of the optional arguments, so None can still be logged
+
+def compact(value):
+    """A log argument as a record keeps it: numbers as they are, anything else as short text."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    text = value if isinstance(value, str) else str(value)
+    if len(text) > Log.MAX_ARG_LENGTH:
+        return text[:Log.MAX_ARG_LENGTH - 3] + "..."
+    return text
+
+class Log:
+    """Ring buffer of log records, formatted only when read or echoed.
+
+    A record is a message code, level, tick and up to three arguments. The message
+    (a format string) gets its code on first use. Arguments are kept as numbers or
+    short text, so a record holds no reference to the objects that were logged.
+    A record equal to the newest one only bumps that record's repeat count. Below
+    WARNING, a record equal to the last kept one of its message within RATE_LIMIT_MS
+    is folded into that one too, warnings and errors always get their own record.
+    """
+    SIZE = 64  # Records kept
+    MAX_MESSAGES = 128  # Distinct format strings
+    MAX_ARGS = 3
+    MAX_ARG_LENGTH = 48  # Characters kept of an argument that is not a number
+    RATE_LIMIT_MS = 1000
+    LEVEL = DEBUG  # Records below this level are not kept
+    ECHO_LEVEL = INFO  # Records at or above this level are also printed while a host is connected
+
+    def __init__(self):
+        self.messages = []
+        self.codes = {}  # Format string -> code
+        self.next_allowed = array("L", [0] * self.MAX_MESSAGES)  # ticks_ms until which a message is rate-limited
+        self.last_slot = array("b", [-1] * self.MAX_MESSAGES)  # Slot of the last record kept of a message
+        self.code = array("B", [0] * self.SIZE)
+        self.level = array("B", [0] * self.SIZE)
+        self.nargs = array("B", [0] * self.SIZE)
+        self.tick = array("L", [0] * self.SIZE)
+        self.repeats = array("H", [0] * self.SIZE)  # Identical records folded into this one
+        self.args = [None] * (self.SIZE * self.MAX_ARGS)
+        self.head = 0  # Next slot to write
+        self.count = 0
+
+    def message_code(self, message):
+        code = self.codes.get(message)
+        if code is None:
+            if len(self.messages) >= self.MAX_MESSAGES:
+                return self.MAX_MESSAGES - 1  # Out of codes, share the last one
+            code = len(self.messages)
+            self.codes[message] = code
+            self.messages.append(message)
+        return code
+
+    def log(self, level, message, a=_NO_ARG, b=_NO_ARG, c=_NO_ARG):
+        """Keep a record, the arguments are compacted now and formatted when read."""
+        if level < self.LEVEL:
+            return
+        if c is not _NO_ARG:
+            nargs, a, b, c = 3, compact(a), compact(b), compact(c)
+        elif b is not _NO_ARG:
+            nargs, a, b, c = 2, compact(a), compact(b), None
+        elif a is not _NO_ARG:
+            nargs, a, b, c = 1, compact(a), None, None
+        else:
+            nargs, a, b, c = 0, None, None, None
+        code = self.message_code(message)
+        now = ticks_ms()
+        if self.count:
+            last = (self.head - 1) % self.SIZE
+            if self.code[last] == code and self.nargs[last] == nargs and self.same_args(last, a, b, c):
+                if self.repeats[last] < 0xFFFF:
+                    self.repeats[last] += 1
+                return
+        slot = self.last_slot[code]
+        # Only a deadline within the next RATE_LIMIT_MS counts, older ones may have wrapped around
+        if (level < WARNING and slot >= 0 and self.code[slot] == code and self.nargs[slot] == nargs
+                and 0 < ticks_diff(self.next_allowed[code], now) <= self.RATE_LIMIT_MS
+                and self.same_args(slot, a, b, c)):
+            if self.repeats[slot] < 0xFFFF:
+                self.repeats[slot] += 1
+            return
+        self.next_allowed[code] = ticks_add(now, self.RATE_LIMIT_MS)
+
+        i = self.head
+        self.last_slot[code] = i
+        self.code[i] = code
+        self.level[i] = level
+        self.nargs[i] = nargs
+        self.tick[i] = now
+        self.repeats[i] = 0
+        args = self.args
+        base = i * self.MAX_ARGS
+        args[base] = a
+        args[base + 1] = b
+        args[base + 2] = c
+        self.head = (i + 1) % self.SIZE
+        if self.count < self.SIZE:
+            self.count += 1
+
+        if level >= self.ECHO_LEVEL and supervisor.runtime.serial_connected:
+            print(self.format(i))
+
+    def same_args(self, i, a, b, c):
+        args = self.args
+        base = i * self.MAX_ARGS
+        return args[base] == a and args[base + 1] == b and args[base + 2] == c
+
+    def debug(self, message, a=_NO_ARG, b=_NO_ARG, c=_NO_ARG):
+        self.log(DEBUG, message, a, b, c)
+
+    def info(self, message, a=_NO_ARG, b=_NO_ARG, c=_NO_ARG):
+        self.log(INFO, message, a, b, c)
+
+    def warning(self, message, a=_NO_ARG, b=_NO_ARG, c=_NO_ARG):
+        self.log(WARNING, message, a, b, c)
+
+    def error(self, message, a=_NO_ARG, b=_NO_ARG, c=_NO_ARG):
+        self.log(ERROR, message, a, b, c)
+
+    def format(self, i):
+        """Text of one record."""
+        base = i * self.MAX_ARGS
+        return self.messages[self.code[i]].format(*self.args[base:base + self.nargs[i]])
+
+    def records(self):
+        """Records oldest first as (tick, level name, text, repeats) tuples."""
+        first = (self.head - self.count) % self.SIZE
+        for n in range(self.count):
+            i = (first + n) % self.SIZE
+            yield self.tick[i], LEVEL_NAMES[self.level[i]], self.format(i), self.repeats[i]
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+        last_slot = self.last_slot
+        for code in range(self.MAX_MESSAGES):
+            last_slot[code] = -1
+
+
+log = Log()  # Shared by every module
@@ -0,0 +1,209 @@
+# fdvl_protocol.py
+# Compact binary frames for the usb_cdc data channel, JSON lines stay the fallback.
+# Plain Python and struct only, so host scripts can import this file as well.
+#
+# Frame:  magic 0xFD | seq u8 | payload length u16 | payload | CRC-16/CCITT u16
+# Payload: any number of records, each cmd u8 | length u8 | data
+# The device answers with one frame carrying the same seq and one reply record
+# (cmd | 0x80) per request record.
+import struct
+from array import array
+
+FRAME_MAGIC = 0xFD  # Never the first byte of a UTF-8 JSON line
+HEADER_SIZE = 4
+CRC_SIZE = 2
+MAX_PAYLOAD = 1024
+
+CMD_SET_TIME = 0x01
+CMD_GET_TIME = 0x02
+CMD_SET_SETTINGS = 0x03
+CMD_GET_SETTINGS = 0x04
+CMD_GET_LAPS = 0x05
+CMD_ERROR = 0x7F  # Reply to a frame that failed to decode
+REPLY_FLAG = 0x80
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+STATUS_BAD_FRAME = 2
+STATUS_UNKNOWN_COMMAND = 3
+
+TIME_FORMAT = "<HBBBBBB"  # year, month (0-11), day, hour, minute, second, weekday
+TIME_KEYS = ('tm_year', 'tm_mon', 'tm_mday', 'tm_hour', 'tm_min', 'tm_sec', 'tm_wday')
+
+# Lap splits: request u16 first lap, reply u16 first lap | u16 laps recorded | u32 splits in ms
+LAPS_HEADER = "<HH"
+LAPS_PER_RECORD = 60  # Splits that fit a reply record next to its status byte
+
+# Field id is the index. Scaled values travel as integers: 0.1 s -> 100 ms, 0.05 -> 500
+SETTINGS_FIELDS = (
+    ("buzzer_frequency", "<H", None),
+    ("buzzer_beep_duration", "<H", 1000),
+    ("buzzer_stop_duration", "<H", 1000),
+    ("buzzer_pause_duration", "<H", 1000),
+    ("buzzer_max_cycles", "<B", None),
+    ("light_sensor_bright_threshold", "<H", None),
+    ("light_sensor_dark_threshold", "<H", None),
+    ("bright_brightness", "<H", 10000),
+    ("normal_brightness", "<H", 10000),
+    ("dark_brightness", "<H", 10000),
+    ("off_brightness", "<H", 10000),
+    ("default_color", "<BBB", None),
+    ("TIMER_POSITIVE_COLOR", "<BBB", None),
+    ("TIMER_NEGATIVE_COLOR", "<BBB", None),
+    ("STOPWATCH_COLOR", "<BBB", None),
+    ("night_color", "<BBB", None),
+    ("night_color_hours_start", "<B", None),
+    ("night_color_minutes_start", "<B", None),
+    ("night_color_hours_end", "<B", None),
+    ("night_color_minutes_end", "<B", None),
+    ("dots_always_on", "<B", None),
+    ("light_sensor_hysteresis", "<H", None),
+    ("light_sensor_interval", "<H", 1000),
+    ("auto_brightness", "<B", None),
+    ("brightness_fade_time", "<H", 1000),
+    ("gamma", "<H", 100),
+)
+
+
+def _make_crc_table():
+    global CRC_TABLE
+    table = array("H", [0] * 256)
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table[i] = crc & 0xFFFF
+    CRC_TABLE = table
+    return table
+
+CRC_TABLE = None  # Built on first use, importing this module at boot stays cheap
+
+
+def crc16(data, crc=0xFFFF):
+    """CRC-16/CCITT-FALSE of a bytes-like object."""
+    table = CRC_TABLE or _make_crc_table()
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+def frame_size(header):
+    """Total frame size from the first HEADER_SIZE bytes, or -1 if the length is invalid."""
+    length = header[2] | (header[3] << 8)
+    if length > MAX_PAYLOAD:
+        return -1
+    return HEADER_SIZE + length + CRC_SIZE
+
+
+def encode_frame(seq, payload):
+    """Wrap a payload into a frame."""
+    frame = bytearray(HEADER_SIZE + len(payload) + CRC_SIZE)
+    struct.pack_into("<BBH", frame, 0, FRAME_MAGIC, seq & 0xFF, len(payload))
+    frame[HEADER_SIZE:HEADER_SIZE + len(payload)] = payload
+    crc = crc16(memoryview(frame)[1:HEADER_SIZE + len(payload)])
+    struct.pack_into("<H", frame, HEADER_SIZE + len(payload), crc)
+    return frame
+
+
+def decode_frame(frame):
+    """Return (seq, payload) of a complete frame, raise ValueError if it is corrupt."""
+    frame = memoryview(frame)
+    if len(frame) < HEADER_SIZE + CRC_SIZE or frame[0] != FRAME_MAGIC:
+        raise ValueError("bad frame header")
+    length = frame[2] | (frame[3] << 8)
+    if len(frame) != HEADER_SIZE + length + CRC_SIZE:
+        raise ValueError("bad frame length")
+    end = HEADER_SIZE + length
+    if crc16(frame[1:end]) != frame[end] | (frame[end + 1] << 8):
+        raise ValueError("bad frame CRC")
+    return frame[1], frame[HEADER_SIZE:end]
+
+
+def encode_record(cmd, data=b""):
+    """Encode one command or reply record."""
+    if len(data) > 255:
+        raise ValueError("record too long")
+    return bytes((cmd, len(data))) + bytes(data)
+
+
+def iter_records(payload):
+    """Yield (cmd, data) for every record of a payload."""
+    i = 0
+    while i + 2 <= len(payload):
+        cmd = payload[i]
+        end = i + 2 + payload[i + 1]
+        if end > len(payload):
+            raise ValueError("truncated record")
+        yield cmd, payload[i + 2:end]
+        i = end
+
+
+def encode_time(time_dict):
+    return struct.pack(TIME_FORMAT, *[time_dict[key] for key in TIME_KEYS])
+
+
+def decode_time(data):
+    return dict(zip(TIME_KEYS, struct.unpack(TIME_FORMAT, bytes(data))))
+
+
+def encode_settings(settings):
+    """Encode the known keys of a settings dict as (field id, value) pairs."""
+    out = bytearray()
+    for field_id, (name, fmt, scale) in enumerate(SETTINGS_FIELDS):
+        if name not in settings:
+            continue
+        value = settings[name]
+        if scale:
+            values = (int(round(value * scale)),)
+        elif fmt == "<BBB":
+            values = tuple(value)
+        else:
+            values = (int(value),)
+        out.append(field_id)
+        out.extend(struct.pack(fmt, *values))
+    return bytes(out)
+
+
+def decode_settings(data):
+    """Decode (field id, value) pairs into a partial settings dict."""
+    data = bytes(data)
+    settings = {}
+    i = 0
+    while i < len(data):
+        field_id = data[i]
+        if field_id >= len(SETTINGS_FIELDS):
+            raise ValueError("unknown settings field")
+        name, fmt, scale = SETTINGS_FIELDS[field_id]
+        values = struct.unpack_from(fmt, data, i + 1)
+        i += 1 + struct.calcsize(fmt)
+        if scale:
+            settings[name] = values[0] / scale
+        elif fmt == "<BBB":
+            settings[name] = list(values)
+        elif name in ("dots_always_on", "auto_brightness"):
+            settings[name] = bool(values[0])
+        else:
+            settings[name] = values[0]
+    return settings
+
+
+def encode_laps(stopwatch, first):
+    """Splits of the stopwatch from lap first on, as many as fit one record."""
+    first = max(first, stopwatch.first_lap())
+    count = max(0, min(stopwatch.laps - first, LAPS_PER_RECORD))
+    data = bytearray(struct.calcsize(LAPS_HEADER) + 4 * count)
+    struct.pack_into(LAPS_HEADER, data, 0, first & 0xFFFF, stopwatch.laps & 0xFFFF)
+    offset = struct.calcsize(LAPS_HEADER)
+    for lap in range(first, first + count):
+        struct.pack_into("<L", data, offset, stopwatch.split(lap))
+        offset += 4
+    return bytes(data)
+
+
+def decode_laps(data):
+    """Return (first lap, laps recorded, list of splits in ms) of a reply."""
+    data = bytes(data)
+    first, laps = struct.unpack_from(LAPS_HEADER, data, 0)
+    offset = struct.calcsize(LAPS_HEADER)
+    splits = list(struct.unpack_from("<{}L".format((len(data) - offset) // 4), data, offset))
+    return first, laps, splits
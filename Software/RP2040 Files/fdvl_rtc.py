@@ -2,12 +2,28 @@
 import busio # type: ignore
 import time
 
+def time_to_seconds(time_dict):
+    """Seconds since the epoch of an RTC time dict, for time arithmetic."""
+    return time.mktime((time_dict['tm_year'], time_dict['tm_mon'] + 1, time_dict['tm_mday'],
+                        time_dict['tm_hour'], time_dict['tm_min'], time_dict['tm_sec'], 0, -1, -1))
+
+
 class RTC:
     MAX31343_I2C_ADDRESS = 0x68
+    MAX31343_R_STATUS = 0x00
+    MAX31343_R_INT_EN = 0x01
     MAX31343_R_SECONDS = 0x06
+    MAX31343_R_ALM1_SEC = 0x0D
+
+    # Status and interrupt enable bits
+    STATUS_A1F = 0x01  # Alarm 1
+    STATUS_A2F = 0x02  # Alarm 2
 
     def __init__(self, scl_pin, sda_pin):
         self.i2c = busio.I2C(scl_pin, sda_pin)
+        self.reg_out = bytearray(2)
+        self.reg_in = bytearray(1)
+        self.flags = 0  # Status flags read but not taken yet, the chip clears them on read
 
     def bcd2bin(self, val):
         """Convert BCD to binary."""
@@ -72,4 +88,145 @@ class RTC:
                     write_buf[7] = self.bin2bcd(time_dict['tm_year'] - 1900)
                 self.i2c.writeto(self.MAX31343_I2C_ADDRESS, write_buf)
             finally:
-                self.i2c.unlock()
\ No newline at end of file
+                self.i2c.unlock()
+
+    def read_register(self, reg):
+        """Read one register, None if the bus is busy."""
+        if self.i2c.try_lock():
+            try:
+                self.reg_out[0] = reg
+                self.i2c.writeto_then_readfrom(self.MAX31343_I2C_ADDRESS, self.reg_out, self.reg_in, out_end=1)
+                return self.reg_in[0]
+            finally:
+                self.i2c.unlock()
+        return None
+
+    def write_register(self, reg, value):
+        """Write one register, False if the bus is busy."""
+        if self.i2c.try_lock():
+            try:
+                self.reg_out[0] = reg
+                self.reg_out[1] = value
+                self.i2c.writeto(self.MAX31343_I2C_ADDRESS, self.reg_out)
+                return True
+            finally:
+                self.i2c.unlock()
+        return False
+
+    def poll_flags(self):
+        """Read (and so clear) the status register, keep its flags until taken."""
+        status = self.read_register(self.MAX31343_R_STATUS)
+        if status is not None:
+            self.flags |= status
+        return self.flags
+
+    def take_flag(self, mask):
+        """Return True once for every time a status flag was raised."""
+        self.poll_flags()
+        if self.flags & mask:
+            self.flags &= ~mask
+            return True
+        return False
+
+    def set_interrupt(self, mask, enabled):
+        """Enable or disable status flags on the INTB pin."""
+        int_en = self.read_register(self.MAX31343_R_INT_EN)
+        if int_en is not None:
+            self.write_register(self.MAX31343_R_INT_EN, (int_en | mask) if enabled else (int_en & ~mask))
+
+    def set_alarm1(self, seconds):
+        """Raise A1F at an absolute time (time.mktime seconds), month and year are ignored."""
+        alarm = time.localtime(seconds)
+        if self.i2c.try_lock():
+            try:
+                write_buf = bytearray(7)
+                write_buf[0] = self.MAX31343_R_ALM1_SEC
+                write_buf[1] = self.bin2bcd(alarm.tm_sec)
+                write_buf[2] = self.bin2bcd(alarm.tm_min)
+                write_buf[3] = self.bin2bcd(alarm.tm_hour)
+                write_buf[4] = self.bin2bcd(alarm.tm_mday)  # DY_DT = 0, match date
+                write_buf[5] = 0xC0  # A1M5, A1M6: match any month and year
+                write_buf[6] = 0
+                self.i2c.writeto(self.MAX31343_I2C_ADDRESS, write_buf)
+            finally:
+                self.i2c.unlock()
+        self.take_flag(self.STATUS_A1F)  # Drop a flag left from an earlier alarm
+        self.set_interrupt(self.STATUS_A1F, True)
+
+    def clear_alarm1(self):
+        """Stop reporting alarm 1."""
+        self.set_interrupt(self.STATUS_A1F, False)
+        self.take_flag(self.STATUS_A1F)
+
+    def get_alarm1(self, now):
+        """Match of alarm 1 closest to now (time.mktime seconds), None while it is off.
+
+        The chip keeps the alarm through a soft reset of the board, this reads it back.
+        """
+        int_en = self.read_register(self.MAX31343_R_INT_EN)
+        if int_en is None or not int_en & self.STATUS_A1F:
+            return None
+        alarm = bytearray(4)
+        if not self.i2c.try_lock():
+            return None
+        try:
+            self.reg_out[0] = self.MAX31343_R_ALM1_SEC
+            self.i2c.writeto_then_readfrom(self.MAX31343_I2C_ADDRESS, self.reg_out, alarm, out_end=1)
+        finally:
+            self.i2c.unlock()
+        mday = self.bcd2bin(alarm[3] & 0x3F)
+        closest = None
+        # The date matches at most once in any 16 days either side of now
+        for day in range(-16, 17):
+            date = time.localtime(now + day * 86400)
+            if date.tm_mday == mday:
+                match = time.mktime((date.tm_year, date.tm_mon, mday, self.bcd2bin(alarm[2] & 0x3F),
+                                     self.bcd2bin(alarm[1] & 0x7F), self.bcd2bin(alarm[0] & 0x7F), 0, -1, -1))
+                if closest is None or abs(match - now) < abs(closest - now):
+                    closest = match
+        return closest
+
+class SoftClock:
+    """Time of day advanced by the RTC's 1 Hz SWO ticks, read over I2C only on minute rollover."""
+
+    def __init__(self, rtc):
+        self.rtc = rtc
+        self.time = None  # Same dict layout as RTC.get_time(), tm_sec is updated in place
+        self.pending_sync = False
+        self.reads = 0
+        self.corrections = 0  # Rollover reads that disagreed with the counted seconds
+        self.sync()
+
+    def sync(self):
+        """Re-read the full time from the RTC."""
+        new_time = self.rtc.get_time()
+        self.reads += 1
+        if new_time:
+            self.time = new_time
+            self.pending_sync = False
+            return True
+        self.pending_sync = True
+        return False
+
+    def tick(self, ticks=1):
+        """Advance by a number of SWO ticks."""
+        if not ticks:
+            return
+        if self.time is None or self.pending_sync:
+            self.sync()
+            return
+        second = self.time['tm_sec'] + ticks
+        if second < 60:
+            self.time['tm_sec'] = second
+            return
+        # Minute (and maybe hour) rolled over, take the new time from the RTC
+        expected = second % 60
+        if self.sync():
+            if self.time['tm_sec'] != expected:
+                self.corrections += 1
+            return
+        # RTC unreadable, roll over in software and retry on the next tick
+        minute = self.time['tm_min'] + second // 60
+        self.time['tm_sec'] = expected
+        self.time['tm_min'] = minute % 60
+        self.time['tm_hour'] = (self.time['tm_hour'] + minute // 60) % 24
@@ -0,0 +1,36 @@
+# fdvl_schedule.py
+# Daily periods (start, end, color, brightness) compiled into one byte per minute of
+# the day, so the display looks its period up with a single index.
+MINUTES_PER_DAY = 1440
+MAX_PERIODS = 32
+
+
+def parse_time(text):
+    """Minute of the day of "HH:MM"."""
+    hours, _, minutes = str(text).partition(":")
+    try:
+        hours = int(hours)
+        minutes = int(minutes)
+    except ValueError:
+        raise ValueError("expected HH:MM, got {}".format(text))
+    if not 0 <= hours <= 23 or not 0 <= minutes <= 59:
+        raise ValueError("{} is not a time of day".format(text))
+    return hours * 60 + minutes
+
+
+def compile_schedule(periods):
+    """Table of period number (1-based, 0 = none) per minute, later periods win where they overlap.
+
+    A period covers start to end including the end minute and wraps past midnight
+    when end is before start, so (22:00, 05:00) covers the night.
+    """
+    table = bytearray(MINUTES_PER_DAY)
+    for number, period in enumerate(periods[:MAX_PERIODS], 1):
+        start = period[0]
+        end = period[1]
+        if end >= start:
+            table[start:end + 1] = bytes((number,)) * (end + 1 - start)
+        else:
+            table[start:] = bytes((number,)) * (MINUTES_PER_DAY - start)
+            table[:end + 1] = bytes((number,)) * (end + 1)
+    return table
@@ -0,0 +1,99 @@
+# fdvl_serial.py
+import time
+from fdvl_protocol import FRAME_MAGIC, HEADER_SIZE, frame_size
+
+class LineReader:
+    MAX_LINE_LENGTH = 4096  # Longer lines are dropped
+    LINE_TIMEOUT = 2.0  # Seconds without data before a partial line is dropped
+
+    def __init__(self, serial):
+        self.serial = serial
+        self.buf = bytearray(self.MAX_LINE_LENGTH)
+        self.view = memoryview(self.buf)
+        self.start = 0  # First byte of the pending line
+        self.end = 0  # End of received data
+        self.scan = 0  # Bytes before this are known not to be a newline
+        self.discarding = False  # Skipping the rest of an over-long line
+        self.last_data = time.monotonic()
+        self.dropped_lines = 0
+
+    def fill(self):
+        """Drain waiting bytes into the buffer without blocking."""
+        waiting = self.serial.in_waiting
+        if not waiting:
+            if self.end > self.start and time.monotonic() - self.last_data > self.LINE_TIMEOUT:
+                # Host went away mid-line, forget the partial line
+                self.start = self.end = self.scan = 0
+                self.discarding = False
+                self.dropped_lines += 1
+            return
+        if self.end == len(self.buf) and self.start > 0:
+            # Move the pending partial line to the front to make room
+            length = self.end - self.start
+            self.buf[:length] = self.view[self.start:self.end]
+            self.scan -= self.start
+            self.start = 0
+            self.end = length
+        if self.end == len(self.buf):
+            # No newline in a full buffer, drop it and skip to the next newline
+            self.start = self.end = self.scan = 0
+            if not self.discarding:
+                self.discarding = True
+                self.dropped_lines += 1
+        count = min(waiting, len(self.buf) - self.end)
+        count = self.serial.readinto(self.view[self.end:self.end + count]) or 0
+        self.end += count
+        self.last_data = time.monotonic()
+
+    def take_frame(self):
+        """Return a complete binary frame at the start of the buffer, or None."""
+        self.scan = self.start  # Frames are sized by their header, not by newlines
+        if self.end - self.start < HEADER_SIZE:
+            return None
+        size = frame_size(self.view[self.start:self.start + HEADER_SIZE])
+        if size < 0:
+            # Not a real frame header, skip the magic byte and resync
+            self.start += 1
+            self.dropped_lines += 1
+            return None
+        if self.end - self.start < size:
+            return None
+        frame = bytes(self.view[self.start:self.start + size])
+        self.start = self.scan = self.start + size
+        if self.start == self.end:
+            self.start = self.end = self.scan = 0
+        return frame
+
+    def take_line(self):
+        """Return the next complete line (str) or binary frame (bytes), or None."""
+        while self.start < self.end and self.buf[self.start] == FRAME_MAGIC and not self.discarding:
+            start = self.start
+            frame = self.take_frame()
+            if frame is not None or self.start == start:
+                return frame
+        while self.scan < self.end:
+            newline = bytes(self.view[self.scan:self.end]).find(b"\n")
+            if newline < 0:
+                self.scan = self.end
+                return None
+            newline += self.scan
+            discarding = self.discarding
+            line = bytes(self.view[self.start:newline]) if not discarding else None
+            self.discarding = False
+            self.start = self.scan = newline + 1
+            if self.start == self.end:
+                self.start = self.end = self.scan = 0
+            if not discarding:
+                try:
+                    return line.decode().strip()
+                except UnicodeError:
+                    self.dropped_lines += 1  # Binary garbage, not a JSON line
+        return None
+
+    def poll(self):
+        """Return one complete line or frame if available, never waits for the rest of it."""
+        line = self.take_line()
+        if line is None:
+            self.fill()
+            line = self.take_line()
+        return line
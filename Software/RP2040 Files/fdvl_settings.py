@@ -0,0 +1,168 @@
+# fdvl_settings.py
+from fdvl_log import log
+from fdvl_schedule import MAX_PERIODS, parse_time
+from fdvl_alarms import MAX_ALARMS, EVERY_DAY
+
+COLOR = "color"
+SCHEDULE = "schedule"
+ALARMS = "alarms"
+
+# (key, type, default, minimum, maximum), keys match settings.txt
+SCHEMA = (
+    ("buzzer_frequency", int, 2300, 20, 20000),
+    ("buzzer_beep_duration", float, 0.1, 0.0, 10.0),
+    ("buzzer_stop_duration", float, 0.2, 0.0, 10.0),
+    ("buzzer_pause_duration", float, 0.3, 0.0, 10.0),
+    ("buzzer_max_cycles", int, 3, 0, 100),
+    ("buzzer_melody", str, "", None, None),  # e.g. "C5:100 -:50 E5:100", overrides the beep cycles
+    ("light_sensor_bright_threshold", int, 30000, 0, 65535),
+    ("light_sensor_dark_threshold", int, 49000, 0, 65535),
+    ("light_sensor_hysteresis", int, 2000, 0, 20000),
+    ("light_sensor_interval", float, 0.5, 0.05, 10.0),
+    ("bright_brightness", float, 0.1, 0.0, 1.0),
+    ("normal_brightness", float, 0.05, 0.0, 1.0),
+    ("dark_brightness", float, 0.02, 0.0, 1.0),
+    ("off_brightness", float, 0.01, 0.0, 1.0),
+    ("auto_brightness", bool, False, None, None),  # Follow the light level between bright and dark brightness
+    ("brightness_fade_time", float, 1.0, 0.0, 10.0),
+    ("gamma", float, 1.0, 1.0, 3.0),
+    ("default_color", COLOR, (50, 100, 25), 0, 255),
+    ("TIMER_POSITIVE_COLOR", COLOR, (0, 0, 255), 0, 255),
+    ("TIMER_NEGATIVE_COLOR", COLOR, (255, 0, 0), 0, 255),
+    ("STOPWATCH_COLOR", COLOR, (255, 255, 0), 0, 255),
+    ("night_color", COLOR, (255, 0, 0), 0, 255),
+    ("night_color_hours_start", int, 22, 0, 23),
+    ("night_color_minutes_start", int, 0, 0, 59),
+    ("night_color_hours_end", int, 5, 0, 23),
+    ("night_color_minutes_end", int, 0, 0, 59),
+    ("dots_always_on", bool, True, None, None),
+    # [{"start": "22:00", "end": "05:00", "color": [255, 0, 0], "brightness": 0.02}, ...],
+    # color and brightness are optional, empty means one period from the night_color settings
+    ("schedule", SCHEDULE, [], None, None),
+    # [{"time": "07:30", "days": [0, 1, 2, 3, 4], "melody": "C5:200 E5:200"}, ...], days are 0 = Monday
+    # to 6 = Sunday (every day if missing), melody is optional and replaces the buzzer pattern
+    ("alarms", ALARMS, [], None, None),
+)
+
+
+def validate_value(key, kind, value, minimum, maximum):
+    """Convert one setting to its schema type, raise ValueError if it does not fit."""
+    if kind == COLOR:
+        if not isinstance(value, (list, tuple)) or len(value) != 3:
+            raise ValueError("{}: expected [R, G, B]".format(key))
+        value = tuple(validate_value(key, int, part, minimum, maximum) for part in value)
+        return value
+    if kind == SCHEDULE:
+        if not isinstance(value, (list, tuple)) or len(value) > MAX_PERIODS:
+            raise ValueError("{}: expected a list of up to {} periods".format(key, MAX_PERIODS))
+        return [validate_period(key, period) for period in value]
+    if kind == ALARMS:
+        if not isinstance(value, (list, tuple)) or len(value) > MAX_ALARMS:
+            raise ValueError("{}: expected a list of up to {} alarms".format(key, MAX_ALARMS))
+        return [validate_alarm(key, alarm) for alarm in value]
+    if kind is str:
+        if not isinstance(value, str):
+            raise ValueError("{}: expected text".format(key))
+        return value
+    if kind is bool:
+        if not isinstance(value, (bool, int)):
+            raise ValueError("{}: expected true or false".format(key))
+        return bool(value)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError("{}: expected a number".format(key))
+    value = kind(value)
+    if value < minimum or value > maximum:
+        raise ValueError("{}: {} is outside {}..{}".format(key, value, minimum, maximum))
+    return value
+
+
+def validate_period(key, period):
+    """Normalize one schedule period, times stay "HH:MM" so the result saves back as JSON."""
+    if not isinstance(period, dict):
+        raise ValueError("{}: expected periods like {{\"start\": \"22:00\", \"end\": \"05:00\"}}".format(key))
+    clean = {}
+    for field in ("start", "end"):
+        try:
+            minute = parse_time(period.get(field))
+        except ValueError as e:
+            raise ValueError("{} {}: {}".format(key, field, e))
+        clean[field] = "{:02d}:{:02d}".format(minute // 60, minute % 60)
+    if period.get("color") is not None:
+        clean["color"] = list(validate_value(key + " color", COLOR, period["color"], 0, 255))
+    if period.get("brightness") is not None:
+        clean["brightness"] = validate_value(key + " brightness", float, period["brightness"], 0.0, 1.0)
+    return clean
+
+
+def validate_alarm(key, alarm):
+    """Normalize one alarm, like a schedule period the time stays "HH:MM"."""
+    if not isinstance(alarm, dict):
+        raise ValueError("{}: expected alarms like {{\"time\": \"07:30\"}}".format(key))
+    try:
+        minute = parse_time(alarm.get("time"))
+    except ValueError as e:
+        raise ValueError("{} time: {}".format(key, e))
+    clean = {"time": "{:02d}:{:02d}".format(minute // 60, minute % 60)}
+    if alarm.get("days") is not None:
+        days = alarm["days"]
+        if not isinstance(days, (list, tuple)):
+            raise ValueError("{} days: expected a list of weekdays 0-6".format(key))
+        clean["days"] = sorted(set(validate_value(key + " days", int, day, 0, 6) for day in days))
+    if alarm.get("melody"):
+        clean["melody"] = validate_value(key + " melody", str, alarm["melody"], None, None)
+    return clean
+
+
+def validate(settings):
+    """Return the known keys of a settings dict converted to their types, raise ValueError on the first bad one."""
+    clean = {}
+    for key, kind, default, minimum, maximum in SCHEMA:
+        if key in settings:
+            clean[key] = validate_value(key, kind, settings[key], minimum, maximum)
+    return clean
+
+
+def day_mask(days):
+    """Weekday bit mask of a list of weekdays, every day if None."""
+    if days is None:
+        return EVERY_DAY
+    mask = 0
+    for day in days:
+        mask |= 1 << day
+    return mask
+
+
+class Config:
+    """Typed settings with derived values, read directly by the subsystems instead of the dict."""
+    __slots__ = tuple(field[0] for field in SCHEMA) + (
+        "buzzer_beep_ms", "buzzer_stop_ms", "buzzer_pause_ms", "schedule_periods", "alarm_entries")
+
+    def __init__(self, settings):
+        for key, kind, default, minimum, maximum in SCHEMA:
+            value = default
+            if key in settings:
+                try:
+                    value = validate_value(key, kind, settings[key], minimum, maximum)
+                except ValueError as e:
+                    log.warning("Invalid setting, using default: {}", e)
+            setattr(self, key, value)
+
+        # Derived values, computed once per settings change
+        self.buzzer_beep_ms = int(self.buzzer_beep_duration * 1000)
+        self.buzzer_stop_ms = int(self.buzzer_stop_duration * 1000)
+        self.buzzer_pause_ms = int(self.buzzer_pause_duration * 1000)
+        # (start minute, end minute, color or None, brightness or None) for fdvl_schedule
+        if self.schedule:
+            self.schedule_periods = tuple(
+                (parse_time(period["start"]), parse_time(period["end"]),
+                 tuple(period["color"]) if "color" in period else None, period.get("brightness"))
+                for period in self.schedule)
+        else:
+            self.schedule_periods = ((
+                self.night_color_hours_start * 60 + self.night_color_minutes_start,
+                self.night_color_hours_end * 60 + self.night_color_minutes_end,
+                self.night_color, None),)
+        # (minute of day, weekday mask, melody or None) for fdvl_alarms
+        self.alarm_entries = tuple(
+            (parse_time(alarm["time"]), day_mask(alarm.get("days")), alarm.get("melody"))
+            for alarm in self.alarms)
@@ -0,0 +1,99 @@
+# fdvl_stats.py
+import gc
+import time
+from array import array
+
+# Stage numbers, index into the Stats arrays
+STAGE_SERIAL = 0
+STAGE_RTC = 1
+STAGE_BUTTONS = 2
+STAGE_BUZZER = 3
+STAGE_SWO = 4
+STAGE_DISPLAY = 5
+STAGE_FRAME_GAP = 6  # Time between the starts of two display frames
+
+class Stats:
+    """Per-stage timings in integer microseconds with min/avg/max and a small histogram, plus heap use."""
+    STAGE_NAMES = ("serial", "rtc", "buttons", "buzzer", "swo", "display", "frame_gap")
+    BUCKETS_US = (100, 500, 1000, 5000, 10000, 20000, 50000)  # Upper bounds, one more bucket for longer
+    first_frame = None  # Seconds from power-up to the first displayed time, kept across reset()
+
+    def __init__(self):
+        stages = len(self.STAGE_NAMES)
+        self.count = array("L", [0] * stages)
+        self.total = array("L", [0] * stages)  # Microseconds, wraps after ~71 minutes of stage time
+        self.min = array("L", [0xFFFFFFFF] * stages)
+        self.max = array("L", [0] * stages)
+        self.hist = array("L", [0] * (stages * (len(self.BUCKETS_US) + 1)))
+        self.last_frame = 0
+        self.mem_free = gc.mem_free()
+        self.mem_free_min = self.mem_free
+        self.gc_collections = 0  # Counted when free memory grows between two samples
+        self.started = time.monotonic()
+
+    def reset(self):
+        self.__init__()
+
+    def start(self):
+        """Timestamp for stop(), in microseconds."""
+        return time.monotonic_ns() // 1000
+
+    def stop(self, stage, started):
+        """Record the time since start() for a stage."""
+        self.record(stage, time.monotonic_ns() // 1000 - started)
+
+    def frame(self):
+        """Mark the start of a display frame and sample the heap."""
+        now = time.monotonic_ns() // 1000
+        if self.last_frame:
+            self.record(STAGE_FRAME_GAP, now - self.last_frame)
+        self.last_frame = now
+        self.sample_memory()
+        return now
+
+    def record(self, stage, elapsed):
+        self.count[stage] += 1
+        self.total[stage] = (self.total[stage] + elapsed) & 0xFFFFFFFF
+        if elapsed < self.min[stage]:
+            self.min[stage] = elapsed
+        if elapsed > self.max[stage]:
+            self.max[stage] = elapsed
+        bucket = 0
+        for bound in self.BUCKETS_US:
+            if elapsed <= bound:
+                break
+            bucket += 1
+        self.hist[stage * (len(self.BUCKETS_US) + 1) + bucket] += 1
+
+    def sample_memory(self):
+        mem_free = gc.mem_free()
+        if mem_free > self.mem_free:
+            self.gc_collections += 1
+        if mem_free < self.mem_free_min:
+            self.mem_free_min = mem_free
+        self.mem_free = mem_free
+
+    def report(self):
+        """All counters as a JSON-ready dict."""
+        width = len(self.BUCKETS_US) + 1
+        stages = {}
+        for stage, name in enumerate(self.STAGE_NAMES):
+            count = self.count[stage]
+            if not count:
+                continue
+            stages[name] = {
+                "count": count,
+                "min_us": self.min[stage],
+                "avg_us": self.total[stage] // count,
+                "max_us": self.max[stage],
+                "hist": list(self.hist[stage * width:(stage + 1) * width]),
+            }
+        return {
+            "uptime": int(time.monotonic() - self.started),
+            "first_frame_s": self.first_frame,
+            "buckets_us": self.BUCKETS_US,
+            "stages": stages,
+            "mem_free": self.mem_free,
+            "mem_free_min": self.mem_free_min,
+            "gc_collections": self.gc_collections,
+        }
@@ -0,0 +1,63 @@
+# fdvl_stopwatch.py
+from array import array
+from adafruit_ticks import ticks_diff # type: ignore
+
+class Stopwatch:
+    """Elapsed time in integer milliseconds, whole seconds follow the SWO edges.
+
+    A run is anchored to the SWO edge before its start tick, the time is the SWO
+    seconds since then plus ticks_ms since the latest edge, so long runs keep the
+    RTC accuracy. Without SWO the run is timed with ticks_ms alone.
+    Lap splits go into a fixed ring, recording a lap never allocates.
+    """
+    MAX_LAPS = 100  # Splits kept, older ones are overwritten
+    SWO_STALE_MS = 1100  # An edge older than this at the start means SWO is not running
+
+    def __init__(self, swo):
+        self.swo = swo
+        self.splits = array("L", [0] * self.MAX_LAPS)  # Elapsed ms at each lap, lap n in slot n % MAX_LAPS
+        self.laps = 0  # Laps since the last reset
+        self.running = False
+        self.base_ms = 0  # Elapsed time at the start of the run
+        self.start_tick = 0
+        self.start_edges = -1  # swo.total_ticks at the start of the run, -1 when timed by ticks_ms
+        self.start_phase = 0  # ms from the latest SWO edge to the start of the run
+
+    def start(self, now, elapsed_ms=0):
+        """Run from elapsed_ms on, now is the ticks_ms of the start."""
+        swo = self.swo
+        self.base_ms = elapsed_ms
+        self.start_tick = now
+        self.start_phase = ticks_diff(now, swo.edge_ms)
+        self.start_edges = swo.total_ticks if self.start_phase <= self.SWO_STALE_MS else -1
+        self.running = True
+
+    def reset(self, now):
+        """Clear the laps and run from zero."""
+        self.laps = 0
+        self.start(now)
+
+    def elapsed(self, now):
+        """Elapsed ms at ticks_ms now, which may be slightly in the past (e.g. a key press)."""
+        if not self.running:
+            return self.base_ms
+        swo = self.swo
+        if self.start_edges < 0 or swo.total_ticks == self.start_edges:
+            run = ticks_diff(now, self.start_tick)
+        else:
+            run = (swo.total_ticks - self.start_edges) * 1000 - self.start_phase + ticks_diff(now, swo.edge_ms)
+        return self.base_ms + max(run, 0)
+
+    def lap(self, now):
+        """Record a lap split at ticks_ms now and return it."""
+        split = self.elapsed(now)
+        self.splits[self.laps % self.MAX_LAPS] = split
+        self.laps += 1
+        return split
+
+    def first_lap(self):
+        """Number of the oldest lap still kept."""
+        return max(0, self.laps - self.MAX_LAPS)
+
+    def split(self, lap):
+        return self.splits[lap % self.MAX_LAPS]
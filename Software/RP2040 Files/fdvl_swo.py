@@ -0,0 +1,48 @@
+# fdvl_swo.py
+import time
+import countio # type: ignore
+import digitalio # type: ignore
+from adafruit_ticks import ticks_ms, ticks_add, ticks_diff # type: ignore
+
+class SWO:
+    HIGH_TIME = 0.5  # SWO (CLK_1HZ) is a 50% duty square wave
+    EDGE_LATENCY_MS = 50  # Longest expected delay between an edge and take_ticks() seeing it
+
+    def __init__(self, pin):
+        # Rising edges are counted in hardware, none are lost while the loop is busy
+        self.counter = countio.Counter(pin, edge=countio.Edge.RISE, pull=digitalio.Pull.UP)
+        self.last_count = self.counter.count
+        self.last_tick = time.monotonic()
+        self.total_ticks = 0
+        self.edge_ms = ticks_ms()  # Estimated ticks_ms of the latest rising edge
+
+    def take_ticks(self):
+        """Return the number of 1 Hz ticks since the last call."""
+        count = self.counter.count
+        ticks = count - self.last_count
+        if ticks:
+            self.last_count = count
+            self.last_tick = time.monotonic()
+            self.total_ticks += ticks
+            self.update_edge(ticks)
+        return ticks
+
+    def update_edge(self, ticks):
+        """Advance the edge estimate by whole seconds, kept within the polling latency of now."""
+        now = ticks_ms()
+        edge = ticks_add(self.edge_ms, 1000 * ticks)
+        earliest = ticks_add(now, -self.EDGE_LATENCY_MS)
+        if ticks_diff(edge, earliest) < 0:
+            edge = earliest
+        elif ticks_diff(edge, now) > 0:
+            edge = now
+        self.edge_ms = edge
+
+    def restart(self, tick):
+        """The RTC's divider chain restarted at ticks_ms tick, edges counted until now belong to the old one."""
+        self.take_ticks()
+        self.edge_ms = tick
+
+    def is_high(self):
+        """Estimate the SWO level from the time since the last counted tick."""
+        return time.monotonic() - self.last_tick < self.HIGH_TIME
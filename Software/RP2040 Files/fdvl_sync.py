@@ -0,0 +1,72 @@
+# fdvl_sync.py
+from array import array
+
+class DriftHistory:
+    """Offsets the RTC had built up at each time sync, and its drift in ppm from them.
+
+    Each sync sets the RTC right, so the offset found at the next sync is what the crystal
+    gained or lost over the interval between the two. Setting the time any other way ends
+    the chain, the next sync then only starts a new interval.
+    """
+    SIZE = 16  # Syncs kept
+    MIN_INTERVAL = 3600  # Seconds, shorter intervals measure the sync more than the crystal
+    MAX_PPM = 500  # Larger drifts mean the time was changed in between, not a crystal error
+
+    def __init__(self):
+        self.synced_at = array("L", [0] * self.SIZE)  # time_to_seconds of each sync
+        self.offset_ms = array("l", [0] * self.SIZE)  # RTC minus the true time just before the sync
+        self.interval = array("L", [0] * self.SIZE)  # Seconds since the previous sync, 0 if unknown
+        self.head = 0
+        self.count = 0
+        self.last_sync = 0  # time_to_seconds of the last sync, 0 when the chain is broken
+
+    def record(self, synced_at, offset_ms):
+        """Add a sync at synced_at that found the RTC offset_ms ahead (negative: behind)."""
+        i = self.head
+        self.synced_at[i] = synced_at
+        self.offset_ms[i] = max(-0x7FFFFFFF, min(offset_ms, 0x7FFFFFFF))
+        self.interval[i] = synced_at - self.last_sync if 0 < self.last_sync < synced_at else 0
+        self.head = (i + 1) % self.SIZE
+        if self.count < self.SIZE:
+            self.count += 1
+        self.last_sync = synced_at
+
+    def break_chain(self):
+        """The time was set without a sync, the next offset says nothing about drift."""
+        self.last_sync = 0
+
+    def entries(self):
+        """(synced_at, offset_ms, interval) oldest first."""
+        first = (self.head - self.count) % self.SIZE
+        for n in range(self.count):
+            i = (first + n) % self.SIZE
+            yield self.synced_at[i], self.offset_ms[i], self.interval[i]
+
+    def drift_ppm(self):
+        """Drift over every usable interval, positive when the RTC runs fast, None without one."""
+        offset = 0
+        seconds = 0
+        for synced_at, offset_ms, interval in self.entries():
+            if interval >= self.MIN_INTERVAL and abs(offset_ms) * 1000 <= self.MAX_PPM * interval:
+                offset += offset_ms
+                seconds += interval
+        if not seconds:
+            return None
+        return offset * 1000 / seconds
+
+    def to_json(self):
+        return {"last_sync": self.last_sync, "history": [list(entry) for entry in self.entries()]}
+
+    def load(self, data):
+        """Restore what to_json() saved, a malformed file raises ValueError."""
+        try:
+            for synced_at, offset_ms, interval in data["history"][-self.SIZE:]:
+                i = self.head
+                self.synced_at[i] = synced_at
+                self.offset_ms[i] = offset_ms
+                self.interval[i] = interval
+                self.head = (i + 1) % self.SIZE
+                self.count = min(self.count + 1, self.SIZE)
+            self.last_sync = int(data["last_sync"])
+        except (KeyError, TypeError, OverflowError) as e:
+            raise ValueError("bad sync history: {}".format(e))
@@ -0,0 +1,115 @@
+# fdvl_timers.py
+
+class Timers:
+    """Named countdowns in a min-heap on expiry time, the next one due is always in slot 0.
+
+    Expiry times are absolute seconds (time_to_seconds), so timers keep running whatever
+    the display shows. Setting the clock must shift() them by the same amount. Peeking is O(1), add and cancel are O(log n) through the name index.
+    """
+    MAX_TIMERS = 16
+    MAX_NAME_LENGTH = 16
+
+    def __init__(self):
+        self.expiry = []  # Heap of expiry times
+        self.names = []  # Timer name of each heap slot
+        self.index = {}  # Name -> heap slot
+
+    def __len__(self):
+        return len(self.expiry)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def next_expiry(self):
+        """Expiry time of the next timer due, None when none runs."""
+        return self.expiry[0] if self.expiry else None
+
+    def get(self, name):
+        slot = self.index.get(name)
+        return None if slot is None else self.expiry[slot]
+
+    def add(self, name, expiry):
+        """Start a timer, or move an existing one with the same name to a new expiry time."""
+        slot = self.index.get(name)
+        if slot is not None:
+            self.expiry[slot] = expiry
+            self.sift_down(self.sift_up(slot))
+            return
+        if not name or len(name) > self.MAX_NAME_LENGTH:
+            raise ValueError("timer name must be 1-{} characters".format(self.MAX_NAME_LENGTH))
+        if len(self.expiry) >= self.MAX_TIMERS:
+            raise ValueError("at most {} timers".format(self.MAX_TIMERS))
+        self.expiry.append(expiry)
+        self.names.append(name)
+        self.index[name] = len(self.expiry) - 1
+        self.sift_up(len(self.expiry) - 1)
+
+    def cancel(self, name):
+        """Stop a timer, False if there was none of that name."""
+        slot = self.index.get(name)
+        if slot is None:
+            return False
+        self.remove(slot)
+        return True
+
+    def shift(self, delta):
+        """Move every expiry time by delta seconds, the heap order stays the same."""
+        expiry = self.expiry
+        for slot in range(len(expiry)):
+            expiry[slot] += delta
+
+    def pop_expired(self, now):
+        """Remove the timers due at or before now and return their names, earliest first."""
+        expired = []
+        while self.expiry and self.expiry[0] <= now:
+            expired.append(self.names[0])
+            self.remove(0)
+        return expired
+
+    def items(self):
+        """(expiry, name) of every timer, earliest first."""
+        return sorted(zip(self.expiry, self.names))
+
+    def remove(self, slot):
+        last = len(self.expiry) - 1
+        del self.index[self.names[slot]]
+        if slot != last:
+            self.expiry[slot] = self.expiry[last]
+            self.names[slot] = self.names[last]
+            self.index[self.names[slot]] = slot
+        self.expiry.pop()
+        self.names.pop()
+        if slot != last:
+            self.sift_down(self.sift_up(slot))
+
+    def swap(self, a, b):
+        expiry = self.expiry
+        names = self.names
+        expiry[a], expiry[b] = expiry[b], expiry[a]
+        names[a], names[b] = names[b], names[a]
+        self.index[names[a]] = a
+        self.index[names[b]] = b
+
+    def sift_up(self, slot):
+        expiry = self.expiry
+        while slot:
+            parent = (slot - 1) >> 1
+            if expiry[parent] <= expiry[slot]:
+                break
+            self.swap(slot, parent)
+            slot = parent
+        return slot
+
+    def sift_down(self, slot):
+        expiry = self.expiry
+        size = len(expiry)
+        while True:
+            child = 2 * slot + 1
+            if child >= size:
+                return slot
+            if child + 1 < size and expiry[child + 1] < expiry[child]:
+                child += 1
+            if expiry[slot] <= expiry[child]:
+                return slot
+            self.swap(slot, child)
+            slot = child